@@ -94,7 +94,7 @@ AUTH_USER_MODEL = 'api.User'
 # Django REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.CachedJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',  # keep for browsable API/dev
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -256,6 +256,12 @@ SIMPLE_JWT = {
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
 }
 
+# JWT principals (user + customer profile) cached per process; writes in the same process invalidate on commit.
+# Other processes only see a deactivation or password change once their entry expires, so a revoked account
+# can keep using an unexpired token for up to this many seconds. Lower it (0 disables the cache) to tighten that.
+AUTH_PRINCIPAL_TTL_SECONDS = config('AUTH_PRINCIPAL_TTL_SECONDS', default=30, cast=int)
+AUTH_PRINCIPAL_CACHE_SIZE = config('AUTH_PRINCIPAL_CACHE_SIZE', default=1024, cast=int)
+
 # Stripe Configuration
 STRIPE_PUBLISHABLE_KEY = os.getenv('STRIPE_PUBLISHABLE_KEY', 'pk_test_51S56nlC4JPnk6JAKZDUUh8Hxx22eZKZJef90LQtSRBYlj0OYHYSfgsxxF7LieM0fcozghPw12N7LlnyjmEtMw4nv005l17hvwr')
 STRIPE_SECRET_KEY = os.getenv('STRIPE_SECRET_KEY', 'sk_test_51S56nlC4JPnk6JAKPazekul0IQw20SjRpMurgAEWSMkldm4t3st9C5lkxunjQ3YUtvz6UQ4d8Xw56xbfSm1ztL1200dcBnlfwC')
@@ -263,3 +269,55 @@ STRIPE_WEBHOOK_SECRET = os.getenv('STRIPE_WEBHOOK_SECRET', 'whsec_JphCuYJwcVNQFN
 
 # Initialize Stripe
 stripe.api_key = STRIPE_SECRET_KEY
+
+# Cache (per-process memory by default; settings_production switches to Redis when REDIS_URL is set)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'zimnat-default',
+    }
+}
+
+# Staff dashboard summary cache lifetime in seconds (entries are also invalidated on writes)
+DASHBOARD_CACHE_TIMEOUT = config('DASHBOARD_CACHE_TIMEOUT', default=300, cast=int)
+# The summary is only cached in a cache shared by all workers (not locmem) unless the app runs as one process
+DASHBOARD_CACHE_ALLOW_LOCMEM = config('DASHBOARD_CACHE_ALLOW_LOCMEM', default=False, cast=bool)
+
+# Background export jobs: artifacts are written here by `manage.py run_export_worker`
+EXPORT_ROOT = config('EXPORT_ROOT', default=str(BASE_DIR / 'exports'))
+EXPORT_JOB_REUSE_SECONDS = config('EXPORT_JOB_REUSE_SECONDS', default=300, cast=int)
+EXPORT_JOB_RETENTION_HOURS = config('EXPORT_JOB_RETENTION_HOURS', default=24, cast=int)
+# Also trace each export job's peak Python allocation with tracemalloc (diagnostics only; slows exports down)
+EXPORT_JOB_TRACE_MEMORY = config('EXPORT_JOB_TRACE_MEMORY', default=False, cast=bool)
+
+# Rendered quotation PDFs/workbooks, keyed by a hash of their inputs (LRU-evicted above the byte budget)
+DOCUMENT_CACHE_ROOT = config('DOCUMENT_CACHE_ROOT', default=str(BASE_DIR / 'document_cache'))
+DOCUMENT_CACHE_MAX_BYTES = config('DOCUMENT_CACHE_MAX_BYTES', default=256 * 1024 * 1024, cast=int)
+# Processes the export worker renders quote packs with (default: one per CPU core; 0 renders in the worker itself)
+DOCUMENT_RENDER_WORKERS = config('DOCUMENT_RENDER_WORKERS', default=None, cast=lambda value: None if value in (None, '') else int(value))
+QUOTE_PACK_MAX_POLICIES = config('QUOTE_PACK_MAX_POLICIES', default=500, cast=int)
+
+# Role-wide notifications: 'inline' delivers after the request commits; 'worker' only queues events and needs
+# `manage.py run_notification_worker` running (see PRODUCTION_DEPLOYMENT_GUIDE.md)
+NOTIFICATION_DELIVERY = config('NOTIFICATION_DELIVERY', default='inline')
+NOTIFICATION_ROLE_CACHE_SECONDS = config('NOTIFICATION_ROLE_CACHE_SECONDS', default=300, cast=int)
+# Deliveries tried per event (with exponential backoff) before it is left failed
+NOTIFICATION_MAX_ATTEMPTS = config('NOTIFICATION_MAX_ATTEMPTS', default=5, cast=int)
+
+# Live updates over SSE (/api/events/). Only enable when serving Core.asgi under an ASGI server: under WSGI every
+# open stream holds a worker thread. Stream tickets live in the cache, so several processes need a shared cache.
+EVENTS_STREAM_ENABLED = config('EVENTS_STREAM_ENABLED', default=False, cast=bool)
+# Event broker: empty uses the in-process broker; a redis:// URL fans events out across processes
+# (required with several web processes or NOTIFICATION_DELIVERY='worker')
+EVENTS_BROKER_URL = config('EVENTS_BROKER_URL', default='')
+EVENTS_HEARTBEAT_SECONDS = config('EVENTS_HEARTBEAT_SECONDS', default=15, cast=int)
+
+# Customer/vehicle search: 'fts5' uses the SQLite FTS5 index (migration 0011), 'orm' keeps icontains lookups
+SEARCH_INDEX_BACKEND = config('SEARCH_INDEX_BACKEND', default='fts5')
+
+# Fuzzy plate search (search_vehicles?fuzzy=1): max edit distance and per-worker index refresh interval
+PLATE_FUZZY_MAX_DISTANCE = config('PLATE_FUZZY_MAX_DISTANCE', default=2, cast=int)
+PLATE_INDEX_REFRESH_SECONDS = config('PLATE_INDEX_REFRESH_SECONDS', default=300, cast=int)
+
+# Premium rate table used for all quoting (see api/rating.py RATE_TABLES)
+RATE_TABLE_VERSION = config('RATE_TABLE_VERSION', default='2025.1')
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Core.settings')
 
 application = get_wsgi_application()
+
+# Build the fuzzy plate index in the background now rather than on the first search.
+from api import plates  # noqa: E402
+
+plates.warm()
@@ -11,8 +11,11 @@ from .models import (
     ClaimDocument,
     ContactInquiry,
     DashboardStats,
+    DailyRollup,
+    ExportJob,
     Payment,
     Notification,
+    NotificationEvent,
 )
 
 
@@ -111,6 +114,19 @@ class DashboardStatsAdmin(admin.ModelAdmin):
     list_filter = ("year",)
 
 
+@admin.register(DailyRollup)
+class DailyRollupAdmin(admin.ModelAdmin):
+    list_display = ("date", "coverage", "vehicle_category", "claims_count", "policies_count", "revenue", "customers_count")
+    list_filter = ("coverage", "vehicle_category", "date")
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ("job_id", "export", "format", "status", "requested_by", "row_count", "duration_ms", "peak_memory_kb", "created_at")
+    list_filter = ("status", "export", "format")
+    readonly_fields = ("file_path", "file_size", "row_count", "duration_ms", "peak_memory_kb", "started_at", "finished_at")
+
+
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
     list_display = ("payment_id", "policy", "amount", "payment_method", "status", "payment_date")
@@ -120,6 +136,13 @@ class PaymentAdmin(admin.ModelAdmin):
 
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
-    list_display = ("title", "recipient", "type", "is_read", "created_at")
-    list_filter = ("type", "is_read", "created_at")
+    list_display = ("title", "recipient", "topic", "type", "is_read", "created_at")
+    list_filter = ("type", "topic", "is_read", "created_at")
     search_fields = ("title", "message", "recipient__username", "recipient__email")
+
+
+@admin.register(NotificationEvent)
+class NotificationEventAdmin(admin.ModelAdmin):
+    list_display = ("title", "role", "type", "status", "attempts", "recipient_count", "created_at", "delivered_at")
+    list_filter = ("status", "role", "type")
+    readonly_fields = ("recipient_count", "error", "attempts", "not_before", "started_at", "delivered_at")
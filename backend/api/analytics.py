@@ -0,0 +1,235 @@
+"""Grouped aggregation helpers for the analytics/dashboard endpoints.
+
+Each helper issues a fixed number of GROUP BY queries regardless of how many
+months, categories or rows are involved, so chart latency stays flat as the
+book grows.
+"""
+import calendar
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models import Avg, Count, Q, Sum
+from django.db.models.functions import ExtractMonth
+from django.utils import timezone
+
+from . import rollups
+from .models import Claim, Customer, InsurancePolicy, VehicleCategory
+
+logger = logging.getLogger(__name__)
+
+
+# Sentinel meaning "do not scope by customer" (staff view). ``None`` is a valid
+# customer scope (a customer user without a profile) and must match nothing.
+UNSCOPED = object()
+
+
+def customer_scope_for(user):
+    """Return the customer scope for ``user``: UNSCOPED for staff, else the profile (or None)."""
+    if getattr(user, 'user_type', None) != 'customer':
+        return UNSCOPED
+    try:
+        return user.customer_profile
+    except Exception:
+        return None
+
+
+def monthly_series(year, customer=UNSCOPED):
+    """Claims count, policy count and premium revenue for each month of ``year``.
+
+    Staff (unscoped) series are read from the DailyRollup table in one grouped
+    query; customer-scoped series use two grouped queries (one per table).
+    """
+    if customer is UNSCOPED:
+        by_month = rollups.monthly(year)
+        return [
+            _month_entry(
+                month,
+                claims=(by_month.get(month) or {}).get('claims_count') or 0,
+                policies=(by_month.get(month) or {}).get('policies_count') or 0,
+                revenue=(by_month.get(month) or {}).get('revenue') or 0,
+            )
+            for month in range(1, 13)
+        ]
+
+    claims_qs = Claim.objects.filter(created_at__year=year, policy__customer=customer)
+    policies_qs = InsurancePolicy.objects.filter(created_at__year=year, customer=customer)
+
+    claims_by_month = dict(
+        claims_qs.annotate(month=ExtractMonth('created_at'))
+        .values('month')
+        .annotate(count=Count('id'))
+        .values_list('month', 'count')
+    )
+    policies_by_month = {
+        row['month']: row
+        for row in policies_qs.annotate(month=ExtractMonth('created_at'))
+        .values('month')
+        .annotate(count=Count('id'), revenue=Sum('premium_amount'))
+    }
+
+    return [
+        _month_entry(
+            month,
+            claims=claims_by_month.get(month, 0),
+            policies=(policies_by_month.get(month) or {}).get('count', 0),
+            revenue=(policies_by_month.get(month) or {}).get('revenue') or 0,
+        )
+        for month in range(1, 13)
+    ]
+
+
+def _month_entry(month, claims, policies, revenue):
+    return {
+        'month': month,
+        'month_name': calendar.month_name[month],
+        'claims': claims,
+        'policies': policies,
+        'revenue': float(revenue),
+    }
+
+
+def category_distribution(customer=UNSCOPED):
+    """Vehicle count per category in a single LEFT JOIN ... GROUP BY query."""
+    vehicle_filter = None
+    if customer is not UNSCOPED:
+        vehicle_filter = Q(vehicle__customer=customer)
+    categories = VehicleCategory.objects.annotate(
+        vehicle_count=Count('vehicle', filter=vehicle_filter)
+    ).order_by('id')
+    return [
+        {'category': category.get_name_display(), 'count': category.vehicle_count}
+        for category in categories
+    ]
+
+
+def claims_by_status():
+    """Claim count per approval status (staff only)."""
+    rows = Claim.objects.values('approval_status').annotate(count=Count('id')).order_by('approval_status')
+    return [
+        {'status': row['approval_status'].title(), 'count': row['count']}
+        for row in rows
+    ]
+
+
+def staff_dashboard_summary(today=None):
+    """Underwriter/manager KPI figures using one conditional-aggregation query per table."""
+    today = today or timezone.now().date()
+    claims = Claim.objects.aggregate(
+        total=Count('id'),
+        pending=Count('id', filter=Q(approval_status='pending')),
+        approved=Count('id', filter=Q(approval_status='approve')),
+        average_amount=Avg('estimated_amount'),
+    )
+    policies = InsurancePolicy.objects.aggregate(
+        active=Count('id', filter=Q(status='active')),
+        revenue=Sum('premium_amount', filter=Q(status='active')),
+        expiring_soon=Count('id', filter=Q(status='active', end_date__lte=today + timedelta(days=30))),
+    )
+    total_claims = claims['total']
+    return {
+        'total_customers': Customer.objects.count(),
+        'active_policies': policies['active'],
+        'pending_claims': claims['pending'],
+        'total_claims': total_claims,
+        'total_revenue': float(policies['revenue'] or 0),
+        'claims_approval_rate': (claims['approved'] / total_claims * 100) if total_claims > 0 else 0,
+        'average_claim_amount': float(claims['average_amount'] or 0),
+        'policies_expiring_soon': policies['expiring_soon'],
+    }
+
+
+# Cache keys for the staff dashboard summary. The generation counter is bumped
+# on every Claim/InsurancePolicy/Customer write so entries of older generations
+# are never read again; they simply expire. This only holds when every process
+# shares the cache, so with a process-local backend the summary is not cached.
+# A counter lost to eviction is re-seeded from the clock (microseconds), which
+# is always ahead of any earlier generation, so old entries never come back.
+_DASHBOARD_GENERATION_KEY = 'dashboard:staff:generation'
+_DASHBOARD_STALE_KEY = 'dashboard:staff:last'
+# Longest a request waits for another request's computation before computing itself.
+DASHBOARD_LOCK_WAIT_SECONDS = 1.5
+_warned_local_cache = False
+
+
+def _dashboard_cache_enabled():
+    global _warned_local_cache
+    if getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 300) <= 0:
+        return False
+    if isinstance(caches[DEFAULT_CACHE_ALIAS], LocMemCache) and not getattr(settings, 'DASHBOARD_CACHE_ALLOW_LOCMEM', False):
+        if not _warned_local_cache:
+            logger.warning(
+                "Staff dashboard caching is disabled: the default cache is process-local, so write "
+                "invalidation would not reach other workers. Configure a shared cache (or set "
+                "DASHBOARD_CACHE_ALLOW_LOCMEM for a single-process deployment)."
+            )
+            _warned_local_cache = True
+        return False
+    return True
+
+
+def _generation_seed():
+    return time.time_ns() // 1000
+
+
+def _dashboard_generation():
+    generation = cache.get(_DASHBOARD_GENERATION_KEY)
+    if generation is None:
+        seed = _generation_seed()
+        cache.add(_DASHBOARD_GENERATION_KEY, seed, timeout=None)
+        generation = cache.get(_DASHBOARD_GENERATION_KEY, seed)
+    return generation
+
+
+def invalidate_staff_dashboard():
+    """Drop the cached staff dashboard summary (called from model signals)."""
+    try:
+        cache.incr(_DASHBOARD_GENERATION_KEY)
+    except ValueError:
+        cache.add(_DASHBOARD_GENERATION_KEY, _generation_seed(), timeout=None)
+
+
+def cached_staff_dashboard_summary():
+    """Staff dashboard summary served from the cache with stampede protection.
+
+    On a miss only the caller that wins ``cache.add`` on the lock key computes
+    the figures; concurrent callers are served the previous value if it belongs
+    to the current generation (i.e. it only expired or the day rolled over), or
+    wait up to ``DASHBOARD_LOCK_WAIT_SECONDS`` for the winner to publish before
+    computing themselves.
+    """
+    today = timezone.now().date()
+    if not _dashboard_cache_enabled():
+        return staff_dashboard_summary(today)
+    timeout = getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 300)
+    lock_timeout = getattr(settings, 'DASHBOARD_CACHE_LOCK_TIMEOUT', 30)
+    generation = _dashboard_generation()
+    key = f'dashboard:staff:{generation}:{today.isoformat()}'
+
+    data = cache.get(key)
+    if data is not None:
+        return data
+
+    lock_key = f'{key}:lock'
+    if not cache.add(lock_key, 1, timeout=lock_timeout):
+        stale = cache.get(_DASHBOARD_STALE_KEY)
+        if stale is not None and stale[0] == generation:
+            return stale[1]
+        deadline = time.monotonic() + min(lock_timeout, DASHBOARD_LOCK_WAIT_SECONDS)
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            data = cache.get(key)
+            if data is not None:
+                return data
+        # The lock holder is slow (or died); compute without it rather than hold this request.
+        return staff_dashboard_summary(today)
+
+    try:
+        data = staff_dashboard_summary(today)
+        cache.set_many({key: data, _DASHBOARD_STALE_KEY: (generation, data)}, timeout=timeout)
+        return data
+    finally:
+        cache.delete(lock_key)
@@ -0,0 +1,127 @@
+"""JWT authentication with a per-process principal cache.
+
+``JWTAuthentication`` loads the ``User`` row on every request, and views then
+load ``user.customer_profile`` separately. ``CachedJWTAuthentication``
+resolves both in one query (``select_related('customer_profile')``) and keeps
+the result in a small LRU keyed by user id for ``AUTH_PRINCIPAL_TTL_SECONDS``,
+so a warm request makes no identity queries at all. Each request gets its own
+copies of the cached instances, and ``request.principal`` carries the user id,
+role and customer id.
+
+Writes to a user or customer in this process drop the entry once their
+transaction commits (see ``signals``); other processes see such changes once
+the TTL expires, which bounds how long a deactivated account can keep using an
+unexpired token (30 seconds by default).
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .models import User
+
+
+TTL_SECONDS = getattr(settings, 'AUTH_PRINCIPAL_TTL_SECONDS', 30)
+MAX_ENTRIES = getattr(settings, 'AUTH_PRINCIPAL_CACHE_SIZE', 1024)
+
+Principal = namedtuple('Principal', ['user_id', 'role', 'customer_id'])
+
+
+class PrincipalCache:
+    def __init__(self, ttl=TTL_SECONDS, max_entries=MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            user, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return user
+
+    def put(self, user_id, user):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[user_id] = (user, time.monotonic() + self.ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def forget(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+cache = PrincipalCache()
+
+
+def _load(user_id):
+    # select_related also caches a missing profile, so staff users don't query for it later.
+    return User.objects.select_related('customer_profile').filter(**{api_settings.USER_ID_FIELD: user_id}).first()
+
+
+def _copy(user):
+    """A request-private copy, including the cached customer profile."""
+    user = copy.copy(user)
+    profile = user._state.fields_cache.get('customer_profile')
+    if profile is not None:
+        profile = copy.copy(profile)
+        profile._state.fields_cache['user'] = user
+        user._state.fields_cache['customer_profile'] = profile
+    return user
+
+
+def principal_for(user):
+    profile = user._state.fields_cache.get('customer_profile')
+    return Principal(user.pk, user.user_type, profile.pk if profile is not None else None)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """``JWTAuthentication`` that serves the user (and customer profile) from ``cache``."""
+
+    def authenticate(self, request):
+        result = super().authenticate(request)
+        if result is not None:
+            # DRF's Request proxies attribute reads to the Django request.
+            request._request.principal = principal_for(result[0])
+        return result
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        user = cache.get(user_id)
+        if user is None:
+            user = _load(user_id)
+            if user is None:
+                raise AuthenticationFailed(_('User not found'), code='user_not_found')
+            cache.put(user_id, user)
+
+        # The same checks JWTAuthentication.get_user makes on a freshly loaded user.
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+        return _copy(user)
@@ -0,0 +1,168 @@
+"""Quotation packs: many policy documents rendered in parallel into one ZIP.
+
+A pack is an ``ExportJob`` (``export='quote_pack'``, ``format='zip'``) whose
+``params`` hold the policy ids and document format. The ``run_export_worker``
+process builds it and it is downloaded like any other export, so no web
+worker is held while documents render. ReportLab/openpyxl rendering is
+CPU-bound, so cache misses are fanned out to a process pool
+(``settings.DOCUMENT_RENDER_WORKERS``, default one worker per core) that only
+the export worker starts. Every fresh render is added to the document cache
+(``documents``) so the next pack or single download of the same quote is a
+file read. A document that fails to render is replaced in the archive by a
+``.error.txt`` entry carrying the error, and the rest of the pack still ships.
+"""
+import logging
+import os
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+from . import documents, rating
+from .models import ExportJob, InsurancePolicy
+
+logger = logging.getLogger(__name__)
+
+# ExportJob.export value of pack jobs.
+EXPORT = 'quote_pack'
+CONTENT_TYPE = 'application/zip'
+# Policies accepted in one pack request.
+MAX_POLICIES = getattr(settings, 'QUOTE_PACK_MAX_POLICIES', 500)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _init_worker():
+    # Spawned/forkserver workers start without Django configured.
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+def _render(job):
+    context, fmt = job
+    return documents.RENDERERS[fmt](context)
+
+
+def worker_count():
+    workers = getattr(settings, 'DOCUMENT_RENDER_WORKERS', None)
+    return (os.cpu_count() or 1) if workers is None else workers
+
+
+def pool():
+    """The shared render pool, created on first use (None when workers are disabled)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None and worker_count() > 0:
+            _pool = ProcessPoolExecutor(max_workers=worker_count(), initializer=_init_worker)
+        return _pool
+
+
+def _discard_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def create_job(user, policy_ids, fmt):
+    """Queue a pack of the quotation documents of ``policy_ids`` for the export worker."""
+    return ExportJob.objects.create(
+        export=EXPORT, format='zip', requested_by=user,
+        params={'policy_ids': list(policy_ids), 'document_format': fmt},
+    )
+
+
+def download_name(job):
+    return f"quotations_{job.params.get('document_format', 'pdf')}.zip"
+
+
+def contexts(policies):
+    """Document contexts for ``policies`` (with vehicle, category, coverage and user loaded), rated in one pass."""
+    policies = list(policies)
+    premiums = rating.rate(
+        [policy.vehicle.market_value for policy in policies],
+        [policy.coverage.name for policy in policies],
+        [policy.vehicle.category.name for policy in policies],
+    )
+    return [documents.quote_context(policy, premiums.quote(index)) for index, policy in enumerate(policies)]
+
+
+def _read(path):
+    try:
+        with open(path, 'rb') as fileobj:
+            return fileobj.read()
+    except FileNotFoundError:
+        # Evicted since the lookup.
+        return None
+
+
+def _submit(contexts, misses, fmt):
+    executor = pool() if len(misses) > 1 else None
+    if executor is None:
+        return {}
+    try:
+        return {index: executor.submit(_render, (contexts[index], fmt)) for index in misses}
+    except BrokenProcessPool:
+        logger.exception("Document render pool is broken; rendering the pack inline")
+        _discard_pool()
+        return {}
+
+
+def _documents(contexts, fmt):
+    """Yield ``(context, content, error)`` in order, rendering cache misses in the pool.
+
+    ``content`` is None and ``error`` holds the exception for a document that
+    could not be rendered.
+    """
+    keys = [documents.cache_key(context, fmt) for context in contexts]
+    cached = [documents.cached_path(key, fmt) for key in keys]
+    futures = _submit(contexts, [index for index, path in enumerate(cached) if path is None], fmt)
+
+    for index, (context, key, path) in enumerate(zip(contexts, keys, cached)):
+        future = futures.pop(index, None)
+        try:
+            content = _read(path) if path is not None else None
+            fresh = content is None
+            if content is None and future is not None:
+                try:
+                    content = future.result()
+                except BrokenProcessPool:
+                    logger.exception("Document render pool died; rendering the rest of the pack inline")
+                    _discard_pool()
+                    futures = {}
+            if content is None:
+                content = documents.RENDERERS[fmt](context)
+            if fresh:
+                documents.store(key, fmt, content)
+        except Exception as exc:
+            logger.exception("Could not render %s", documents.filename(context, fmt))
+            yield context, None, exc
+        else:
+            yield context, content, None
+
+
+def write(fileobj, job):
+    """Write the ZIP for pack ``job`` to ``fileobj``; returns the number of documents in it."""
+    fmt = job.params['document_format']
+    documents.check_renderer(fmt)
+    policies = (
+        InsurancePolicy.objects.filter(pk__in=job.params['policy_ids'])
+        .select_related('vehicle__category', 'coverage', 'customer__user')
+        .order_by('pk')
+    )
+    count = 0
+    with zipfile.ZipFile(fileobj, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for context, content, error in _documents(contexts(policies), fmt):
+            name = documents.filename(context, fmt)
+            if error is not None:
+                archive.writestr(f'{name}.error.txt', f"{name} could not be rendered: {error}\n")
+                continue
+            archive.writestr(name, content)
+            count += 1
+    return count
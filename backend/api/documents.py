@@ -0,0 +1,299 @@
+"""Rendering and caching of quotation documents (PDF and XLSX).
+
+A document is rendered from a plain dict of its inputs (``quote_context``), so
+the same inputs always produce the same bytes. Rendered files are stored under
+``settings.DOCUMENT_CACHE_ROOT`` named by the SHA-256 of those inputs: the key
+doubles as the HTTP ETag, and a repeat download is a file read. The cache is a
+size-bounded LRU (``DOCUMENT_CACHE_MAX_BYTES``); a hit refreshes the file's
+mtime. Each process keeps a running estimate of the cache size and only scans
+the directory to evict the oldest files when its estimate crosses the budget
+(or after writing a tenth of it, to pick up other processes' writes), so a
+fleet pack does not rescan the directory for every document.
+"""
+import hashlib
+import importlib.util
+import json
+import logging
+import os
+import tempfile
+import threading
+from io import BytesIO
+
+from django.conf import settings
+
+from . import rating
+
+logger = logging.getLogger(__name__)
+
+# Bump when the document layout changes so cached renders are not reused.
+TEMPLATE_VERSION = 1
+MAX_BYTES = getattr(settings, 'DOCUMENT_CACHE_MAX_BYTES', 256 * 1024 * 1024)
+# Eviction trims to this fraction of the budget so the next scan is a while off.
+LOW_WATER = 0.9
+
+CONTENT_TYPES = {
+    'pdf': 'application/pdf',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+class RendererMissing(Exception):
+    """The optional library needed for a format is not installed."""
+
+
+def cache_root():
+    root = getattr(settings, 'DOCUMENT_CACHE_ROOT', os.path.join(settings.BASE_DIR, 'document_cache'))
+    os.makedirs(root, exist_ok=True)
+    return root
+
+
+def quote_context(policy, q=None):
+    """Everything a quotation document shows, as JSON-serializable values."""
+    vehicle = policy.vehicle
+    coverage_type = policy.coverage.name
+    q = q or rating.quote(vehicle.market_value, coverage_type, vehicle.category.name)
+    user = policy.customer.user
+    return {
+        'policy_id': policy.id,
+        'policy_number': policy.policy_number,
+        'coverage': coverage_type,
+        'category': vehicle.category.name,
+        'title': 'Motor Comprehensive I-USD Quotation' if coverage_type == 'comprehensive' else 'Third Party Quotation',
+        'insured_name': user.get_full_name() or user.username,
+        'vehicle_label': f"{vehicle.make} {vehicle.model}",
+        'reg_no': getattr(vehicle, 'registration_number', '') or getattr(vehicle, 'reg_no', '') or '',
+        'year': getattr(vehicle, 'year', '') or '',
+        'rate_version': q['version'],
+        'market_value': str(q['market_value']),
+        'base_premium': str(q['base_premium']),
+        'stamp_duty': str(q['stamp_duty']),
+        'motor_levy': str(q['motor_levy']),
+        'annual_premium': str(q['annual_premium']),
+        'termly_premium': str(q['termly_premium']),
+        'effective_base_rate': rating.percent(q['effective_base_rate']),
+        'stamp_duty_rate': rating.percent(q['stamp_duty_rate']),
+        'motor_levy_rate': rating.percent(q['motor_levy_rate']),
+    }
+
+
+def filename(context, fmt):
+    return f"quotation_{context['policy_number'] or context['policy_id']}.{fmt}"
+
+
+def cache_key(context, fmt):
+    payload = json.dumps({'template': TEMPLATE_VERSION, 'format': fmt, **context}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def render_pdf(ctx):
+    try:
+        from reportlab.lib.pagesizes import A4
+        from reportlab.pdfgen import canvas
+        from reportlab.lib.units import mm
+        from reportlab.lib import colors
+    except ImportError:
+        raise RendererMissing("PDF export requires 'reportlab'")
+    buffer = BytesIO()
+    # invariant=1 drops the creation timestamp and random document id so equal inputs give equal bytes.
+    c = canvas.Canvas(buffer, pagesize=A4, invariant=1)
+    width, height = A4
+    y = height - 30*mm
+    # Header
+    c.setFont('Helvetica-Bold', 16)
+    c.drawString(20*mm, y, 'QUOTATION')
+    y -= 8*mm
+    c.setFont('Helvetica', 10)
+    c.drawString(20*mm, y, f"Name of Insured: {ctx['insured_name'] or 'TBA'}")
+    y -= 6*mm
+    c.drawString(20*mm, y, f"Business Description: {ctx['title']}")
+    y -= 10*mm
+    # Vehicle table (simple)
+    c.setFont('Helvetica-Bold', 11)
+    c.drawString(20*mm, y, 'Motor Vehicles')
+    y -= 6*mm
+    c.setFont('Helvetica', 10)
+    c.drawString(22*mm, y, f"Make and model: {ctx['vehicle_label']}   Year: {ctx['year']}   Reg No: {ctx['reg_no']}   Value: USD {ctx['market_value']}")
+    y -= 10*mm
+    # Premium breakdown
+    c.setFont('Helvetica-Bold', 11)
+    c.drawString(20*mm, y, 'Premium Breakdown')
+    y -= 6*mm
+    c.setFont('Helvetica', 10)
+    c.drawString(22*mm, y, f"Base Premium ({ctx['effective_base_rate']}): USD {ctx['base_premium']}")
+    y -= 5*mm
+    c.drawString(22*mm, y, f"Stamp Duty ({ctx['stamp_duty_rate']} of base): USD {ctx['stamp_duty']}")
+    y -= 5*mm
+    c.drawString(22*mm, y, f"Motor Levy ({ctx['motor_levy_rate']} of base): USD {ctx['motor_levy']}")
+    y -= 6*mm
+    c.setFont('Helvetica-Bold', 11)
+    c.drawString(22*mm, y, f"TOTAL Annual Premium: USD {ctx['annual_premium']}")
+    y -= 5*mm
+    c.setFont('Helvetica', 10)
+    c.drawString(22*mm, y, f"Termly Premium (1/3): USD {ctx['termly_premium']}")
+    y -= 12*mm
+    # Limits and excesses (static text per template)
+    c.setFont('Helvetica-Bold', 11)
+    c.drawString(20*mm, y, 'Own Damage Limits (summary)')
+    y -= 6*mm
+    c.setFont('Helvetica', 9)
+    c.drawString(22*mm, y, 'Medical Expenses: USD 500.00   Towing: Reasonable to nearest garage   Emergency: USD 200.00')
+    y -= 12*mm
+    c.setFont('Helvetica', 8)
+    c.setFillColor(colors.grey)
+    c.drawString(20*mm, y, 'This document is a system-generated quotation preview. Cover is activated upon payment.')
+    c.setFillColor(colors.black)
+    c.showPage()
+    c.save()
+    return buffer.getvalue()
+
+
+def render_xlsx(ctx):
+    try:
+        from openpyxl import Workbook
+        from openpyxl.utils import get_column_letter
+    except ImportError:
+        raise RendererMissing("Excel export requires 'openpyxl'")
+    wb = Workbook()
+    ws = wb.active
+    ws.title = 'Quotation'
+    rows = [
+        ['QUOTATION'],
+        ['Name of Insured', ctx['insured_name'] or 'TBA'],
+        ['Business Description', ctx['title']],
+        [],
+        ['Motor Vehicles'],
+        ['Make and model', ctx['vehicle_label'], 'Year', ctx['year'], 'Reg No', ctx['reg_no'], 'Value (USD)', float(ctx['market_value'])],
+        [],
+        ['Premium Breakdown'],
+        ['Base Premium', float(ctx['base_premium'])],
+        ['Stamp Duty', float(ctx['stamp_duty'])],
+        ['Motor Levy', float(ctx['motor_levy'])],
+        ['TOTAL Annual Premium', float(ctx['annual_premium'])],
+        ['Termly Premium', float(ctx['termly_premium'])],
+    ]
+    for r in rows:
+        ws.append(r)
+    # Autosize
+    for col in ws.columns:
+        max_length = 12
+        col_letter = get_column_letter(col[0].column)
+        for cell in col:
+            try:
+                max_length = max(max_length, len(str(cell.value)))
+            except Exception:
+                pass
+        ws.column_dimensions[col_letter].width = max_length + 2
+    stream = BytesIO()
+    wb.save(stream)
+    return stream.getvalue()
+
+
+RENDERERS = {'pdf': render_pdf, 'xlsx': render_xlsx}
+_REQUIRES = {'pdf': ('reportlab', "PDF export requires 'reportlab'"), 'xlsx': ('openpyxl', "Excel export requires 'openpyxl'")}
+
+
+def check_renderer(fmt):
+    """Raise RendererMissing up front if ``fmt`` cannot be rendered here."""
+    module, message = _REQUIRES[fmt]
+    if importlib.util.find_spec(module) is None:
+        raise RendererMissing(message)
+
+
+def cached_path(key, fmt):
+    """Path of the cached render for ``key`` (refreshing its LRU position), or None."""
+    path = os.path.join(cache_root(), f'{key}.{fmt}')
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    return path
+
+
+class _SizeEstimate:
+    """This process's view of the cache size: the last scanned total plus its own writes since."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.total = None
+        self.written = 0
+
+    def add(self, size):
+        """Record a write; True when the estimate calls for a scan."""
+        with self.lock:
+            self.written += size
+            if self.total is not None:
+                self.total += size
+            return self.total is None or self.total > MAX_BYTES or self.written > MAX_BYTES / 10
+
+    def scanned(self, total):
+        with self.lock:
+            self.total = total
+            self.written = 0
+
+
+_size = _SizeEstimate()
+
+
+def store(key, fmt, content):
+    """Write ``content`` into the cache atomically, evicting old renders once over MAX_BYTES."""
+    root = cache_root()
+    fd, tmp_path = tempfile.mkstemp(dir=root, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as fileobj:
+            fileobj.write(content)
+        path = os.path.join(root, f'{key}.{fmt}')
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if _size.add(len(content)):
+        evict(target_bytes=int(MAX_BYTES * LOW_WATER))
+    return path
+
+
+def evict(max_bytes=None, target_bytes=None):
+    """Once the cache exceeds ``max_bytes``, delete least recently used renders down to ``target_bytes``."""
+    max_bytes = MAX_BYTES if max_bytes is None else max_bytes
+    target_bytes = max_bytes if target_bytes is None else target_bytes
+    entries = []
+    total = 0
+    with os.scandir(cache_root()) as scan:
+        for entry in scan:
+            if not entry.is_file() or entry.name.endswith('.tmp'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+    removed = 0
+    if total > max_bytes:
+        for _, size, path in sorted(entries):
+            if total <= target_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+    _size.scanned(total)
+    return removed
+
+
+def open_document(context, fmt):
+    """Return ``(key, fileobj)`` for the document, rendering it only on a cache miss."""
+    key = cache_key(context, fmt)
+    path = cached_path(key, fmt)
+    if path is not None:
+        try:
+            return key, open(path, 'rb')
+        except FileNotFoundError:
+            # Evicted by another process between the lookup and the open.
+            pass
+    content = RENDERERS[fmt](context)
+    logger.debug("Rendered %s for policy %s (%s)", fmt, context['policy_id'], key)
+    store(key, fmt, content)
+    return key, BytesIO(content)
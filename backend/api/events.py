@@ -0,0 +1,233 @@
+"""Live updates pushed to browsers over server-sent events.
+
+``publish(channel, kind, data)`` sends an event to everyone subscribed to a
+channel: ``user:<id>`` for one user, ``topic:<role>`` for a notification
+topic (see ``notifications.ROLES``). Events are published after the
+surrounding transaction commits: notification inserts (``publish_notification``,
+from the model signals in ``signals`` and from ``notifications.create_direct``
+for bulk inserts) and claim/policy status transitions.
+
+The default broker fans events out to subscribers in the same process. When
+``EVENTS_BROKER_URL`` points at Redis, events go through Redis pub/sub, and a
+listener thread in each process feeds that process's subscribers, so a write
+handled by one worker reaches browsers connected to another. A separate
+process that publishes (``run_notification_worker``) needs Redis, so it
+refuses to start without it (``require_broker``). The stream view
+(``views.event_stream``) is async and needs an ASGI server
+(``Core.asgi:application``): under WSGI each open stream would hold a worker
+thread, so the endpoint is off unless ``EVENTS_STREAM_ENABLED`` is set and
+clients keep polling instead.
+
+``EventSource`` cannot send an Authorization header, and a JWT in the query
+string would end up in access logs. A client therefore POSTs for a ticket
+(``issue_ticket``): a random, single-use token valid for
+``TICKET_SECONDS``, kept in the shared cache, that it passes as
+``?ticket=``.
+"""
+import asyncio
+import json
+import logging
+import secrets
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+STREAM_ENABLED = getattr(settings, 'EVENTS_STREAM_ENABLED', False)
+BROKER_URL = getattr(settings, 'EVENTS_BROKER_URL', '')
+HEARTBEAT_SECONDS = getattr(settings, 'EVENTS_HEARTBEAT_SECONDS', 15)
+# Per-connection backlog; a client this far behind loses its oldest events.
+QUEUE_SIZE = 100
+REDIS_PREFIX = 'events:'
+# Lifetime of an unredeemed stream ticket.
+TICKET_SECONDS = 30
+
+
+class Subscription:
+    """One connected stream: an asyncio queue fed from any thread."""
+
+    def __init__(self, channels, loop):
+        self.channels = tuple(channels)
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+
+    def push(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # The connection's loop has closed; it is unsubscribed as its stream unwinds.
+            pass
+
+    def _put(self, event):
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+
+class LocalBroker:
+    """In-process pub/sub; the stand-in when no cross-process broker is configured."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def subscribe(self, channels):
+        subscription = Subscription(channels, asyncio.get_running_loop())
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscribers.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[channel]
+
+    def publish(self, channel, event):
+        self.deliver(channel, event)
+
+    def deliver(self, channel, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            subscription.push(event)
+
+
+class RedisBroker(LocalBroker):
+    """Redis pub/sub between processes, fanned out locally by a listener thread."""
+
+    def __init__(self, url):
+        super().__init__()
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured("EVENTS_BROKER_URL requires the 'redis' package")
+        self._client = redis.Redis.from_url(url)
+        self._listener = None
+
+    def subscribe(self, channels):
+        self._ensure_listener()
+        return super().subscribe(channels)
+
+    def publish(self, channel, event):
+        self._client.publish(REDIS_PREFIX + channel, json.dumps(event, cls=DjangoJSONEncoder))
+
+    def _ensure_listener(self):
+        with self._lock:
+            if self._listener is not None and self._listener.is_alive():
+                return
+            self._listener = threading.Thread(target=self._listen, name='events-listener', daemon=True)
+            self._listener.start()
+
+    def _listen(self):
+        pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        pubsub.psubscribe(REDIS_PREFIX + '*')
+        try:
+            for message in pubsub.listen():
+                channel = message['channel'].decode()[len(REDIS_PREFIX):]
+                self.deliver(channel, json.loads(message['data']))
+        except Exception:
+            logger.exception("Event listener stopped; it restarts with the next subscription")
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = RedisBroker(BROKER_URL) if BROKER_URL else LocalBroker()
+        return _broker
+
+
+def publish(channel, kind, data):
+    """Send ``{'kind', 'data'}`` to ``channel`` once the current transaction commits."""
+    event = {'kind': kind, 'data': data}
+
+    def send():
+        try:
+            broker().publish(channel, event)
+        except Exception:
+            # Live updates are best-effort; clients still see the change on their next fetch.
+            logger.exception("Could not publish %s event to %s", kind, channel)
+
+    transaction.on_commit(send)
+
+
+def require_broker(process):
+    """Raise ImproperlyConfigured unless events can leave this process (``process`` names it in the error)."""
+    if not BROKER_URL:
+        raise ImproperlyConfigured(
+            f"{process} publishes live events from outside the web processes; set EVENTS_BROKER_URL "
+            "so they reach connected browsers, or use NOTIFICATION_DELIVERY='inline'"
+        )
+
+
+def publish_notification(notification):
+    """Publish a newly created notification to its recipient's or topic's channel."""
+    channel = user_channel(notification.recipient_id) if notification.recipient_id else topic_channel(notification.topic)
+    publish(channel, 'notification', {
+        'id': notification.pk, 'title': notification.title, 'message': notification.message,
+        'type': notification.type, 'topic': notification.topic, 'payload': notification.payload,
+        'created_at': notification.created_at,
+    })
+
+
+def _ticket_key(ticket):
+    return f'events:ticket:{ticket}'
+
+
+def issue_ticket(user):
+    """A single-use ticket that opens one event stream for ``user``."""
+    ticket = secrets.token_urlsafe(32)
+    cache.set(_ticket_key(ticket), user.pk, TICKET_SECONDS)
+    return ticket
+
+
+def redeem_ticket(ticket):
+    """The user id ``ticket`` was issued to, consuming it; None if unknown, expired or already used."""
+    key = _ticket_key(ticket)
+    user_id = cache.get(key)
+    # Only the caller whose delete removes the key may use it.
+    if user_id is None or not cache.delete(key):
+        return None
+    return user_id
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+def topic_channel(topic):
+    return f'topic:{topic}'
+
+
+def format_event(event):
+    return f"event: {event['kind']}\ndata: {json.dumps(event['data'], cls=DjangoJSONEncoder)}\n\n"
+
+
+async def stream(channels):
+    """Subscribe to ``channels`` and yield their events as SSE frames, with keep-alive comments while idle."""
+    subscription = broker().subscribe(channels)
+    try:
+        yield 'retry: 3000\n\n'
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ': keep-alive\n\n'
+                continue
+            yield format_event(event)
+    finally:
+        broker().unsubscribe(subscription)
@@ -0,0 +1,162 @@
+"""Background generation of export artifacts.
+
+The export-jobs API only inserts an ``ExportJob`` row; a separate worker
+process (``manage.py run_export_worker``) claims queued jobs one at a time and
+writes the artifact to ``settings.EXPORT_ROOT``. Completed artifacts are reused
+for identical requests while they are fresh and purged after the retention
+period.
+
+Each job records its duration and ``peak_memory_kb``: the worker process's
+peak resident set size (``ru_maxrss``) when the job finished, i.e. the
+high-water mark the job ran under. ``EXPORT_JOB_TRACE_MEMORY`` additionally
+logs the job's own peak Python allocation via tracemalloc.
+"""
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import document_packs, exports
+from .models import ExportJob
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows.
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Completed artifacts younger than this are handed back for identical requests.
+REUSE_SECONDS = getattr(settings, 'EXPORT_JOB_REUSE_SECONDS', 300)
+# Artifacts (and their job rows) older than this are deleted by the worker.
+RETENTION = timedelta(hours=getattr(settings, 'EXPORT_JOB_RETENTION_HOURS', 24))
+# A running job whose worker died is re-queued after this long.
+STALE_RUNNING = timedelta(minutes=getattr(settings, 'EXPORT_JOB_STALE_MINUTES', 30))
+# Also log each job's peak Python allocation; tracemalloc slows the export down considerably.
+TRACE_MEMORY = getattr(settings, 'EXPORT_JOB_TRACE_MEMORY', False)
+
+
+def export_root():
+    root = getattr(settings, 'EXPORT_ROOT', os.path.join(settings.BASE_DIR, 'exports'))
+    os.makedirs(root, exist_ok=True)
+    return root
+
+
+def peak_rss_kb():
+    """Peak resident set size of this process so far, in KB (None where unsupported)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def find_reusable(export, columns, fmt):
+    """Return a fresh completed job for the same export/columns/format, if any."""
+    cutoff = timezone.now() - timedelta(seconds=REUSE_SECONDS)
+    candidates = ExportJob.objects.filter(
+        export=export, format=fmt, status='completed', finished_at__gte=cutoff,
+    ).order_by('-finished_at')
+    for job in candidates[:5]:
+        if job.columns == columns and job.file_path and os.path.exists(job.file_path):
+            return job
+    return None
+
+
+def claim_next():
+    """Atomically move the oldest queued job to 'running' and return it (or None)."""
+    while True:
+        job = ExportJob.objects.filter(status='queued').order_by('created_at').first()
+        if job is None:
+            return None
+        # Compare-and-swap so two workers never run the same job.
+        claimed = ExportJob.objects.filter(pk=job.pk, status='queued').update(
+            status='running', started_at=timezone.now(),
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+
+
+def _write_artifact(job, path):
+    with open(path, 'wb') as fileobj:
+        if job.export == document_packs.EXPORT:
+            return document_packs.write(fileobj, job)
+        return exports.EXPORTS[job.export].write(fileobj, job.format, job.columns)
+
+
+def download_name(job):
+    """``(filename, content type)`` the artifact of ``job`` is served as."""
+    if job.export == document_packs.EXPORT:
+        return document_packs.download_name(job), document_packs.CONTENT_TYPE
+    return f'{exports.EXPORTS[job.export].filename}.{job.format}', exports.CONTENT_TYPES[job.format]
+
+
+def run(job):
+    """Generate the artifact for a claimed job and record its metrics."""
+    spec = exports.EXPORTS.get(job.export)
+    path = os.path.join(export_root(), f'{job.job_id}_{spec.filename if spec else job.export}.{job.format}')
+    started = time.monotonic()
+    traced_peak = None
+    if TRACE_MEMORY:
+        tracemalloc.start()
+    try:
+        row_count = _write_artifact(job, path)
+    except Exception as exc:
+        logger.exception("Export job %s failed", job.job_id)
+        if os.path.exists(path):
+            os.remove(path)
+        job.status = 'failed'
+        job.error = str(exc)
+    else:
+        job.status = 'completed'
+        job.file_path = path
+        job.file_size = os.path.getsize(path)
+        job.row_count = row_count
+    finally:
+        if TRACE_MEMORY:
+            _, traced_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+    job.duration_ms = int((time.monotonic() - started) * 1000)
+    job.peak_memory_kb = peak_rss_kb()
+    job.finished_at = timezone.now()
+    job.save(update_fields=[
+        'status', 'error', 'file_path', 'file_size', 'row_count',
+        'duration_ms', 'peak_memory_kb', 'finished_at',
+    ])
+    logger.info(
+        "Export job %s %s: %s rows in %sms%s%s",
+        job.job_id, job.status, job.row_count, job.duration_ms,
+        f", peak RSS {job.peak_memory_kb}KB" if job.peak_memory_kb is not None else "",
+        f", traced peak {traced_peak // 1024}KB" if traced_peak is not None else "",
+    )
+    return job
+
+
+def requeue_stale():
+    """Put jobs left 'running' by a dead worker back in the queue."""
+    cutoff = timezone.now() - STALE_RUNNING
+    return ExportJob.objects.filter(status='running', started_at__lt=cutoff).update(status='queued', started_at=None)
+
+
+def purge_expired():
+    """Delete artifacts and job rows older than the retention period."""
+    cutoff = timezone.now() - RETENTION
+    expired = ExportJob.objects.filter(created_at__lt=cutoff)
+    # Reused artifacts are shared between jobs; keep files a live job still points at.
+    live = set(ExportJob.objects.filter(created_at__gte=cutoff).exclude(file_path='').values_list('file_path', flat=True))
+    for path in set(expired.exclude(file_path='').values_list('file_path', flat=True)) - live:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    with transaction.atomic():
+        deleted, _ = expired.delete()
+    return deleted
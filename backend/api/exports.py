@@ -0,0 +1,466 @@
+"""Streaming spreadsheet export engine used by the ``export_*_excel`` endpoints.
+
+Rows are pulled from the database in server-side chunks and written through
+openpyxl's write-only mode, which flushes each row to a temporary file instead
+of building a cell graph in memory. The finished workbook is then streamed to
+the client from that temporary file, so peak memory stays bounded by the chunk
+size rather than the row count.
+
+What each export contains is declared in ``EXPORTS``: a per-model list of
+``Column`` specs (a ``__`` field path plus a formatter). ``ExportSpec.queryset``
+derives the exact ``select_related``/``only()`` set from the requested
+columns, so every export runs a constant number of queries and loads only the
+columns it writes.
+
+Besides xlsx, every export can be requested as ``csv`` or ``ndjson``. Those are
+generated row by row straight from the chunked queryset iterator into a
+``StreamingHttpResponse`` (gzip-compressed on the fly when the client accepts
+it), with no intermediate file.
+"""
+import csv
+import io
+import itertools
+import json
+import tempfile
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence
+from rest_framework.renderers import BaseRenderer
+
+from .models import Claim, InsurancePolicy, Payment, Quotation, Vehicle
+
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+CSV_CONTENT_TYPE = 'text/csv; charset=utf-8'
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+
+FORMATS = ('xlsx', 'csv', 'ndjson')
+CONTENT_TYPES = {
+    'xlsx': XLSX_CONTENT_TYPE,
+    'csv': CSV_CONTENT_TYPE,
+    'ndjson': NDJSON_CONTENT_TYPE,
+}
+
+# Rows fetched per database round-trip while iterating an export queryset.
+CHUNK_SIZE = getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+# Rows sampled (after the header) to size columns; write-only sheets need
+# widths before the first row is written, so we cannot rescan afterwards.
+WIDTH_SAMPLE_SIZE = 200
+MAX_COLUMN_WIDTH = 50
+# Text exports are yielded to the client in blocks of roughly this many bytes.
+STREAM_BUFFER_SIZE = 64 * 1024
+
+
+def iterate(queryset, chunk_size=None):
+    """Iterate a queryset with a server-side cursor in ``chunk_size`` batches."""
+    return queryset.iterator(chunk_size=chunk_size or CHUNK_SIZE)
+
+
+def _column_widths(headers, sample_rows):
+    widths = [len(str(header)) for header in headers]
+    for row in sample_rows:
+        for index, value in enumerate(row):
+            if index < len(widths):
+                widths[index] = max(widths[index], len(str(value if value is not None else '')))
+    return [min(width + 2, MAX_COLUMN_WIDTH) for width in widths]
+
+
+def write_xlsx(fileobj, sheet_title, headers, rows):
+    """Write ``headers`` and the ``rows`` iterable to ``fileobj`` as a write-only workbook.
+
+    Returns the number of data rows written.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Font, PatternFill
+    from openpyxl.utils import get_column_letter
+
+    rows = iter(rows)
+    sample = list(itertools.islice(rows, WIDTH_SAMPLE_SIZE))
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=sheet_title)
+    for index, width in enumerate(_column_widths(headers, sample), start=1):
+        ws.column_dimensions[get_column_letter(index)].width = width
+
+    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+    header_font = Font(bold=True, color="FFFFFF")
+    header_alignment = Alignment(horizontal="center", vertical="center")
+    header_cells = []
+    for header in headers:
+        cell = WriteOnlyCell(ws, value=header)
+        cell.fill = header_fill
+        cell.font = header_font
+        cell.alignment = header_alignment
+        header_cells.append(cell)
+    ws.append(header_cells)
+
+    count = 0
+    for row in itertools.chain(sample, rows):
+        ws.append(row)
+        count += 1
+    wb.save(fileobj)
+    return count
+
+
+def xlsx_response(filename, sheet_title, headers, rows):
+    """Build the workbook in a temporary file and stream it back as an attachment."""
+    tmp = tempfile.TemporaryFile()
+    try:
+        write_xlsx(tmp, sheet_title, headers, rows)
+        tmp.seek(0)
+    except Exception:
+        tmp.close()
+        raise
+    # FileResponse streams the file in blocks and closes (deleting) it when done.
+    return FileResponse(tmp, as_attachment=True, filename=filename, content_type=XLSX_CONTENT_TYPE)
+
+
+def iter_csv(headers, rows):
+    """Yield CSV text for ``headers`` and ``rows`` in ~STREAM_BUFFER_SIZE blocks."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(headers)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= STREAM_BUFFER_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_ndjson(keys, rows):
+    """Yield one JSON object per row (keyed by column key), newline-delimited."""
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    chunk = []
+    size = 0
+    for row in rows:
+        line = encoder.encode(dict(zip(keys, row))) + '\n'
+        chunk.append(line)
+        size += len(line)
+        if size >= STREAM_BUFFER_SIZE:
+            yield ''.join(chunk)
+            chunk = []
+            size = 0
+    yield ''.join(chunk)
+
+
+def write_text(fileobj, fmt, columns, rows):
+    """Write a csv/ndjson export to the binary ``fileobj``; returns the data row count."""
+    counted = _Counter(rows)
+    if fmt == 'csv':
+        blocks = iter_csv([column.header for column in columns], counted)
+    else:
+        blocks = iter_ndjson([column.key for column in columns], counted)
+    for block in blocks:
+        fileobj.write(block.encode('utf-8'))
+    return counted.count
+
+
+class _Counter:
+    """Iterator wrapper counting the rows that pass through it."""
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.count = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        row = next(self.rows)
+        self.count += 1
+        return row
+
+
+def accepts_gzip(request):
+    return request is not None and 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '').lower()
+
+
+def stream_response(filename, fmt, blocks, gzip_encode=False):
+    """Stream text ``blocks`` as an attachment, gzip-encoding them on the fly if asked."""
+    content = (block.encode('utf-8') for block in blocks)
+    if gzip_encode:
+        content = compress_sequence(content)
+    response = StreamingHttpResponse(content, content_type=CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    if gzip_encode:
+        response['Content-Encoding'] = 'gzip'
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+class ExportRenderer(BaseRenderer):
+    """Lets DRF content negotiation accept ``?format=xlsx|csv|ndjson|pdf`` on export views.
+
+    Successful exports bypass rendering entirely (they return file/streaming
+    responses); only error payloads reach ``render()``, which emits JSON.
+    """
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return json.dumps(data, cls=DjangoJSONEncoder).encode('utf-8')
+
+
+class XLSXRenderer(ExportRenderer):
+    media_type = XLSX_CONTENT_TYPE
+    format = 'xlsx'
+
+
+class CSVRenderer(ExportRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class NDJSONRenderer(ExportRenderer):
+    media_type = NDJSON_CONTENT_TYPE
+    format = 'ndjson'
+
+
+class XLSRenderer(XLSXRenderer):
+    format = 'xls'
+
+
+class PDFRenderer(ExportRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+
+
+RENDERERS = [XLSXRenderer, CSVRenderer, NDJSONRenderer]
+# Formats of the rendered quotation documents (``export_quote``).
+DOCUMENT_RENDERERS = [PDFRenderer, XLSXRenderer, XLSRenderer]
+
+
+class Column:
+    """One export column: ``path`` is resolved on each object, then formatted.
+
+    ``needs`` lists the concrete field paths the formatter reads (defaults to
+    ``path`` itself); the join planner uses them to build select_related/only().
+    ``display=True`` renders a choice field through ``get_<field>_display()``.
+    """
+
+    def __init__(self, key, header, path, format=None, needs=None, display=False):
+        self.key = key
+        self.header = header
+        self.path = path
+        self.format = format
+        self.needs = tuple(needs) if needs is not None else (path,)
+        self.display = display
+
+    def value(self, obj):
+        *relations, field = self.path.split('__')
+        for name in relations:
+            obj = getattr(obj, name, None)
+            if obj is None:
+                return self.format(None) if self.format else ''
+        if self.display:
+            value = getattr(obj, f'get_{field}_display')()
+        else:
+            value = getattr(obj, field, None)
+        if self.format:
+            return self.format(value)
+        return '' if value is None else value
+
+
+class ExportSpec:
+    """A model's export: filename, sheet title and the ordered column registry."""
+
+    def __init__(self, model, filename, sheet_title, columns):
+        self.model = model
+        self.filename = filename
+        self.sheet_title = sheet_title
+        self.columns = columns
+        self.columns_by_key = {column.key: column for column in columns}
+
+    def select(self, keys=None):
+        """Return the columns for ``keys`` (all columns when empty); raises ValueError on unknown keys."""
+        if not keys:
+            return list(self.columns)
+        unknown = [key for key in keys if key not in self.columns_by_key]
+        if unknown:
+            raise ValueError(
+                f"Unknown columns: {', '.join(unknown)}. Valid columns: {', '.join(self.columns_by_key)}"
+            )
+        return [self.columns_by_key[key] for key in keys]
+
+    def queryset(self, columns):
+        """Queryset loading exactly the fields and joins the given columns need."""
+        fields = set()
+        relations = set()
+        for column in columns:
+            for path in column.needs:
+                fields.add(path)
+                parts = path.split('__')
+                if len(parts) > 1:
+                    relations.add('__'.join(parts[:-1]))
+        # Only keep the deepest relation paths; select_related('a__b') implies 'a'.
+        relations = {
+            relation for relation in relations
+            if not any(other.startswith(relation + '__') for other in relations)
+        }
+        qs = self.model.objects.all()
+        if relations:
+            qs = qs.select_related(*sorted(relations))
+        return qs.only(*sorted(fields)).order_by('pk')
+
+    def rows(self, columns, queryset=None):
+        queryset = self.queryset(columns) if queryset is None else queryset
+        for obj in iterate(queryset):
+            yield [column.value(obj) for column in columns]
+
+    def write(self, fileobj, fmt, keys=None):
+        """Write the export in ``fmt`` to the binary ``fileobj``; returns the data row count."""
+        columns = self.select(keys)
+        if fmt == 'xlsx':
+            return write_xlsx(fileobj, self.sheet_title, [column.header for column in columns], self.rows(columns))
+        return write_text(fileobj, fmt, columns, self.rows(columns))
+
+    def response(self, keys=None, fmt='xlsx', gzip_encode=False):
+        """Attachment response in ``fmt``; csv/ndjson stream without an intermediate file."""
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown format: {fmt}. Valid formats: {', '.join(FORMATS)}")
+        columns = self.select(keys)
+        filename = f'{self.filename}.{fmt}'
+        if fmt == 'csv':
+            blocks = iter_csv([column.header for column in columns], self.rows(columns))
+            return stream_response(filename, fmt, blocks, gzip_encode)
+        if fmt == 'ndjson':
+            blocks = iter_ndjson([column.key for column in columns], self.rows(columns))
+            return stream_response(filename, fmt, blocks, gzip_encode)
+        return xlsx_response(filename, self.sheet_title, [column.header for column in columns], self.rows(columns))
+
+
+def parse_columns(value):
+    """Split a ``?columns=a,b`` query parameter into a list of keys."""
+    return [key.strip() for key in (value or '').split(',') if key.strip()]
+
+
+# Formatters
+def _money(value):
+    return float(value) if value is not None else ''
+
+
+def _money_or_blank(value):
+    return float(value) if value else ''
+
+
+def _date(value):
+    return value.strftime('%Y-%m-%d') if value else ''
+
+
+def _datetime(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S') if value else ''
+
+
+def _full_name(user):
+    return f"{user.first_name} {user.last_name}".strip() if user else ''
+
+
+def _full_name_or_username(user):
+    return (_full_name(user) or user.username) if user else ''
+
+
+def _make_model(vehicle):
+    return f"{vehicle.make} {vehicle.model}" if vehicle else ''
+
+
+def _truncate(value, length=100):
+    value = value or ''
+    return value[:length] + '...' if len(value) > length else value
+
+
+def _yes_no(value):
+    return 'Yes' if value else 'No'
+
+
+_NAME_FIELDS = ('first_name', 'last_name')
+
+
+def _person(key, header, relation, fallback_username=False):
+    fields = _NAME_FIELDS + (('username',) if fallback_username else ())
+    return Column(
+        key, header, relation,
+        format=_full_name_or_username if fallback_username else _full_name,
+        needs=[f'{relation}__{field}' for field in fields],
+    )
+
+
+EXPORTS = {
+    'policies': ExportSpec(InsurancePolicy, 'policies_export', 'Policies', [
+        Column('policy_number', 'Policy Number', 'policy_number'),
+        _person('customer', 'Customer', 'customer__user', fallback_username=True),
+        Column('vehicle_number', 'Vehicle Number', 'vehicle__vehicle_number'),
+        Column('make_model', 'Make/Model', 'vehicle', format=_make_model, needs=['vehicle__make', 'vehicle__model']),
+        Column('year', 'Year', 'vehicle__year'),
+        Column('coverage', 'Coverage Type', 'coverage__name', display=True),
+        Column('premium_amount', 'Premium Amount', 'premium_amount', format=_money),
+        Column('coverage_amount', 'Coverage Amount', 'coverage_amount', format=_money),
+        Column('start_date', 'Start Date', 'start_date', format=_date),
+        Column('end_date', 'End Date', 'end_date', format=_date),
+        Column('status', 'Status', 'status', display=True),
+        Column('created_at', 'Created At', 'created_at', format=_datetime),
+    ]),
+    'payments': ExportSpec(Payment, 'payments_export', 'Payments', [
+        Column('payment_id', 'Payment ID', 'payment_id'),
+        Column('policy_number', 'Policy Number', 'policy__policy_number'),
+        _person('customer', 'Customer', 'policy__customer__user', fallback_username=True),
+        Column('vehicle_number', 'Vehicle Number', 'policy__vehicle__vehicle_number'),
+        Column('amount', 'Amount', 'amount', format=_money),
+        Column('payment_method', 'Payment Method', 'payment_method', display=True),
+        Column('status', 'Status', 'status', display=True),
+        Column('transaction_reference', 'Transaction Reference', 'transaction_reference'),
+        Column('payment_date', 'Payment Date', 'payment_date', format=_datetime),
+        Column('due_date', 'Due Date', 'due_date', format=_date),
+        _person('verified_by', 'Verified By', 'verified_by'),
+        Column('verified_at', 'Verified At', 'verified_at', format=_datetime),
+    ]),
+    'quotations': ExportSpec(Quotation, 'quotations_export', 'Quotations', [
+        Column('quote_id', 'Quote ID', 'quote_id'),
+        Column('policy_number', 'Policy Number', 'policy__policy_number'),
+        _person('customer', 'Customer', 'policy__customer__user', fallback_username=True),
+        Column('vehicle_number', 'Vehicle Number', 'policy__vehicle__vehicle_number'),
+        Column('premium_amount', 'Premium Amount', 'premium_amount', format=_money),
+        Column('coverage_amount', 'Coverage Amount', 'coverage_amount', format=_money),
+        Column('currency', 'Currency', 'currency'),
+        Column('status', 'Status', 'status', display=True),
+        _person('created_by', 'Created By', 'created_by'),
+        Column('created_at', 'Created At', 'created_at', format=_datetime),
+        _person('decided_by', 'Decided By', 'decided_by'),
+        Column('customer_decision_at', 'Customer Decision At', 'customer_decision_at', format=_datetime),
+    ]),
+    'claims': ExportSpec(Claim, 'claims_export', 'Claims', [
+        Column('claim_id', 'Claim ID', 'claim_id'),
+        Column('policy_number', 'Policy Number', 'policy__policy_number'),
+        _person('customer', 'Customer', 'policy__customer__user', fallback_username=True),
+        Column('vehicle_number', 'Vehicle Number', 'policy__vehicle__vehicle_number'),
+        Column('incident_date', 'Incident Date', 'incident_date', format=_date),
+        Column('claim_date', 'Claim Date', 'claim_date', format=_datetime),
+        Column('description', 'Description', 'description', format=_truncate),
+        Column('estimated_amount', 'Estimated Amount', 'estimated_amount', format=_money),
+        Column('approved_amount', 'Approved Amount', 'approved_amount', format=_money_or_blank),
+        Column('status', 'Status', 'status', display=True),
+        Column('approval_status', 'Approval Status', 'approval_status', display=True),
+        Column('priority', 'Priority', 'priority', display=True),
+        _person('processed_by', 'Processed By', 'processed_by'),
+        Column('processed_at', 'Processed At', 'processed_at', format=_datetime),
+        Column('requires_investigation', 'Requires Investigation', 'requires_investigation', format=_yes_no),
+    ]),
+    'vehicles': ExportSpec(Vehicle, 'vehicles_export', 'Vehicles', [
+        Column('vehicle_number', 'Vehicle Number', 'vehicle_number'),
+        _person('customer', 'Customer', 'customer__user', fallback_username=True),
+        Column('category', 'Category', 'category__name', display=True),
+        Column('make', 'Make', 'make'),
+        Column('model', 'Model', 'model'),
+        Column('year', 'Year', 'year'),
+        Column('engine_number', 'Engine Number', 'engine_number'),
+        Column('chassis_number', 'Chassis Number', 'chassis_number'),
+        Column('market_value', 'Market Value', 'market_value', format=_money),
+        Column('date_registered', 'Date Registered', 'date_registered', format=_datetime),
+    ]),
+}
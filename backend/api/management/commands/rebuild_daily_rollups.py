@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from api import rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild the DailyRollup fact table from claims, policies and customers"
+
+    def handle(self, *args, **options):
+        count = rollups.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Daily rollups rebuilt. Rows: {count}"))
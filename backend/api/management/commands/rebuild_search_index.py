@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from api import search_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the customer and vehicle full-text search index"
+
+    def handle(self, *args, **options):
+        counts = search_index.rebuild()
+        if not counts:
+            self.stdout.write(self.style.WARNING("Search index is not available on this database; nothing to rebuild."))
+            return
+        summary = ', '.join(f"{kind}: {count}" for kind, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Search index rebuilt. Rows: {summary}"))
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import export_jobs
+
+
+class Command(BaseCommand):
+    help = "Process queued export jobs, writing artifacts to EXPORT_ROOT"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Process the current queue and exit')
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds to sleep when the queue is empty')
+
+    def handle(self, *args, **options):
+        last_housekeeping = 0.0
+        while True:
+            if time.monotonic() - last_housekeeping > 60:
+                requeued = export_jobs.requeue_stale()
+                purged = export_jobs.purge_expired()
+                if requeued or purged:
+                    self.stdout.write(f"Re-queued {requeued} stale job(s), purged {purged} expired job(s)")
+                last_housekeeping = time.monotonic()
+
+            job = export_jobs.claim_next()
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+                continue
+
+            job = export_jobs.run(job)
+            style = self.style.SUCCESS if job.status == 'completed' else self.style.ERROR
+            peak = f", peak RSS {job.peak_memory_kb}KB" if job.peak_memory_kb is not None else ""
+            self.stdout.write(style(
+                f"{job.job_id} {job.export}: {job.status} ({job.row_count or 0} rows, {job.duration_ms}ms{peak})"
+            ))
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import events, notifications
+
+
+class Command(BaseCommand):
+    help = "Deliver queued role notifications, expanding each event to the role's members"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Process the current queue and exit')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to sleep when the queue is empty')
+
+    def handle(self, *args, **options):
+        # Deliveries made here must reach browsers streaming from the web processes.
+        events.require_broker('run_notification_worker')
+        last_housekeeping = 0.0
+        while True:
+            if time.monotonic() - last_housekeeping > 60:
+                requeued = notifications.requeue_stale()
+                purged = notifications.purge_delivered()
+                if requeued or purged:
+                    self.stdout.write(f"Re-queued {requeued} stale event(s), purged {purged} delivered event(s)")
+                last_housekeeping = time.monotonic()
+
+            event = notifications.claim_next()
+            if event is None:
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+                continue
+
+            event = notifications.deliver(event)
+            style = self.style.SUCCESS if event.status == 'delivered' else self.style.ERROR
+            self.stdout.write(style(f"Event {event.pk} '{event.title}' -> {event.role}: {event.status} ({event.recipient_count or 0} recipients)"))
@@ -0,0 +1,52 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import simulation
+
+
+class Command(BaseCommand):
+    help = "Re-rate the active policy book under candidate rate tables and report premium deltas"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--table', action='append', default=[], dest='versions',
+                            help='Published rate table version to compare (repeatable)')
+        parser.add_argument('--overrides', action='append', default=[],
+                            help='JSON rate overrides on the active table, e.g. '
+                                 '\'{"coverages": {"comprehensive": {"motor_levy_rate": "0.025"}}}\' (repeatable)')
+        parser.add_argument('--json', action='store_true', help='Print the full result as JSON')
+
+    def handle(self, *args, **options):
+        scenarios = [{'version': version} for version in options['versions']]
+        for number, raw in enumerate(options['overrides'], start=1):
+            try:
+                overrides = json.loads(raw)
+            except json.JSONDecodeError as exc:
+                raise CommandError(f"--overrides is not valid JSON: {exc}")
+            scenarios.append({'name': f'overrides-{number}', 'overrides': overrides})
+        try:
+            result = simulation.simulate(scenarios)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2))
+            return
+
+        self.stdout.write(
+            f"Active table {result['current_version']}: {result['policies']} active policies "
+            f"(load {result['load_ms']}ms, rating {result['rate_ms']}ms)"
+        )
+        for scenario in result['scenarios']:
+            totals = scenario['totals']
+            self.stdout.write(self.style.SUCCESS(
+                f"\n{scenario['name']}: {totals['current_annual_premium']} -> {totals['candidate_annual_premium']} "
+                f"(delta {totals['delta']}, {totals['delta_pct']}%)"
+            ))
+            for dimension in simulation.DIMENSIONS:
+                self.stdout.write(f"  by {dimension}:")
+                for row in scenario[f'by_{dimension}']:
+                    self.stdout.write(
+                        f"    {row[dimension] or '-':<20} {row['policies']:>9} policies  "
+                        f"delta {row['delta']:>14}  ({row['delta_pct']}%)"
+                    )
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-16 20:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_message'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('coverage', models.CharField(blank=True, default='', max_length=50)),
+                ('vehicle_category', models.CharField(blank=True, default='', max_length=50)),
+                ('claims_count', models.IntegerField(default=0)),
+                ('claims_pending', models.IntegerField(default=0)),
+                ('claims_approved', models.IntegerField(default=0)),
+                ('claims_rejected', models.IntegerField(default=0)),
+                ('claims_estimated_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('claims_approved_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('policies_count', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('customers_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['date'],
+                'constraints': [models.UniqueConstraint(fields=('date', 'coverage', 'vehicle_category'), name='api_dailyrollup_unique_key')],
+            },
+        ),
+    ]
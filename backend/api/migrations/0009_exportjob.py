@@ -0,0 +1,43 @@
+# Generated by Django 5.2.5 on 2026-10-16 20:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_dailyrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_id', models.CharField(blank=True, max_length=20, unique=True)),
+                ('export', models.CharField(max_length=30)),
+                ('columns', models.JSONField(blank=True, default=list)),
+                ('format', models.CharField(choices=[('xlsx', 'Excel (xlsx)')], default='xlsx', max_length=10)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], db_index=True, default='queued', max_length=10)),
+                ('file_path', models.CharField(blank=True, max_length=255)),
+                ('file_size', models.BigIntegerField(blank=True, null=True)),
+                ('row_count', models.IntegerField(blank=True, null=True)),
+                ('duration_ms', models.IntegerField(blank=True, null=True)),
+                ('peak_memory_kb', models.IntegerField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('requested_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='export_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='exportjob',
+            index=models.Index(fields=['status', 'created_at'], name='api_exportj_status_b92980_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-16 20:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_exportjob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='exportjob',
+            name='format',
+            field=models.CharField(choices=[('xlsx', 'Excel (xlsx)'), ('csv', 'CSV'), ('ndjson', 'Newline-delimited JSON')], default='xlsx', max_length=10),
+        ),
+    ]
@@ -0,0 +1,53 @@
+from django.db import migrations
+from django.db.utils import OperationalError
+
+
+TOKENIZE = "tokenize=\"unicode61 remove_diacritics 2\", prefix='2 3'"
+
+CREATE = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS api_search_customer USING fts5(name, customer_id, email, national_id, phone, town, {TOKENIZE})",
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS api_search_vehicle USING fts5(vehicle_number, plate, make, model, {TOKENIZE})",
+]
+POPULATE = [
+    "INSERT INTO api_search_customer (rowid, name, customer_id, email, national_id, phone, town) "
+    "SELECT c.id, TRIM(COALESCE(u.first_name, '') || ' ' || COALESCE(u.last_name, '')), c.customer_id, "
+    "COALESCE(u.email, ''), COALESCE(u.national_id, ''), COALESCE(u.phone_number, ''), COALESCE(c.town, '') "
+    "FROM api_customer c JOIN api_user u ON u.id = c.user_id",
+    "INSERT INTO api_search_vehicle (rowid, vehicle_number, plate, make, model) "
+    "SELECT v.id, v.vehicle_number, UPPER(REPLACE(REPLACE(v.vehicle_number, ' ', ''), '-', '')), v.make, v.model "
+    "FROM api_vehicle v",
+]
+
+
+def create_index(apps, schema_editor):
+    # FTS5 is SQLite-only; other backends keep the icontains search.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            for statement in CREATE:
+                cursor.execute(statement)
+        except OperationalError:
+            # SQLite built without FTS5.
+            return
+        for statement in POPULATE:
+            cursor.execute(statement)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS api_search_customer")
+        cursor.execute("DROP TABLE IF EXISTS api_search_vehicle")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_exportjob_text_formats'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
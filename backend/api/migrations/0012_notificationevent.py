@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-16 21:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(choices=[('underwriters', 'Underwriters'), ('staff', 'Underwriters and managers')], max_length=20)),
+                ('title', models.CharField(max_length=200)),
+                ('message', models.TextField(blank=True)),
+                ('type', models.CharField(choices=[('quotation', 'Quotation'), ('status_update', 'Status Update'), ('message', 'Message'), ('payment_success', 'Payment Success'), ('payment_verification', 'Payment Verification'), ('policy_application', 'Policy Application')], default='message', max_length=20)),
+                ('payload', models.JSONField(blank=True, default=dict)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('delivered', 'Delivered'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('recipient_count', models.IntegerField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('delivered_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='notificationevent',
+            index=models.Index(fields=['status', 'created_at'], name='api_notific_status_5dcd5e_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.5 on 2026-10-16 22:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_notification_topics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificationcursor',
+            name='unread',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['recipient', 'is_read'], name='api_notific_recipie_28b188_idx'),
+        ),
+    ]
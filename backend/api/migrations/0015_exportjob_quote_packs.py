@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-17 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_notification_unread_counter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportjob',
+            name='params',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AlterField(
+            model_name='exportjob',
+            name='format',
+            field=models.CharField(choices=[('xlsx', 'Excel (xlsx)'), ('csv', 'CSV'), ('ndjson', 'Newline-delimited JSON'), ('zip', 'ZIP archive')], default='xlsx', max_length=10),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-17 10:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_exportjob_quote_packs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificationevent',
+            name='attempts',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='notificationevent',
+            name='not_before',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,9 +1,57 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import RegexValidator
 import uuid
 from decimal import Decimal
 
+
+STAFF_USER_TYPES = ('manager', 'underwriter')
+
+
+def is_staff_like(user):
+    """Managers, underwriters and Django staff see every customer's rows."""
+    if not user or not user.is_authenticated:
+        return False
+    return bool(user.is_staff or user.user_type in STAFF_USER_TYPES)
+
+
+class OwnedQuerySet(models.QuerySet):
+    """Row-level scoping for customer-owned models.
+
+    Each model names the lookup from its rows to the owning ``User`` in
+    ``owner_path`` (e.g. ``'policy__customer__user'``), so ownership is a join
+    filter on the user id rather than a lookup of ``user.customer_profile``.
+    """
+
+    def for_principal(self, user):
+        """Rows ``user`` may access: everything for staff, their own rows for customers, nothing otherwise."""
+        if is_staff_like(user):
+            return self
+        if not user or not user.is_authenticated or user.user_type != 'customer':
+            return self.none()
+        path = self.model.owner_path
+        queryset = self.filter(**{path: user.pk})
+        if '__' in path:
+            # The filter already joins these; selecting them lets owned_by() check without queries.
+            queryset = queryset.select_related(path.rsplit('__', 1)[0])
+        return queryset
+
+
+def owned_by(obj, user):
+    """True if ``obj`` belongs to ``user``, comparing foreign-key ids along ``owner_path``."""
+    path = getattr(type(obj), 'owner_path', None)
+    if path is None or user is None:
+        return False
+    if path == 'pk':
+        return obj.pk == user.pk
+    *relations, field = path.split('__')
+    for name in relations:
+        obj = getattr(obj, name, None)
+        if obj is None:
+            return False
+    return getattr(obj, f'{field}_id', None) == user.pk
+
+
 class User(AbstractUser):
     USER_TYPES = [
         ('customer', 'Customer'),
@@ -19,6 +67,8 @@ class User(AbstractUser):
     date_created = models.DateTimeField(auto_now_add=True)
     is_active = models.BooleanField(default=True)
 
+    owner_path = 'pk'
+
     def __str__(self):
         return f"{self.username} ({self.get_user_type_display()})"
 
@@ -46,6 +96,9 @@ class Customer(models.Model):
     town = models.CharField(max_length=100)
     date_registered = models.DateTimeField(auto_now_add=True)
 
+    objects = OwnedQuerySet.as_manager()
+    owner_path = 'user'
+
     def save(self, *args, **kwargs):
         if not self.customer_id:
             self.customer_id = f"CUST{str(uuid.uuid4().hex[:8]).upper()}"
@@ -85,6 +138,9 @@ class Vehicle(models.Model):
     market_value = models.DecimalField(max_digits=12, decimal_places=2)
     date_registered = models.DateTimeField(auto_now_add=True)
 
+    objects = OwnedQuerySet.as_manager()
+    owner_path = 'customer__user'
+
     def __str__(self):
         return f"{self.make} {self.model} - {self.vehicle_number}"
 
@@ -122,7 +178,10 @@ class InsurancePolicy(models.Model):
     status = models.CharField(max_length=20, choices=POLICY_STATUS, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
-    
+
+    objects = OwnedQuerySet.as_manager()
+    owner_path = 'customer__user'
+
     def clean(self):
         from django.core.exceptions import ValidationError
         # Ensure policy customer matches vehicle's customer
@@ -200,7 +259,10 @@ class Claim(models.Model):
     investigation_notes = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
-    
+
+    objects = OwnedQuerySet.as_manager()
+    owner_path = 'policy__customer__user'
+
     def save(self, *args, **kwargs):
         if not self.claim_id:
             self.claim_id = f"CLM{str(uuid.uuid4().hex[:6]).upper()}"
@@ -240,7 +302,10 @@ class ClaimDocument(models.Model):
     document_type = models.CharField(max_length=100)
     document = models.FileField(upload_to='claim_documents/')
     uploaded_at = models.DateTimeField(auto_now_add=True)
-    
+
+    objects = OwnedQuerySet.as_manager()
+    owner_path = 'claim__policy__customer__user'
+
     def __str__(self):
         return f"{self.document_type} - {self.claim.claim_id}"
 
@@ -265,7 +330,10 @@ class ContactInquiry(models.Model):
     responded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='responses')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
-    
+
+    objects = OwnedQuerySet.as_manager()
+    owner_path = 'customer__user'
+
     def save(self, *args, **kwargs):
         if not self.inquiry_id:
             self.inquiry_id = f"INQ{str(uuid.uuid4().hex[:8]).upper()}"
@@ -285,6 +353,37 @@ class DashboardStats(models.Model):
     def __str__(self):
         return f"Stats for {self.year}"
 
+class DailyRollup(models.Model):
+    """Per-day fact table for dashboard/report charts.
+
+    Rows are keyed by (date, coverage, vehicle_category) where the dimensions
+    hold the InsuranceCoverage/VehicleCategory ``name`` keys ('' when a fact
+    has no such dimension, e.g. customer registrations). Maintained
+    incrementally by the signal handlers in ``api.signals`` using
+    ``api.rollups``; rebuild with ``manage.py rebuild_daily_rollups``.
+    """
+    date = models.DateField()
+    coverage = models.CharField(max_length=50, blank=True, default='')
+    vehicle_category = models.CharField(max_length=50, blank=True, default='')
+    claims_count = models.IntegerField(default=0)
+    claims_pending = models.IntegerField(default=0)
+    claims_approved = models.IntegerField(default=0)
+    claims_rejected = models.IntegerField(default=0)
+    claims_estimated_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    claims_approved_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    policies_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    customers_count = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['date']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'coverage', 'vehicle_category'], name='api_dailyrollup_unique_key'),
+        ]
+
+    def __str__(self):
+        return f"Rollup {self.date} ({self.coverage or '-'}/{self.vehicle_category or '-'})"
+
 class Payment(models.Model):
     PAYMENT_STATUS = [
         ('pending', 'Pending'),
@@ -313,7 +412,10 @@ class Payment(models.Model):
     due_date = models.DateField(null=True, blank=True)
     verified_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='verified_payments')
     verified_at = models.DateTimeField(null=True, blank=True)
-    
+
+    objects = OwnedQuerySet.as_manager()
+    owner_path = 'policy__customer__user'
+
     def save(self, *args, **kwargs):
         if not self.payment_id:
             self.payment_id = f"PAY{str(uuid.uuid4().hex[:8]).upper()}"
@@ -332,16 +434,80 @@ class Notification(models.Model):
         ('policy_application', 'Policy Application'),
     ]
 
-    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
+    # Role topics: a topic notification is stored once and shown to every member of the role.
+    TOPIC_CHOICES = [
+        ('underwriters', 'Underwriters'),
+        ('staff', 'Underwriters and managers'),
+    ]
+
+    # Exactly one of recipient (direct) and topic (role broadcast) is set.
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications', null=True, blank=True)
+    topic = models.CharField(max_length=20, choices=TOPIC_CHOICES, blank=True)
     title = models.CharField(max_length=200)
     message = models.TextField(blank=True)
     type = models.CharField(max_length=20, choices=NOTIF_TYPES, default='message')
     payload = models.JSONField(default=dict, blank=True)
+    # Direct notifications only; topic reads are tracked per user (NotificationCursor/NotificationReceipt).
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = OwnedQuerySet.as_manager()
+    owner_path = 'recipient'
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['topic', 'created_at']),
+            models.Index(fields=['recipient', 'is_read']),
+        ]
+
+    def save(self, *args, **kwargs):
+        from . import notifications
+
+        adding = self._state.adding
+        update_fields = kwargs.get('update_fields')
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                # Counted in the same transaction as the insert; topic counters are bumped on delivery.
+                notifications.count_direct([self])
+            elif self.recipient_id and (update_fields is None or 'is_read' in update_fields):
+                # The read flag may have changed outside mark_read (e.g. in the admin); recount on next read.
+                NotificationCursor.objects.filter(user_id=self.recipient_id).update(unread=None)
+
     def __str__(self):
-        return f"Notification to {self.recipient.username}: {self.title}"
+        target = self.recipient.username if self.recipient_id else self.topic
+        return f"Notification to {target}: {self.title}"
+
+
+class NotificationCursor(models.Model):
+    """Per-user notification state.
+
+    Topic notifications up to ``topic_read_through`` are read, and ``unread``
+    is the user's unread count (direct plus topic), kept in step with inserts
+    and reads. ``unread`` is null until first computed, or after the user's
+    role changes, and is then recounted on demand.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='notification_cursor')
+    topic_read_through = models.BigIntegerField(default=0)
+    unread = models.IntegerField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.user.username} read topics through {self.topic_read_through}"
+
+
+class NotificationReceipt(models.Model):
+    """A single topic notification read by one user (above their cursor)."""
+    notification = models.ForeignKey(Notification, on_delete=models.CASCADE, related_name='receipts')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notification_receipts')
+    read_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'notification'], name='api_notificationreceipt_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} read {self.notification_id}"
 
 class Quotation(models.Model):
     STATUS_CHOICES = [
@@ -365,10 +531,106 @@ class Quotation(models.Model):
     customer_decision_at = models.DateTimeField(null=True, blank=True)
     decided_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="decided_quotations")
 
+    objects = OwnedQuerySet.as_manager()
+    owner_path = 'policy__customer__user'
+
     def save(self, *args, **kwargs):
         if not self.quote_id:
             self.quote_id = f"QTE{str(uuid.uuid4().hex[:8]).upper()}"
         super().save(*args, **kwargs)
 
     def __str__(self):
-        return f"Quotation {self.quote_id} for {self.policy.policy_number} ({self.status})"
\ No newline at end of file
+        return f"Quotation {self.quote_id} for {self.policy.policy_number} ({self.status})"
+
+
+class ExportJob(models.Model):
+    """A queued export whose artifact is generated off the request path.
+
+    Jobs are created by the export-jobs API (and by the quotation pack action,
+    see ``api.document_packs``) and picked up by the ``run_export_worker``
+    management command, which writes the file under ``settings.EXPORT_ROOT``
+    and records size/timing metrics on the row.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    FORMAT_CHOICES = [
+        ('xlsx', 'Excel (xlsx)'),
+        ('csv', 'CSV'),
+        ('ndjson', 'Newline-delimited JSON'),
+        ('zip', 'ZIP archive'),
+    ]
+
+    job_id = models.CharField(max_length=20, unique=True, blank=True)
+    export = models.CharField(max_length=30)
+    columns = models.JSONField(default=list, blank=True)
+    params = models.JSONField(default=dict, blank=True)
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES, default='xlsx')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued', db_index=True)
+    requested_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='export_jobs')
+    file_path = models.CharField(max_length=255, blank=True)
+    file_size = models.BigIntegerField(null=True, blank=True)
+    row_count = models.IntegerField(null=True, blank=True)
+    duration_ms = models.IntegerField(null=True, blank=True)
+    peak_memory_kb = models.IntegerField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self.job_id:
+            self.job_id = f"EXP{str(uuid.uuid4().hex[:8]).upper()}"
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"Export {self.job_id} ({self.export}, {self.status})"
+
+
+class NotificationEvent(models.Model):
+    """A role-addressed notification waiting to be delivered off the request path.
+
+    Requests only insert the event; it is published as a single topic
+    ``Notification`` for the role after the request commits (or by
+    ``run_notification_worker``). A failed delivery is re-queued with backoff
+    (``attempts``, ``not_before``) until it runs out of attempts.
+    """
+    ROLE_CHOICES = Notification.TOPIC_CHOICES
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('delivered', 'Delivered'),
+        ('failed', 'Failed'),
+    ]
+
+    role = models.CharField(max_length=20, choices=ROLE_CHOICES)
+    title = models.CharField(max_length=200)
+    message = models.TextField(blank=True)
+    type = models.CharField(max_length=20, choices=Notification.NOTIF_TYPES, default='message')
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    recipient_count = models.IntegerField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.IntegerField(default=0)
+    not_before = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.title} -> {self.role} ({self.status})"
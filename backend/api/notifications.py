@@ -0,0 +1,285 @@
+"""Role-wide notifications: queued off the request path, stored once per event.
+
+Views call ``broadcast(role, ...)``, which inserts a single
+``NotificationEvent`` in the request's transaction. By default
+(``NOTIFICATION_DELIVERY = 'inline'``) the event is published once the request
+commits as one topic ``Notification`` (``topic=role``, no recipient), so
+neither request latency nor storage grows with staff headcount. With
+``NOTIFICATION_DELIVERY = 'worker'`` requests only queue the event and a
+worker (``manage.py run_notification_worker``) claims and publishes it.
+
+A failed delivery is re-queued with exponential backoff until it has been
+tried ``NOTIFICATION_MAX_ATTEMPTS`` times, then left ``failed``. The worker
+retries due events; in inline mode the next delivery in the process does.
+
+A user's inbox merges their direct notifications with the topics of their
+role created since they joined. Topic read state is per user: a cursor
+(``NotificationCursor.topic_read_through``) marks everything up to an id as
+read, and ``NotificationReceipt`` rows record single reads above it.
+
+``NotificationCursor.unread`` holds each user's unread count so badge polling
+is a single indexed lookup. Direct inserts (``Notification.save`` and bulk
+``create_direct``, both through ``count_direct``), topic deliveries and reads
+adjust it in the same transaction as the change, and readers lock the cursor
+row first so concurrent inserts queue behind them. Code that writes direct
+notifications any other way must go through these helpers or reset the
+counter to None (recount on next read).
+"""
+import logging
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import BooleanField, Case, Exists, F, Max, OuterRef, Q, Value, When
+from django.utils import timezone
+
+from . import events
+from .models import Notification, NotificationCursor, NotificationEvent, NotificationReceipt, User
+
+logger = logging.getLogger(__name__)
+
+# User types making up each broadcast role.
+ROLES = {
+    'underwriters': ('underwriter',),
+    'staff': ('underwriter', 'manager'),
+}
+DELIVERY = getattr(settings, 'NOTIFICATION_DELIVERY', 'inline')
+ROLE_CACHE_SECONDS = getattr(settings, 'NOTIFICATION_ROLE_CACHE_SECONDS', 300)
+MAX_ATTEMPTS = getattr(settings, 'NOTIFICATION_MAX_ATTEMPTS', 5)
+# Delay before the first retry; doubled for each further attempt.
+RETRY_BACKOFF = timedelta(seconds=30)
+# Due retries delivered after each inline delivery.
+INLINE_RETRY_BATCH = 10
+# A running event whose worker died is re-queued after this long.
+STALE_RUNNING = timedelta(minutes=10)
+# Delivered events are kept this long for inspection, then purged.
+RETENTION = timedelta(days=7)
+
+
+def _members_key(role):
+    return f'notifications:role:{role}'
+
+
+def members(role):
+    """Ids of the active users in ``role`` (cached; dropped on user writes by ``signals``)."""
+    key = _members_key(role)
+    ids = cache.get(key)
+    if ids is None:
+        ids = list(
+            User.objects.filter(user_type__in=ROLES[role], is_active=True).order_by('pk').values_list('pk', flat=True)
+        )
+        cache.set(key, ids, ROLE_CACHE_SECONDS)
+    return ids
+
+
+def forget_members():
+    cache.delete_many([_members_key(role) for role in ROLES])
+
+
+def broadcast(role, title, message='', type='message', payload=None):
+    """Queue a notification for every member of ``role``; returns the event."""
+    if role not in ROLES:
+        raise ValueError(f'Unknown notification role: {role}')
+    event = NotificationEvent.objects.create(role=role, title=title, message=message, type=type, payload=payload or {})
+    if DELIVERY == 'inline':
+        transaction.on_commit(lambda: deliver_queued(event.pk))
+    return event
+
+
+def _due(retries_only=False):
+    due = NotificationEvent.objects.filter(Q(not_before__isnull=True) | Q(not_before__lte=timezone.now()), status='queued')
+    if retries_only:
+        due = due.filter(attempts__gt=0)
+    return due
+
+
+def claim_next(retries_only=False):
+    """Atomically move the oldest due queued event to 'running' and return it (or None)."""
+    while True:
+        event = _due(retries_only).order_by('created_at').first()
+        if event is None:
+            return None
+        # Compare-and-swap so two workers never deliver the same event.
+        claimed = NotificationEvent.objects.filter(pk=event.pk, status='queued').update(
+            status='running', started_at=timezone.now(),
+        )
+        if claimed:
+            event.refresh_from_db()
+            return event
+
+
+def deliver(event):
+    """Publish the event as a topic ``Notification`` for its role and mark it delivered."""
+    try:
+        with transaction.atomic():
+            Notification.objects.create(
+                topic=event.role, title=event.title, message=event.message, type=event.type, payload=event.payload,
+            )
+            # One UPDATE for the whole role; uncomputed counters pick the topic up when recounted.
+            NotificationCursor.objects.filter(
+                user__user_type__in=ROLES[event.role], unread__isnull=False,
+            ).update(unread=F('unread') + 1)
+            event.status = 'delivered'
+            event.recipient_count = len(members(event.role))
+            event.delivered_at = timezone.now()
+            event.save(update_fields=['status', 'recipient_count', 'delivered_at'])
+    except Exception as exc:
+        logger.exception("Notification event %s failed", event.pk)
+        event.attempts += 1
+        event.error = str(exc)[:2000]
+        if event.attempts < MAX_ATTEMPTS:
+            event.status = 'queued'
+            event.not_before = timezone.now() + RETRY_BACKOFF * 2 ** (event.attempts - 1)
+        else:
+            event.status = 'failed'
+        event.save(update_fields=['status', 'attempts', 'not_before', 'error'])
+    return event
+
+
+def deliver_queued(event_id):
+    """Deliver one specific event if no worker has claimed it yet, then any due retries (inline mode)."""
+    if NotificationEvent.objects.filter(pk=event_id, status='queued').update(status='running', started_at=timezone.now()):
+        deliver(NotificationEvent.objects.get(pk=event_id))
+    for _ in range(INLINE_RETRY_BATCH):
+        event = claim_next(retries_only=True)
+        if event is None:
+            break
+        deliver(event)
+
+
+def requeue_stale():
+    cutoff = timezone.now() - STALE_RUNNING
+    return NotificationEvent.objects.filter(status='running', started_at__lt=cutoff).update(status='queued', started_at=None)
+
+
+def purge_delivered():
+    cutoff = timezone.now() - RETENTION
+    deleted, _ = NotificationEvent.objects.filter(status='delivered', delivered_at__lt=cutoff).delete()
+    return deleted
+
+
+def count_direct(created):
+    """Add newly inserted direct notifications ``created`` to their recipients' unread counters.
+
+    One UPDATE per recipient; uncomputed counters pick the rows up when recounted.
+    Call inside the inserting transaction.
+    """
+    unread = Counter(notification.recipient_id for notification in created if notification.recipient_id and not notification.is_read)
+    for user_id, count in unread.items():
+        NotificationCursor.objects.filter(user_id=user_id, unread__isnull=False).update(unread=F('unread') + count)
+
+
+def create_direct(rows, batch_size=500):
+    """Bulk-insert direct notifications ``rows``, count them into the unread counters and publish them; returns the rows."""
+    with transaction.atomic():
+        created = Notification.objects.bulk_create(rows, batch_size=batch_size)
+        count_direct(created)
+        # bulk_create sends no post_save, so publish here.
+        for notification in created:
+            events.publish_notification(notification)
+    return created
+
+
+def topics_for(user):
+    return [role for role, user_types in ROLES.items() if user.user_type in user_types]
+
+
+def _topic_cursor(user):
+    return NotificationCursor.objects.filter(user=user).values_list('topic_read_through', flat=True).first() or 0
+
+
+def _topic_visible(user, topics):
+    return Q(recipient__isnull=True, topic__in=topics, created_at__gte=user.date_joined)
+
+
+def _visible(user, topics):
+    direct = Q(recipient=user)
+    if not topics:
+        return direct
+    return direct | _topic_visible(user, topics)
+
+
+def inbox(user):
+    """The user's direct and topic notifications, annotated with their per-user ``read_state``."""
+    topics = topics_for(user)
+    queryset = Notification.objects.filter(_visible(user, topics))
+    if not topics:
+        return queryset.annotate(read_state=F('is_read'))
+    receipts = NotificationReceipt.objects.filter(notification=OuterRef('pk'), user=user)
+    return queryset.annotate(read_state=Case(
+        When(recipient__isnull=False, then=F('is_read')),
+        When(pk__lte=_topic_cursor(user), then=Value(True)),
+        default=Exists(receipts),
+        output_field=BooleanField(),
+    ))
+
+
+def _locked_cursor(user):
+    """The user's cursor row, created if missing and locked for the rest of the transaction."""
+    NotificationCursor.objects.get_or_create(user=user)
+    return NotificationCursor.objects.select_for_update().get(user=user)
+
+
+def _count_unread(user, cursor):
+    count = Notification.objects.filter(recipient=user, is_read=False).count()
+    topics = topics_for(user)
+    if topics:
+        count += Notification.objects.filter(
+            _topic_visible(user, topics), pk__gt=cursor.topic_read_through,
+        ).exclude(receipts__user=user).count()
+    return count
+
+
+def unread_count(user):
+    """The user's unread count: one lookup, or a recount when the counter is not yet computed."""
+    count = NotificationCursor.objects.filter(user=user).values_list('unread', flat=True).first()
+    if count is None:
+        with transaction.atomic():
+            cursor = _locked_cursor(user)
+            if cursor.unread is None:
+                cursor.unread = _count_unread(user, cursor)
+                cursor.save(update_fields=['unread'])
+            count = cursor.unread
+    return count
+
+
+def mark_read(user, ids):
+    """Mark the user's notifications ``ids`` read; returns how many were unread."""
+    with transaction.atomic():
+        cursor = _locked_cursor(user)
+        changed = Notification.objects.filter(recipient=user, pk__in=ids, is_read=False).update(is_read=True)
+        topics = topics_for(user)
+        if topics:
+            unread_topics = list(
+                Notification.objects.filter(_topic_visible(user, topics), pk__in=ids, pk__gt=cursor.topic_read_through)
+                .exclude(receipts__user=user).values_list('pk', flat=True)
+            )
+            NotificationReceipt.objects.bulk_create(
+                [NotificationReceipt(user=user, notification_id=pk) for pk in unread_topics], ignore_conflicts=True,
+            )
+            changed += len(unread_topics)
+        if changed and cursor.unread is not None:
+            NotificationCursor.objects.filter(pk=cursor.pk).update(unread=F('unread') - changed)
+    return changed
+
+
+def mark_all_read(user):
+    """Mark everything in the user's inbox read with one UPDATE per kind; returns how many were unread."""
+    with transaction.atomic():
+        cursor = _locked_cursor(user)
+        changed = Notification.objects.filter(recipient=user, is_read=False).update(is_read=True)
+        topics = topics_for(user)
+        if topics:
+            latest = Notification.objects.filter(_topic_visible(user, topics)).aggregate(latest=Max('pk'))['latest']
+            if latest and latest > cursor.topic_read_through:
+                changed += Notification.objects.filter(
+                    _topic_visible(user, topics), pk__gt=cursor.topic_read_through,
+                ).exclude(receipts__user=user).count()
+                cursor.topic_read_through = latest
+                # Receipts below the cursor are implied by it.
+                NotificationReceipt.objects.filter(user=user, notification_id__lte=latest).delete()
+        cursor.unread = 0
+        cursor.save(update_fields=['topic_read_through', 'unread'])
+    return changed
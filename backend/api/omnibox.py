@@ -0,0 +1,179 @@
+"""One search box for every record type.
+
+A query is first classified by its shape. Generated identifiers (POL…, CLM…,
+PAY…, QTE…, CUST…) are resolved with a lookup on their unique column: an
+exact match when complete, otherwise an index range scan on the prefix.
+National IDs are an exact lookup on the user, and plates or free text go
+through the full-text index (``search_index``). Results are scored, grouped
+by type and scoped to the caller's own records for customer users.
+"""
+import re
+
+from django.db.models import Q
+
+from . import search_index
+from .models import Claim, Customer, InsurancePolicy, Payment, Quotation, Vehicle
+
+
+MIN_LENGTH = 2
+PER_TYPE = 5
+
+# Scores: higher sorts first, within and across groups.
+EXACT = 100
+NATIONAL_ID = 95
+PREFIX = 80
+TEXT = 60
+
+_ID_PREFIXES = {
+    'POL': ('policy', 'policy_number', 11),
+    'CLM': ('claim', 'claim_id', 9),
+    'PAY': ('payment', 'payment_id', 11),
+    'QTE': ('quotation', 'quote_id', 11),
+    'CUST': ('customer', 'customer_id', 12),
+}
+_ID = re.compile(r'^(CUST|POL|CLM|PAY|QTE)[0-9A-F]+$')
+# Zimbabwean national ID, e.g. 63-123456A78 or 63123456A78.
+_NATIONAL_ID = re.compile(r'^\d{2}-?\d{6,7}-?[A-Z]-?\d{2}$')
+
+
+def _rows(kind, queryset):
+    """Compact result rows (one query) for ``kind``."""
+    if kind == 'policy':
+        return [
+            {'id': r['id'], 'label': r['policy_number'], 'detail': f"{r['vehicle__vehicle_number']} · {r['status']}"}
+            for r in queryset.values('id', 'policy_number', 'status', 'vehicle__vehicle_number')
+        ]
+    if kind == 'claim':
+        return [
+            {'id': r['id'], 'label': r['claim_id'], 'detail': f"{r['policy__policy_number']} · {r['status']}"}
+            for r in queryset.values('id', 'claim_id', 'status', 'policy__policy_number')
+        ]
+    if kind == 'payment':
+        return [
+            {'id': r['id'], 'label': r['payment_id'], 'detail': f"{r['policy__policy_number']} · USD {r['amount']} · {r['status']}"}
+            for r in queryset.values('id', 'payment_id', 'amount', 'status', 'policy__policy_number')
+        ]
+    if kind == 'quotation':
+        return [
+            {'id': r['id'], 'label': r['quote_id'], 'detail': f"{r['policy__policy_number']} · {r['status']}"}
+            for r in queryset.values('id', 'quote_id', 'status', 'policy__policy_number')
+        ]
+    if kind == 'customer':
+        return [
+            {
+                'id': r['id'], 'label': f"{r['user__first_name']} {r['user__last_name']}".strip() or r['customer_id'],
+                'detail': f"{r['customer_id']} · {r['town']}",
+            }
+            for r in queryset.values('id', 'customer_id', 'town', 'user__first_name', 'user__last_name')
+        ]
+    return [
+        {'id': r['id'], 'label': r['vehicle_number'], 'detail': f"{r['make']} {r['model']}"}
+        for r in queryset.values('id', 'vehicle_number', 'make', 'model')
+    ]
+
+
+def _querysets(user):
+    """Base queryset per type, restricted to the user's own records for customers."""
+    return {
+        'policy': InsurancePolicy.objects.for_principal(user),
+        'claim': Claim.objects.for_principal(user),
+        'payment': Payment.objects.for_principal(user),
+        'quotation': Quotation.objects.for_principal(user),
+        'customer': Customer.objects.for_principal(user),
+        'vehicle': Vehicle.objects.for_principal(user),
+    }
+
+
+def _prefix_range(field, prefix):
+    # field >= prefix AND field < next(prefix): an index range scan on every backend.
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return Q(**{f'{field}__gte': prefix, f'{field}__lt': upper})
+
+
+def classify(query):
+    """Return ``(kind, detail)`` describing how ``query`` will be resolved."""
+    compact = re.sub(r'\s+', '', query).upper()
+    match = _ID.match(compact)
+    if match:
+        kind, field, length = _ID_PREFIXES[match.group(1)]
+        return 'id', {'type': kind, 'field': field, 'value': compact, 'exact': len(compact) == length}
+    if _NATIONAL_ID.match(compact):
+        return 'national_id', {'value': compact}
+    return 'text', {'value': query}
+
+
+def search(query, user, limit=PER_TYPE, substring=False):
+    """Grouped, ranked results for ``query``: ``{'kind': ..., 'groups': [...]}``.
+
+    ``substring`` adds ``icontains`` lookups for text the index has no match for.
+    """
+    query = (query or '').strip()
+    if len(query) < MIN_LENGTH:
+        return {'kind': 'empty', 'groups': []}
+    querysets = _querysets(user)
+    scoped = getattr(user, 'user_type', None) == 'customer'
+    kind, detail = classify(query)
+    scored = {}
+
+    if kind == 'id':
+        queryset = querysets[detail['type']]
+        if detail['exact']:
+            scored[detail['type']] = (EXACT, queryset.filter(**{detail['field']: detail['value']})[:1])
+        else:
+            scored[detail['type']] = (
+                PREFIX, queryset.filter(_prefix_range(detail['field'], detail['value'])).order_by(detail['field'])[:limit],
+            )
+    elif kind == 'national_id':
+        national_id = detail['value']
+        dashed = f"{national_id[:2]}-{national_id[2:]}" if '-' not in national_id else national_id
+        customers = querysets['customer'].filter(user__national_id__in={national_id, dashed, national_id.replace('-', '')})
+        scored['customer'] = (NATIONAL_ID, customers[:limit])
+        scored['policy'] = (NATIONAL_ID - 10, querysets['policy'].filter(customer__in=customers.values('pk'))[:limit])
+    else:
+        _text(scored, querysets, query, limit, scoped, substring)
+
+    groups = _groups(scored)
+    if not groups and kind == 'id' and not detail['exact']:
+        # Words such as "Pole" look like ID prefixes; treat them as text too.
+        kind = 'text'
+        _text(scored, querysets, query, limit, scoped, substring)
+        groups = _groups(scored)
+    return {'kind': kind, 'groups': groups}
+
+
+def _text(scored, querysets, query, limit, scoped, substring):
+    for text_kind in ('vehicle', 'customer'):
+        if scoped and search_index.enabled(text_kind):
+            # A customer's own rows may sit outside the global top hits; match within their scope.
+            ids = list(search_index.filter_queryset(text_kind, querysets[text_kind], query)[:limit].values_list('pk', flat=True))
+        else:
+            ids = search_index.search(text_kind, query, limit=limit)
+        if ids is None or (substring and not ids):
+            # No index, or no prefix match and the caller opted in: substring lookups.
+            ids = list(_fallback(text_kind, querysets[text_kind], query)[:limit].values_list('pk', flat=True))
+        scored[text_kind] = (TEXT, (querysets[text_kind].filter(pk__in=ids), ids))
+
+
+def _groups(scored):
+    groups = []
+    for result_type, (score, source) in scored.items():
+        if isinstance(source, tuple):
+            queryset, ids = source
+            rows = {row['id']: row for row in _rows(result_type, queryset)}
+            # Keep index rank order; earlier hits score slightly higher.
+            results = [dict(rows[pk], score=score - position) for position, pk in enumerate(ids) if pk in rows]
+        else:
+            results = [dict(row, score=score) for row in _rows(result_type, source)]
+        if results:
+            groups.append({'type': result_type, 'results': results})
+    groups.sort(key=lambda group: -group['results'][0]['score'])
+    return groups
+
+
+def _fallback(kind, queryset, query):
+    if kind == 'vehicle':
+        return queryset.filter(Q(vehicle_number__icontains=query) | Q(make__icontains=query) | Q(model__icontains=query))
+    return queryset.filter(
+        Q(user__first_name__icontains=query) | Q(user__last_name__icontains=query) |
+        Q(customer_id__icontains=query) | Q(user__email__icontains=query)
+    )
@@ -0,0 +1,219 @@
+"""Keyset (cursor) pagination for the large list endpoints.
+
+``?cursor`` switches a list to keyset mode; without it the usual page-number
+pagination applies, so existing clients are unaffected. Pages are ordered by
+the active ordering field (``?ordering=`` or the view default, falling back to
+``cursor_field``) with ``id`` as the tie-breaker, and each cursor is an opaque
+token holding the (value, id) of the row it continues from. Every page is a
+single ``WHERE (field, id) < (v, k) ORDER BY field, id LIMIT n`` query, so page
+1000 costs the same as page 1. ``?count=1`` adds a total that is estimated
+rather than counted exactly.
+"""
+import base64
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q
+from django.utils.encoding import force_str
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.settings import api_settings
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+# Rows counted exactly before ?count=1 reports a capped/estimated total.
+COUNT_CAP = 10_000
+
+
+def estimate_count(queryset, cap=COUNT_CAP):
+    """Return ``(count, is_estimate)``: the planner's row estimate on PostgreSQL, else a count capped at ``cap``."""
+    queryset = queryset.order_by()
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows']), True
+    count = queryset[:cap + 1].count()
+    return min(count, cap), count > cap
+
+
+def encode_cursor(value, pk, reverse=False):
+    """Opaque token for the row at (``value``, ``pk``); ``reverse`` marks a previous-page cursor."""
+    token = json.dumps({'v': force_str(value) if value is not None else None, 'k': pk, 'r': reverse})
+    return base64.urlsafe_b64encode(token.encode()).decode().rstrip('=')
+
+
+def decode_cursor(raw, model, field):
+    """``{'v', 'k', 'r'}`` for a token from encode_cursor (None when empty); NotFound if malformed."""
+    if not raw:
+        return None
+    try:
+        padded = raw + '=' * (-len(raw) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        model_field = next(f for f in model._meta.concrete_fields if f.attname == field)
+        return {'v': model_field.to_python(data['v']), 'k': int(data['k']), 'r': bool(data['r'])}
+    except Exception:
+        raise NotFound('Invalid cursor')
+
+
+def _after(field, cursor, descending):
+    lookup = 'lt' if descending else 'gt'
+    return Q(**{f'{field}__{lookup}': cursor['v']}) | Q(**{field: cursor['v'], f'pk__{lookup}': cursor['k']})
+
+
+def keyset_values(queryset, fields, field, raw_cursor, page_size):
+    """One newest-first page of ``queryset.values(*fields)`` after ``raw_cursor``.
+
+    Returns ``(rows, next_cursor)``; ``fields`` must include ``id`` and ``field``.
+    With ``page_size=None`` every row is returned, as a lazily fetched iterator.
+    """
+    cursor = decode_cursor(raw_cursor, queryset.model, field)
+    queryset = queryset.order_by(f'-{field}', '-pk')
+    if cursor:
+        queryset = queryset.filter(_after(field, cursor, True))
+    if page_size is None:
+        return queryset.values(*fields).iterator(chunk_size=2000), None
+    rows = list(queryset.values(*fields)[:page_size + 1])
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    return rows, encode_cursor(rows[-1][field], rows[-1]['id'])
+
+
+def paging_requested(request):
+    """True when the caller opted in to pages with ``?cursor`` or ``?page_size``."""
+    return 'cursor' in request.GET or 'page_size' in request.GET
+
+
+def page_size_for(request, default, maximum):
+    try:
+        return max(1, min(int(request.GET.get('page_size', default)), maximum))
+    except (TypeError, ValueError):
+        return default
+
+
+def stream_json(rows, key=None, extra=None):
+    """Yield a JSON document holding ``rows``: a bare array, or ``{key: [...], **extra}``."""
+    encoder = DjangoJSONEncoder()
+    yield '[' if key is None else '{' + json.dumps(key) + ': ['
+    for index, row in enumerate(rows):
+        yield (',' if index else '') + encoder.encode(row)
+    if key is None:
+        yield ']'
+    else:
+        tail = ''.join(f', {json.dumps(name)}: {encoder.encode(value)}' for name, value in (extra or {}).items())
+        yield ']' + tail + '}'
+
+
+class KeysetPagination(PageNumberPagination):
+    """Page-number pagination by default; keyset pagination when ``?cursor`` is present.
+
+    Views may set ``cursor_field`` (default ``created_at``), the non-null
+    column used when the view's default ordering cannot drive a keyset. An
+    explicit ``?ordering=`` on a nullable or non-column field is rejected with
+    400 in keyset mode rather than silently replaced.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    keyset = False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param not in request.query_params:
+            self.keyset = False
+            return super().paginate_queryset(queryset, request, view)
+
+        self.keyset = True
+        self.request = request
+        page_size = self.get_page_size(request)
+        field, descending = self._ordering(queryset, view, request)
+        cursor = decode_cursor(request.query_params.get(self.cursor_query_param), queryset.model, field)
+        backwards = bool(cursor and cursor['r'])
+        # Walking backwards flips the order; the page is reversed again below.
+        forward_desc = descending != backwards
+
+        queryset = queryset.order_by(*self._order_by(field, forward_desc))
+        if cursor:
+            queryset = queryset.filter(_after(field, cursor, forward_desc))
+
+        rows = list(queryset[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if backwards:
+            rows.reverse()
+
+        self.count = None
+        if str(request.query_params.get(self.count_query_param) or '').lower() in ['1', 'true', 'yes', 'estimate']:
+            # The filtered but un-cursored queryset; ordering is dropped inside estimate_count.
+            self.count = estimate_count(self._base_queryset)
+        self.next_cursor = encode_cursor(getattr(rows[-1], field), rows[-1].pk) if rows and (has_more or backwards) else None
+        self.previous_cursor = (
+            encode_cursor(getattr(rows[0], field), rows[0].pk, reverse=True)
+            if rows and cursor and (not backwards or has_more) else None
+        )
+        return rows
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        body = {
+            'next': self._link(self.next_cursor),
+            'previous': self._link(self.previous_cursor),
+            'results': data,
+        }
+        if self.count is not None:
+            body['count'], body['count_is_estimate'] = self.count
+        return Response(body)
+
+    def get_paginated_response_schema(self, schema):
+        response = super().get_paginated_response_schema(schema)
+        response['properties']['count_is_estimate'] = {'type': 'boolean'}
+        return response
+
+    def _ordering(self, queryset, view, request):
+        self._base_queryset = queryset
+        keyset = self._keyset_ordering(queryset)
+        ordering_param = getattr(view, 'ordering_param', api_settings.ORDERING_PARAM)
+        requested = (request.query_params.get(ordering_param) or '').split(',')[0].strip()
+        # An ordering the filter dropped, or one on a nullable/computed field, cannot drive the keyset.
+        if requested and (keyset is None or keyset[0] != requested.lstrip('-')):
+            raise ValidationError({ordering_param: [
+                f"Cursor pagination cannot order by '{requested}'; use a non-null column or drop ?cursor."
+            ]})
+        if keyset is None:
+            return getattr(view, 'cursor_field', 'created_at'), True
+        return keyset[1], keyset[2]
+
+    @staticmethod
+    def _keyset_ordering(queryset):
+        """``(name, attname, descending)`` of the leading ordering if it is a non-null column, else None."""
+        ordering = list(queryset.query.order_by) or list(queryset.model._meta.ordering)
+        if not ordering or not isinstance(ordering[0], str):
+            return None
+        name = ordering[0].lstrip('-')
+        try:
+            model_field = queryset.model._meta.get_field(name)
+        except Exception:
+            return None
+        if not model_field.concrete or model_field.null:
+            return None
+        return name, model_field.attname, ordering[0].startswith('-')
+
+    @staticmethod
+    def _order_by(field, descending):
+        prefix = '-' if descending else ''
+        return (f'{prefix}{field}', f'{prefix}pk')
+
+    def _link(self, cursor):
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
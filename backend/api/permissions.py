@@ -1,5 +1,7 @@
 from rest_framework import permissions
 
+from .models import is_staff_like, owned_by
+
 
 def _owner_user(obj):
     """Resolve the owning django.contrib.auth user for a domain object."""
@@ -22,10 +24,7 @@ def _owner_user(obj):
 
 def _is_staff_like(user):
     """Business-level staff definition aligned with models.User.user_type choices."""
-    if not user or not user.is_authenticated:
-        return False
-    # Treat Django staff as staff, plus business roles
-    return bool(user.is_staff or user.user_type in ['manager', 'underwriter'])
+    return is_staff_like(user)
 
 
 class IsOwnerOrReadOnly(permissions.BasePermission):
@@ -115,35 +114,10 @@ class IsCustomerOwnerOnly(permissions.BasePermission):
         if _is_staff_like(user):
             return True
             
-        # Customers can only access their own data
+        # Customers can only access their own data (foreign-key ids only, no lookups)
         if user.user_type == 'customer':
-            try:
-                customer_profile = user.customer_profile
-                
-                # Direct customer objects
-                if hasattr(obj, 'customer') and obj.customer == customer_profile:
-                    return True
-                    
-                # Policy objects
-                if hasattr(obj, 'policy') and obj.policy.customer == customer_profile:
-                    return True
-                    
-                # Vehicle objects
-                if obj.__class__.__name__ == 'Vehicle' and obj.customer == customer_profile:
-                    return True
-                    
-                # Customer profile itself
-                if obj.__class__.__name__ == 'Customer' and obj == customer_profile:
-                    return True
-                    
-                # User object itself
-                if obj.__class__.__name__ == 'User' and obj == user:
-                    return True
-                    
-                return False
-            except AttributeError:
-                return False
-                
+            return owned_by(obj, user)
+
         return False
 
 
@@ -167,40 +141,5 @@ class CustomerDataAccessPermission(permissions.BasePermission):
         return False
     
     def _is_customer_data(self, user, obj):
-        """Check if the object belongs to the customer."""
-        try:
-            customer_profile = user.customer_profile
-        except AttributeError:
-            return False
-            
-        # Check different object types
-        obj_class = obj.__class__.__name__
-        
-        if obj_class == 'Customer':
-            return obj == customer_profile
-            
-        elif obj_class == 'Vehicle':
-            return obj.customer == customer_profile
-            
-        elif obj_class == 'InsurancePolicy':
-            return obj.customer == customer_profile
-            
-        elif obj_class == 'Claim':
-            return obj.policy.customer == customer_profile
-            
-        elif obj_class == 'Payment':
-            return obj.policy.customer == customer_profile
-            
-        elif obj_class == 'Quotation':
-            return obj.policy.customer == customer_profile
-            
-        elif obj_class == 'Notification':
-            return obj.recipient == user
-            
-        elif obj_class == 'ContactInquiry':
-            return obj.customer == customer_profile if obj.customer else False
-            
-        elif obj_class == 'User':
-            return obj == user
-            
-        return False
\ No newline at end of file
+        """Check if the object belongs to the customer by comparing foreign-key ids along ``owner_path``."""
+        return owned_by(obj, user)
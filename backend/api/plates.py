@@ -0,0 +1,241 @@
+"""In-memory fuzzy matcher for vehicle plates.
+
+Plates are canonicalized (upper-case, separators dropped, look-alike
+characters such as O/0 and I/1 folded together) and stored in a BK-tree over
+Levenshtein distance, so a nearest-plates query only visits the branches whose
+distance band can contain a match. Each server process starts building its
+tree from ``Vehicle.vehicle_number`` in a background thread as it boots
+(``warm()``, called from ``Core.wsgi``/``Core.asgi``); the model signals keep
+it current for writes made in that process. Once the tree is older than
+``PLATE_INDEX_REFRESH_SECONDS`` a query starts a background rebuild to pick up
+writes made elsewhere and keeps answering from the current tree. The new tree
+is built without holding the lock, and writes seen during the build are
+replayed onto it before it is swapped in.
+
+If a build fails (e.g. the table is locked), queries are answered by a
+database lookup of the canonical plate (exact matches only, distance 0) and
+each query starts another build in the background until one succeeds.
+"""
+import logging
+import os
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import F, Value
+from django.db.models.functions import Replace, Upper
+
+from .models import Vehicle
+
+logger = logging.getLogger(__name__)
+
+
+MAX_DISTANCE = getattr(settings, 'PLATE_FUZZY_MAX_DISTANCE', 2)
+REFRESH_SECONDS = getattr(settings, 'PLATE_INDEX_REFRESH_SECONDS', 300)
+
+# Characters commonly confused on the phone, in handwriting and in OCR.
+_CONFUSABLE = str.maketrans({'O': '0', 'Q': '0', 'I': '1', 'L': '1', 'Z': '2', 'S': '5', 'B': '8'})
+_SEPARATORS = re.compile(r'[^0-9A-Z]')
+# Separators stripped by the database fallback; other punctuation is rare on plates.
+_DB_SEPARATORS = (' ', '-', '.', '/')
+
+
+def canonical(plate):
+    """'abc-1234' -> 'A8C1234'; equal canonical forms are treated as the same plate."""
+    return _SEPARATORS.sub('', (plate or '').upper()).translate(_CONFUSABLE)
+
+
+def canonical_expression(field='vehicle_number'):
+    """``canonical()`` as a database expression over ``field``."""
+    expression = Upper(F(field))
+    for separator in _DB_SEPARATORS:
+        expression = Replace(expression, Value(separator), Value(''))
+    for char, folded in _CONFUSABLE.items():
+        expression = Replace(expression, Value(chr(char)), Value(folded))
+    return expression
+
+
+def distance(a, b):
+    """Levenshtein edit distance."""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        for j, char_b in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+class BKTree:
+    """BK-tree of canonical plates; each node holds the ids of the vehicles sharing that plate."""
+
+    def __init__(self):
+        # node: [key, ids, {distance: child}]
+        self.root = None
+
+    def add(self, key, vehicle_id):
+        if self.root is None:
+            self.root = [key, {vehicle_id}, {}]
+            return
+        node = self.root
+        while True:
+            d = distance(key, node[0])
+            if d == 0:
+                node[1].add(vehicle_id)
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [key, {vehicle_id}, {}]
+                return
+            node = child
+
+    def discard(self, key, vehicle_id):
+        # Nodes are never unlinked; an empty node simply stops producing matches.
+        node = self.root
+        while node is not None:
+            d = distance(key, node[0])
+            if d == 0:
+                node[1].discard(vehicle_id)
+                return
+            node = node[2].get(d)
+
+    def search(self, key, max_distance):
+        """``(distance, vehicle_id)`` pairs within ``max_distance`` of ``key``."""
+        matches = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            d = distance(key, node[0])
+            if d <= max_distance:
+                matches.extend((d, vehicle_id) for vehicle_id in node[1])
+            for edge, child in node[2].items():
+                if d - max_distance <= edge <= d + max_distance:
+                    stack.append(child)
+        return matches
+
+
+class PlateIndex:
+    def __init__(self):
+        # Guards the tree, its keys and the pending writes; never held while building.
+        self._lock = threading.Lock()
+        self._tree = None
+        self._keys = {}
+        self._built_at = 0.0
+        # (vehicle_id, plate or None) writes seen while a rebuild runs.
+        self._pending = None
+        self._builder = None
+        # The last build failed; queries use the database fallback meanwhile.
+        self._build_failed = False
+
+    def _after_fork(self):
+        # A lock held by a thread at fork time would stay held in the child forever.
+        self._lock = threading.Lock()
+        self._pending = None
+        self._builder = None
+
+    def warm(self):
+        """Start building the tree in the background."""
+        self._start_rebuild()
+
+    def _start_rebuild(self):
+        with self._lock:
+            if self._builder is None or not self._builder.is_alive():
+                self._pending = []
+                self._builder = threading.Thread(target=self.rebuild, name='plate-index', daemon=True)
+                self._builder.start()
+            return self._builder
+
+    def rebuild(self):
+        """Build a fresh tree from the database and swap it in."""
+        tree = BKTree()
+        keys = {}
+        try:
+            for vehicle_id, plate in Vehicle.objects.values_list('id', 'vehicle_number').iterator(chunk_size=5000):
+                _apply(tree, keys, vehicle_id, plate)
+        except Exception:
+            logger.exception("Plate index rebuild failed; the current tree (or the database lookup) stays in use")
+            with self._lock:
+                self._pending = None
+                self._build_failed = True
+            return
+        finally:
+            if threading.current_thread() is self._builder:
+                connections.close_all()
+        with self._lock:
+            for vehicle_id, plate in self._pending or ():
+                _apply(tree, keys, vehicle_id, plate)
+            self._tree, self._keys, self._built_at = tree, keys, time.monotonic()
+            self._pending = None
+            self._build_failed = False
+
+    def nearest(self, plate, limit=10, max_distance=None):
+        """Up to ``limit`` ``(vehicle_id, distance)`` pairs, closest first."""
+        key = canonical(plate)
+        if not key:
+            return []
+        max_distance = MAX_DISTANCE if max_distance is None else max_distance
+        if self._tree is None:
+            builder = self._start_rebuild()
+            if not self._build_failed:
+                # Not warmed (or still warming): wait for the first build.
+                builder.join()
+        elif time.monotonic() - self._built_at >= REFRESH_SECONDS:
+            self._start_rebuild()
+        with self._lock:
+            matches = self._tree.search(key, max_distance) if self._tree is not None else None
+        if matches is None:
+            # No tree yet: the build failed and is being retried in the background.
+            return _lookup(key, limit)
+        matches.sort()
+        return [(vehicle_id, d) for d, vehicle_id in matches[:limit]]
+
+    def _write(self, vehicle_id, plate):
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((vehicle_id, plate))
+            if self._tree is not None:
+                _apply(self._tree, self._keys, vehicle_id, plate)
+
+    def update(self, vehicle_id, plate):
+        self._write(vehicle_id, plate)
+
+    def remove(self, vehicle_id):
+        self._write(vehicle_id, None)
+
+
+def _apply(tree, keys, vehicle_id, plate):
+    """Point ``vehicle_id`` at ``plate`` (None removes it) in ``tree`` and ``keys``."""
+    old = keys.get(vehicle_id)
+    key = canonical(plate) if plate is not None else None
+    if old == key:
+        return
+    if old is not None:
+        tree.discard(old, vehicle_id)
+        del keys[vehicle_id]
+    if key is not None:
+        tree.add(key, vehicle_id)
+        keys[vehicle_id] = key
+
+
+def _lookup(key, limit):
+    """Vehicles whose canonical plate equals ``key``, as distance-0 matches, from the database."""
+    ids = (
+        Vehicle.objects.annotate(canonical_plate=canonical_expression())
+        .filter(canonical_plate=key).order_by('pk').values_list('pk', flat=True)[:limit]
+    )
+    return [(vehicle_id, 0) for vehicle_id in ids]
+
+
+index = PlateIndex()
+
+
+def warm():
+    index.warm()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=index._after_fork)
@@ -0,0 +1,182 @@
+"""Sparse fieldsets and relation planning for the router viewsets.
+
+``?fields=a,b`` keeps only the listed serializer fields and ``?exclude=c``
+drops fields; both apply to list and retrieve responses. Unrequested fields
+(including ``SerializerMethodField``s) are removed from the serializer before
+it runs. The remaining fields are also pushed down to the query as
+``.only()`` plus the ``select_related`` their sources need, so unrequested
+columns are never loaded.
+
+Serializers describe what their method fields read with
+``Meta.field_sources = {'field': ('relation__column', ...)}``; a field whose
+source cannot be resolved to concrete columns disables the pushdown (the
+response is still trimmed).
+
+The same declarations drive ``RelationPlannerMixin``: every relation a
+serializer reads (declared sources, nested serializers and many-related
+fields) becomes a ``select_related`` when it is a chain of forward
+foreign keys and a ``prefetch_related`` otherwise, so list endpoints run a
+constant number of queries whichever view serves them.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+
+FIELDS_PARAM = 'fields'
+EXCLUDE_PARAM = 'exclude'
+# Views whose querysets are projected; other actions (exports, writes) load full rows.
+PROJECTED_ACTIONS = ('list', 'retrieve')
+
+
+def _names(request, param):
+    raw = request.query_params.get(param)
+    if not raw:
+        return None
+    return [name.strip() for name in raw.split(',') if name.strip()]
+
+
+def selected_fields(request, available):
+    """Field names chosen by ``?fields=``/``?exclude=``, in serializer order, or None if neither is given."""
+    fields = _names(request, FIELDS_PARAM)
+    exclude = _names(request, EXCLUDE_PARAM)
+    if fields is None and exclude is None:
+        return None
+    unknown = (set(fields or ()) | set(exclude or ())) - set(available)
+    if unknown:
+        raise serializers.ValidationError({FIELDS_PARAM: f"Unknown fields: {', '.join(sorted(unknown))}"})
+    return [name for name in available if (fields is None or name in fields) and name not in (exclude or ())]
+
+
+def field_paths(serializer_class, names):
+    """Model lookup paths read by the serializer fields ``names``, or None if any cannot be resolved."""
+    serializer = serializer_class()
+    model = serializer.Meta.model
+    declared = getattr(serializer.Meta, 'field_sources', {})
+    paths = {model._meta.pk.name}
+    for name in names:
+        if name in declared:
+            paths.update(declared[name])
+            continue
+        field = serializer.fields[name]
+        if isinstance(field, (serializers.SerializerMethodField, serializers.BaseSerializer)):
+            return None
+        if field.source == '*' or '.' in field.source:
+            return None
+        try:
+            model_field = model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            return None
+        if not model_field.concrete or model_field.many_to_many:
+            return None
+        paths.add(field.source)
+    return paths
+
+
+def project(queryset, serializer_class, names):
+    """Restrict ``queryset`` to the columns (and joins) needed by ``names``; unchanged if unresolvable."""
+    paths = field_paths(serializer_class, names)
+    if paths is None:
+        return queryset
+    relations = sorted({path.rsplit('__', 1)[0] for path in paths if '__' in path})
+    # Drop the planned relations: a joined relation must not also be deferred.
+    queryset = queryset.select_related(None).prefetch_related(None)
+    if relations:
+        queryset = queryset.select_related(*relations)
+    return queryset.only(*paths)
+
+
+def _relation_kind(model, path):
+    """'select' if ``path`` is a chain of forward single-valued relations, 'prefetch' if it crosses a many relation."""
+    for part in path.split('__'):
+        field = model._meta.get_field(part)
+        if field.many_to_many or field.one_to_many:
+            return 'prefetch'
+        model = field.related_model
+    return 'select'
+
+
+def relation_plan(serializer_class, prefix='', model=None):
+    """``(select_related, prefetch_related)`` path sets for everything ``serializer_class`` reads."""
+    serializer = serializer_class() if isinstance(serializer_class, type) else serializer_class
+    model = model or serializer.Meta.model
+    selects, prefetches = set(), set()
+    paths = set()
+    for sources in getattr(getattr(serializer, 'Meta', None), 'field_sources', {}).values():
+        paths.update(path.rsplit('__', 1)[0] for path in sources if '__' in path)
+    for field in serializer.fields.values():
+        if field.source == '*' or '.' in field.source:
+            continue
+        nested = getattr(field, 'child', field)
+        if isinstance(field, serializers.ManyRelatedField) or isinstance(nested, serializers.BaseSerializer):
+            paths.add(field.source)
+            if isinstance(nested, serializers.BaseSerializer):
+                try:
+                    related = model._meta.get_field(field.source).related_model
+                except FieldDoesNotExist:
+                    continue
+                inner_selects, inner_prefetches = relation_plan(nested, prefix=f'{prefix}{field.source}__', model=related)
+                selects |= inner_selects
+                prefetches |= inner_prefetches
+    for path in paths:
+        try:
+            kind = _relation_kind(model, path)
+        except FieldDoesNotExist:
+            continue
+        (selects if kind == 'select' else prefetches).add(f'{prefix}{path}')
+    if prefix and prefetches:
+        # Anything under a prefetched relation has to be prefetched through it too.
+        prefetches |= {path for path in selects if any(path.startswith(f'{p}__') for p in prefetches)}
+        selects -= prefetches
+    return selects, prefetches
+
+
+def apply_relation_plan(queryset, serializer_class):
+    selects, prefetches = relation_plan(serializer_class)
+    if selects:
+        queryset = queryset.select_related(*sorted(selects))
+    if prefetches:
+        queryset = queryset.prefetch_related(*sorted(prefetches))
+    return queryset
+
+
+class SparseFieldsetMixin:
+    """Serializer mixin: drop the fields not selected by ``?fields=``/``?exclude=`` on safe requests."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method not in SAFE_METHODS:
+            return
+        selected = selected_fields(request, list(self.fields))
+        if selected is None:
+            return
+        for name in set(self.fields) - set(selected):
+            self.fields.pop(name)
+
+
+class SparseFieldsetViewMixin:
+    """Viewset mixin: push the ``?fields=``/``?exclude=`` selection down to the list/retrieve query."""
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.request.method not in SAFE_METHODS or getattr(self, 'action', None) not in PROJECTED_ACTIONS:
+            return queryset
+        serializer_class = self.get_serializer_class()
+        selected = selected_fields(self.request, list(serializer_class().fields))
+        if selected is None:
+            return queryset
+        return project(queryset, serializer_class, selected)
+
+
+class RelationPlannerMixin:
+    """View mixin: add the serializer's planned select_related/prefetch_related to the view's queryset.
+
+    Applied in ``filter_queryset`` rather than ``get_queryset`` so that views
+    whose ``get_queryset`` returns early (customer scoping) are covered too.
+    List it after ``SparseFieldsetViewMixin`` so that a ``?fields=``
+    projection replaces the plan rather than the other way round.
+    """
+
+    def filter_queryset(self, queryset):
+        return apply_relation_plan(super().filter_queryset(queryset), self.get_serializer_class())
@@ -0,0 +1,196 @@
+"""Issuing guideline quotations for pending policies, singly or in bulk.
+
+``bulk_auto_quote`` rates every matching policy in one vectorized pass
+(``rating.rate``) and writes the policy premiums, Quotation rows and customer
+Notifications with bulk queries, one transaction per chunk.
+"""
+import time
+import uuid
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from . import notifications, rating, rollups
+from .models import InsurancePolicy, Notification, Quotation
+
+
+BANK_DETAILS = {
+    'bank': 'CBZ',
+    'account_number': '020224850175100',
+    'branch': 'Chivhu',
+}
+# Policies written per transaction by bulk_auto_quote.
+CHUNK_SIZE = getattr(settings, 'BULK_QUOTE_CHUNK_SIZE', 500)
+# Quotes echoed back in the bulk response.
+PREVIEW_LIMIT = 50
+
+_FIELDS = (
+    'id', 'policy_number', 'created_at', 'premium_amount', 'customer__user_id',
+    'vehicle__market_value', 'coverage__name', 'vehicle__category__name',
+)
+
+
+def quote_terms(q):
+    """Standard quotation terms text for a rating.quote() breakdown."""
+    loading = ''
+    if q['category_loading'] != 1:
+        loading = f" x {q['category_loading']} vehicle category loading"
+    return (
+        'This quotation is based on underwriting guideline rates. Cover is activated upon payment. '
+        f"Base: {rating.percent(q['base_rate'])} of sum insured{loading}; "
+        f"Stamp duty: {rating.percent(q['stamp_duty_rate'])}; Motor levy: {rating.percent(q['motor_levy_rate'])}. "
+        f"Annual premium: USD {q['annual_premium']}; Termly premium: USD {q['termly_premium']}."
+    )
+
+
+def payment_url(policy_id):
+    return f"/payments/checkout?policy={policy_id}"
+
+
+def _open_quotation():
+    return Exists(Quotation.objects.filter(policy=OuterRef('pk'), status='sent'))
+
+
+def _new_quote_id():
+    # Same format Quotation.save() assigns; bulk_create bypasses save().
+    return f"QTE{str(uuid.uuid4().hex[:8]).upper()}"
+
+
+def bulk_auto_quote(queryset, user, preview=False, chunk_size=None):
+    """Quote every pending policy in ``queryset`` at guideline rates.
+
+    Policies that already have an open (``sent``) quotation are skipped, so
+    running the action twice does not quote or notify anyone twice. Returns a
+    summary dict. With ``preview=True`` nothing is written.
+    """
+    started = time.monotonic()
+    pending = queryset.filter(status='pending').annotate(open_quotation=_open_quotation())
+    already_quoted = pending.filter(open_quotation=True).count()
+    rows = list(pending.filter(open_quotation=False).order_by('pk').values(*_FIELDS))
+    premiums = rating.rate(
+        [row['vehicle__market_value'] for row in rows],
+        [row['coverage__name'] for row in rows],
+        [row['vehicle__category__name'] for row in rows],
+    )
+
+    by_coverage = defaultdict(lambda: {'count': 0, 'annual_premium': Decimal('0')})
+    quotes = []
+    for index, row in enumerate(rows):
+        q = premiums.quote(index)
+        quotes.append(q)
+        bucket = by_coverage[row['coverage__name']]
+        bucket['count'] += 1
+        bucket['annual_premium'] += q['annual_premium']
+
+    quoted = 0
+    skipped = already_quoted
+    if not preview:
+        chunk_size = chunk_size or CHUNK_SIZE
+        for start in range(0, len(rows), chunk_size):
+            written = _write_chunk(rows[start:start + chunk_size], quotes[start:start + chunk_size], user)
+            quoted += written
+            skipped += min(chunk_size, len(rows) - start) - written
+
+    return {
+        'preview': preview,
+        'matched': len(rows) + already_quoted,
+        'quoted': quoted,
+        'skipped': skipped,
+        'rate_version': premiums.table.version,
+        'total_annual_premium': str(sum((q['annual_premium'] for q in quotes), Decimal('0'))),
+        'by_coverage': {
+            name: {'count': bucket['count'], 'annual_premium': str(bucket['annual_premium'])}
+            for name, bucket in sorted(by_coverage.items())
+        },
+        'duration_ms': int((time.monotonic() - started) * 1000),
+        'quotes': [
+            {
+                'policy_id': row['id'],
+                'policy_number': row['policy_number'],
+                'coverage_amount': str(q['market_value']),
+                'annual_premium': str(q['annual_premium']),
+                'termly_premium': str(q['termly_premium']),
+            }
+            for row, q in zip(rows[:PREVIEW_LIMIT], quotes[:PREVIEW_LIMIT])
+        ],
+    }
+
+
+def _write_chunk(rows, quotes, user):
+    """Persist one chunk; policies no longer pending or already quoted are skipped. Returns the number quoted."""
+    with transaction.atomic():
+        ids = [row['id'] for row in rows]
+        # Lock the chunk and drop anything approved or quoted since it was read.
+        locked = list(
+            InsurancePolicy.objects.select_for_update().filter(pk__in=ids, status='pending').values_list('pk', flat=True)
+        )
+        # Checked in a second statement so it sees quotations committed by whoever held the locks.
+        still_pending = set(
+            InsurancePolicy.objects.filter(pk__in=locked).annotate(open_quotation=_open_quotation())
+            .filter(open_quotation=False).values_list('pk', flat=True)
+        )
+        pairs = [(row, q) for row, q in zip(rows, quotes) if row['id'] in still_pending]
+        if not pairs:
+            return 0
+
+        policies = []
+        quotations = []
+        revenue_deltas = defaultdict(Decimal)
+        for row, q in pairs:
+            policies.append(InsurancePolicy(
+                pk=row['id'], premium_amount=q['annual_premium'], coverage_amount=q['market_value'],
+            ))
+            quotations.append(Quotation(
+                quote_id=_new_quote_id(),
+                policy_id=row['id'],
+                premium_amount=q['annual_premium'],
+                coverage_amount=q['market_value'],
+                currency='USD',
+                status='sent',
+                terms=quote_terms(q),
+                bank_details=BANK_DETAILS,
+                payment_url=payment_url(row['id']),
+                created_by=user,
+            ))
+            key = rollups.key(row['created_at'], row['coverage__name'], row['vehicle__category__name'])
+            revenue_deltas[key] += q['annual_premium'] - (row['premium_amount'] or Decimal('0'))
+
+        InsurancePolicy.objects.bulk_update(policies, ['premium_amount', 'coverage_amount'], batch_size=500)
+        Quotation.objects.bulk_create(quotations, batch_size=500)
+        if any(quotation.pk is None for quotation in quotations):
+            # Backends without RETURNING (MySQL) do not set primary keys on bulk_create.
+            pks = dict(Quotation.objects.filter(
+                quote_id__in=[quotation.quote_id for quotation in quotations]
+            ).values_list('quote_id', 'pk'))
+            for quotation in quotations:
+                quotation.pk = pks[quotation.quote_id]
+
+        notifications.create_direct([
+            Notification(
+                recipient_id=row['customer__user_id'],
+                title='Policy quotation available',
+                message=f"Quotation for {row['policy_number']}",
+                type='quotation',
+                payload={
+                    'policy_id': row['id'],
+                    'policy_number': row['policy_number'],
+                    'premium_amount': str(quotation.premium_amount),
+                    'coverage_amount': str(quotation.coverage_amount),
+                    'currency': quotation.currency,
+                    'quote_id': quotation.quote_id,
+                    'quotation_id': quotation.pk,
+                    'payment_url': quotation.payment_url,
+                    'bank_details': BANK_DETAILS,
+                    'terms': quotation.terms,
+                },
+            )
+            for (row, _), quotation in zip(pairs, quotations)
+        ])
+
+        # bulk_update bypasses the rollup signals; carry the premium change over by hand.
+        for key, delta in revenue_deltas.items():
+            rollups.apply(key, {'revenue': delta})
+    return len(pairs)
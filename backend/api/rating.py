@@ -0,0 +1,269 @@
+"""Premium rating engine shared by every quoting path.
+
+Rates live in versioned tables (``RATE_TABLES``); ``settings.RATE_TABLE_VERSION``
+selects the active one. Each table is compiled once per process into integer
+lookup arrays, and premiums are computed for whole arrays of
+(market value, coverage, category) at once with NumPy.
+
+All arithmetic is done in integer cents with rates expressed in parts per
+million, so results are exact and every component is rounded half-up to the
+cent, matching ``Decimal.quantize(Decimal('0.01'), ROUND_HALF_UP)``.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+from functools import lru_cache
+
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+
+# rates are fractions of the amount they apply to; category loadings multiply
+# the base rate. Tables are immutable once published: add a new version instead
+# of editing one that has been used to issue quotations.
+RATE_TABLES = {
+    '2025.1': {
+        'coverages': {
+            'comprehensive': {'base_rate': '0.06', 'stamp_duty_rate': '0.05', 'motor_levy_rate': '0.0225'},
+            'third_party': {'base_rate': '0.03', 'stamp_duty_rate': '0.05', 'motor_levy_rate': '0.015'},
+        },
+        'category_loadings': {
+            'motorcycles': '1.2',
+            'light_motor': '1.0',
+            'minibuses': '1.3',
+            'buses': '1.4',
+            'heavy_vehicles': '1.6',
+            'haulage_trucks': '1.8',
+        },
+        # Loading applied when a vehicle has no (or an unknown) category.
+        'default_loading': '1.0',
+    },
+}
+DEFAULT_VERSION = '2025.1'
+
+_PPM = 1_000_000
+_CENT = Decimal('0.01')
+
+
+def _decimal(value):
+    # Through str() so a JSON float such as 0.025 means 0.025, not its binary approximation.
+    return Decimal(str(value))
+
+
+def _ppm(value, what):
+    scaled = Decimal(value) * _PPM
+    if scaled != scaled.to_integral_value():
+        raise ImproperlyConfigured(f"Rate {what}={value} has more than 6 decimal places")
+    return int(scaled)
+
+
+def _round_div(numerator, denominator):
+    """Integer division rounded half-up (operands are non-negative)."""
+    return (numerator * 2 + denominator) // (denominator * 2)
+
+
+class RateTable:
+    """A compiled rate table: coverage/category codes map to rows of ppm rates."""
+
+    def __init__(self, version, spec):
+        self.version = version
+        self.coverages = list(spec['coverages'])
+        self.categories = list(spec['category_loadings'])
+        self.coverage_index = {name: index for index, name in enumerate(self.coverages)}
+        # Unknown categories map to the extra trailing slot holding the default loading.
+        self.category_index = {name: index for index, name in enumerate(self.categories)}
+        self.default_category = len(self.categories)
+
+        self.rates = {
+            name: {key: _decimal(value) for key, value in rates.items()}
+            for name, rates in spec['coverages'].items()
+        }
+        self.loadings = {name: _decimal(value) for name, value in spec['category_loadings'].items()}
+        self.default_loading = _decimal(spec['default_loading'])
+
+        loadings = [*self.loadings.values(), self.default_loading]
+        # Effective base rate per (coverage, category), exact in ppm.
+        self.base_ppm = np.array([
+            [_ppm(self.rates[coverage]['base_rate'] * loading, f'{coverage}.base_rate*loading') for loading in loadings]
+            for coverage in self.coverages
+        ], dtype=np.int64)
+        self.stamp_ppm = np.array(
+            [_ppm(self.rates[coverage]['stamp_duty_rate'], f'{coverage}.stamp_duty_rate') for coverage in self.coverages],
+            dtype=np.int64,
+        )
+        self.levy_ppm = np.array(
+            [_ppm(self.rates[coverage]['motor_levy_rate'], f'{coverage}.motor_levy_rate') for coverage in self.coverages],
+            dtype=np.int64,
+        )
+
+    def loading(self, category):
+        return self.loadings.get(category, self.default_loading)
+
+    def describe(self, coverage, category=None):
+        """Rates applied to one (coverage, category) pair, as Decimals."""
+        rates = self.rates[coverage]
+        loading = self.loading(category)
+        return {
+            'version': self.version,
+            'base_rate': rates['base_rate'],
+            'category_loading': loading,
+            'effective_base_rate': rates['base_rate'] * loading,
+            'stamp_duty_rate': rates['stamp_duty_rate'],
+            'motor_levy_rate': rates['motor_levy_rate'],
+        }
+
+
+@lru_cache(maxsize=None)
+def rate_table(version=None):
+    """Return the compiled table for ``version`` (default: settings.RATE_TABLE_VERSION)."""
+    version = version or getattr(settings, 'RATE_TABLE_VERSION', DEFAULT_VERSION)
+    try:
+        spec = RATE_TABLES[version]
+    except KeyError:
+        raise ImproperlyConfigured(f"Unknown rate table version: {version}")
+    return RateTable(version, spec)
+
+
+def candidate_table(overrides, base_version=None, name='candidate'):
+    """Compile an unpublished table: ``base_version`` with ``overrides`` merged in.
+
+    ``overrides`` has the RATE_TABLES shape but may be partial, e.g.
+    ``{'coverages': {'comprehensive': {'motor_levy_rate': '0.025'}}}``.
+    Raises ValueError for unknown keys or invalid rates.
+    """
+    base = rate_table(base_version)
+    spec = RATE_TABLES[base.version]
+    merged = {
+        'coverages': {coverage: dict(rates) for coverage, rates in spec['coverages'].items()},
+        'category_loadings': dict(spec['category_loadings']),
+        'default_loading': spec['default_loading'],
+    }
+    unknown = set(overrides) - set(merged)
+    if unknown:
+        raise ValueError(f"Unknown rate table keys: {', '.join(sorted(unknown))}")
+    for coverage, rates in (overrides.get('coverages') or {}).items():
+        if coverage not in merged['coverages']:
+            raise ValueError(f"Unknown coverage: {coverage}")
+        bad = set(rates) - set(merged['coverages'][coverage])
+        if bad:
+            raise ValueError(f"Unknown rates for {coverage}: {', '.join(sorted(bad))}")
+        merged['coverages'][coverage].update(rates)
+    for category, loading in (overrides.get('category_loadings') or {}).items():
+        if category not in merged['category_loadings']:
+            raise ValueError(f"Unknown vehicle category: {category}")
+        merged['category_loadings'][category] = loading
+    if 'default_loading' in overrides:
+        merged['default_loading'] = overrides['default_loading']
+
+    try:
+        values = [
+            *(rate for rates in merged['coverages'].values() for rate in rates.values()),
+            *merged['category_loadings'].values(),
+            merged['default_loading'],
+        ]
+        if any(_decimal(value) < 0 for value in values):
+            raise ValueError("Rates cannot be negative")
+        return RateTable(name, merged)
+    except (ArithmeticError, TypeError, ImproperlyConfigured) as exc:
+        raise ValueError(f"Invalid rate: {exc}")
+
+
+class Premiums:
+    """Premium components for a batch of risks, as int64 cent arrays."""
+
+    def __init__(self, table, coverages, categories, market_value, base, stamp_duty, motor_levy):
+        self.table = table
+        self.coverages = coverages
+        self.categories = categories
+        self.market_value = market_value
+        self.base = base
+        self.stamp_duty = stamp_duty
+        self.motor_levy = motor_levy
+        self.annual = base + stamp_duty + motor_levy
+        self.termly = _round_div(self.annual, 3)
+
+    def __len__(self):
+        return len(self.annual)
+
+    def quote(self, index):
+        """Decimal breakdown (plus the rates used) for the risk at ``index``."""
+        def money(cents):
+            return (Decimal(int(cents)) / 100).quantize(_CENT)
+
+        return {
+            'market_value': money(self.market_value[index]),
+            'base_premium': money(self.base[index]),
+            'stamp_duty': money(self.stamp_duty[index]),
+            'motor_levy': money(self.motor_levy[index]),
+            'annual_premium': money(self.annual[index]),
+            'termly_premium': money(self.termly[index]),
+            **self.table.describe(self.coverages[index], self.categories[index]),
+        }
+
+    def quotes(self):
+        return [self.quote(index) for index in range(len(self))]
+
+
+def to_cents(values):
+    """Convert Decimal/str/number amounts (None → 0) to an int64 cent array."""
+    return np.array(
+        [int((Decimal(str(value)) if value is not None else Decimal('0')).quantize(_CENT, rounding=ROUND_HALF_UP) * 100)
+         for value in values],
+        dtype=np.int64,
+    )
+
+
+def rate(market_values, coverages, categories=None, version=None):
+    """Rate a batch of risks.
+
+    ``market_values`` are amounts (Decimal/str/number) or an int64 array of
+    cents; ``coverages`` and ``categories`` are the coverage and vehicle
+    category codes. Raises ValueError for unknown coverages or negative values.
+    """
+    table = rate_table(version)
+    coverages = list(coverages)
+    categories = list(categories) if categories is not None else [None] * len(coverages)
+    if isinstance(market_values, np.ndarray) and market_values.dtype == np.int64:
+        cents = market_values
+    else:
+        cents = to_cents(market_values)
+    if not (len(cents) == len(coverages) == len(categories)):
+        raise ValueError("market_values, coverages and categories must have the same length")
+    if (cents < 0).any():
+        raise ValueError("Market value cannot be negative")
+
+    unknown = sorted({coverage for coverage in coverages if coverage not in table.coverage_index}, key=str)
+    if unknown:
+        raise ValueError(f"Unknown coverage: {', '.join(map(str, unknown))}")
+    coverage_codes = np.fromiter((table.coverage_index[c] for c in coverages), dtype=np.intp, count=len(coverages))
+    category_codes = np.fromiter(
+        (table.category_index.get(c, table.default_category) for c in categories), dtype=np.intp, count=len(categories),
+    )
+    return Premiums(table, coverages, categories, cents, *price(table, cents, coverage_codes, category_codes))
+
+
+def price(table, cents, coverage_codes, category_codes):
+    """Vectorized core: (base, stamp_duty, motor_levy) cent arrays for table-coded risks.
+
+    ``coverage_codes``/``category_codes`` index ``table.coverages`` and
+    ``table.categories`` (``table.default_category`` for unknown categories).
+    """
+    base = _round_div(cents * table.base_ppm[coverage_codes, category_codes], _PPM)
+    stamp_duty = _round_div(base * table.stamp_ppm[coverage_codes], _PPM)
+    motor_levy = _round_div(base * table.levy_ppm[coverage_codes], _PPM)
+    return base, stamp_duty, motor_levy
+
+
+def quote(market_value, coverage, category=None, version=None):
+    """Rate a single risk and return its Decimal breakdown."""
+    return rate([market_value], [coverage], [category], version=version).quote(0)
+
+
+def quote_policy(policy, version=None):
+    """Rate an InsurancePolicy from its vehicle's market value, coverage and category."""
+    vehicle = policy.vehicle
+    return quote(vehicle.market_value, policy.coverage.name, vehicle.category.name, version=version)
+
+
+def percent(rate_value):
+    """Format a rate fraction as a percentage string, e.g. 0.0225 -> '2.25%'."""
+    return f"{(rate_value * 100).normalize():f}%"
@@ -0,0 +1,260 @@
+"""Incremental maintenance of the DailyRollup fact table.
+
+Every Customer, InsurancePolicy and Claim contributes a set of additive
+measures to exactly one rollup row. On save we subtract the row's previous
+contribution and add the new one; on delete we subtract it. ``rebuild()``
+recomputes the whole table from the source tables and is the way to repair
+drift caused by writes that bypass model signals (``QuerySet.update``,
+``bulk_create``, raw SQL).
+
+Claims and policies take their dimensions from related rows, so a save that
+changes one of those (a policy's coverage or vehicle, a vehicle's category, a
+coverage or category name) moves the dependent rows' contributions too; see
+``DIMENSIONS`` and ``move``.
+"""
+import datetime
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, F, IntegerField, Q, Sum, Value
+from django.db.models.functions import Coalesce, ExtractMonth, ExtractYear, TruncDate
+from django.utils import timezone
+
+from .models import Claim, Customer, DailyRollup, InsuranceCoverage, InsurancePolicy, Vehicle, VehicleCategory
+
+
+MEASURES = (
+    'claims_count', 'claims_pending', 'claims_approved', 'claims_rejected',
+    'claims_estimated_amount', 'claims_approved_amount',
+    'policies_count', 'revenue', 'customers_count',
+)
+_MONEY = {'claims_estimated_amount', 'claims_approved_amount', 'revenue'}
+
+_CLAIM_FIELDS = (
+    'created_at', 'approval_status', 'estimated_amount', 'approved_amount',
+    'policy__coverage__name', 'policy__vehicle__category__name',
+)
+_POLICY_FIELDS = ('created_at', 'premium_amount', 'coverage__name', 'vehicle__category__name')
+_CUSTOMER_FIELDS = ('date_registered',)
+
+
+def _to_date(value):
+    if isinstance(value, datetime.datetime):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        return value.date()
+    return value
+
+
+def key(created_at, coverage, vehicle_category):
+    """Rollup row key for a source row created at ``created_at``."""
+    return (_to_date(created_at), coverage or '', vehicle_category or '')
+
+
+def _claim_contribution(row):
+    status = row['approval_status']
+    rollup_key = key(row['created_at'], row['policy__coverage__name'], row['policy__vehicle__category__name'])
+    return rollup_key, {
+        'claims_count': 1,
+        'claims_pending': 1 if status == 'pending' else 0,
+        'claims_approved': 1 if status == 'approve' else 0,
+        'claims_rejected': 1 if status == 'reject' else 0,
+        'claims_estimated_amount': row['estimated_amount'] or Decimal('0'),
+        'claims_approved_amount': (row['approved_amount'] or Decimal('0')) if status == 'approve' else Decimal('0'),
+    }
+
+
+def _policy_contribution(row):
+    return key(row['created_at'], row['coverage__name'], row['vehicle__category__name']), {
+        'policies_count': 1,
+        'revenue': row['premium_amount'] or Decimal('0'),
+    }
+
+
+def _customer_contribution(row):
+    return (_to_date(row['date_registered']), '', ''), {'customers_count': 1}
+
+
+# model -> (values() fields, contribution builder)
+_SOURCES = {
+    Claim: (_CLAIM_FIELDS, _claim_contribution),
+    InsurancePolicy: (_POLICY_FIELDS, _policy_contribution),
+    Customer: (_CUSTOMER_FIELDS, _customer_contribution),
+}
+
+
+# model -> (fields feeding the rollup key of dependent rows, [(dependent model, lookup to the row)])
+DIMENSIONS = {
+    InsurancePolicy: (('coverage_id', 'vehicle_id'), ((Claim, 'policy'),)),
+    Vehicle: (('category_id',), ((InsurancePolicy, 'vehicle'), (Claim, 'policy__vehicle'))),
+    InsuranceCoverage: (('name',), ((InsurancePolicy, 'coverage'), (Claim, 'policy__coverage'))),
+    VehicleCategory: (('name',), ((InsurancePolicy, 'vehicle__category'), (Claim, 'policy__vehicle__category'))),
+}
+
+
+def contribution(model, pk):
+    """Return ``(key, measures)`` for the stored row ``pk`` of ``model`` (None if missing)."""
+    fields, build = _SOURCES[model]
+    row = model.objects.filter(pk=pk).values(*fields).first()
+    if row is None or row[fields[0]] is None:
+        return None
+    return build(row)
+
+
+def dimensions_changed(instance):
+    """Whether saving ``instance`` changes a field its dependent rows are keyed by."""
+    fields, _ = DIMENSIONS[type(instance)]
+    stored = type(instance).objects.filter(pk=instance.pk).values(*fields).first()
+    if stored is None:
+        return False
+    return any(stored[field] != getattr(instance, field) for field in fields)
+
+
+def dependent_contributions(model, pk):
+    """Contributions of every row whose rollup key is derived from ``model`` row ``pk``."""
+    result = []
+    for dependent, lookup in DIMENSIONS[model][1]:
+        fields, build = _SOURCES[dependent]
+        for row in dependent.objects.filter(**{lookup: pk}).values(*fields).iterator():
+            if row[fields[0]] is not None:
+                result.append(build(row))
+    return result
+
+
+def apply(key, measures, sign=1):
+    """Add (sign=1) or subtract (sign=-1) ``measures`` on the rollup row for ``key``."""
+    measures = {name: value for name, value in measures.items() if value}
+    if not measures:
+        return
+    date, coverage, category = key
+    lookup = {'date': date, 'coverage': coverage, 'vehicle_category': category}
+    updates = {name: F(name) + value * sign for name, value in measures.items()}
+    with transaction.atomic():
+        if DailyRollup.objects.filter(**lookup).update(**updates):
+            return
+        try:
+            with transaction.atomic():
+                DailyRollup.objects.create(**lookup, **{name: value * sign for name, value in measures.items()})
+        except IntegrityError:
+            # Another writer created the row concurrently; fall back to an update.
+            DailyRollup.objects.filter(**lookup).update(**updates)
+
+
+def replace(old, new):
+    """Move a source row's contribution from ``old`` to ``new`` (either may be None)."""
+    if old == new:
+        return
+    if old is not None and new is not None and old[0] == new[0]:
+        # Same rollup row: apply only the difference in a single UPDATE.
+        names = set(old[1]) | set(new[1])
+        apply(new[0], {name: new[1].get(name, 0) - old[1].get(name, 0) for name in names})
+        return
+    if old is not None:
+        apply(*old, sign=-1)
+    if new is not None:
+        apply(*new)
+
+
+def move(old, new):
+    """Replace the contributions ``old`` with ``new``, netted into one UPDATE per rollup row."""
+    net = {}
+    for contributions, sign in ((old, -1), (new, 1)):
+        for key, measures in contributions:
+            target = net.setdefault(key, {})
+            for name, value in measures.items():
+                target[name] = target.get(name, 0) + value * sign
+    for key, measures in net.items():
+        apply(key, measures)
+
+
+def rebuild():
+    """Recompute the whole DailyRollup table from the source tables. Returns the row count."""
+    facts = {}
+
+    def merge(rows, date_field, coverage_field, category_field, measures):
+        for row in rows:
+            key = (row[date_field], row[coverage_field] or '', row[category_field] or '')
+            target = facts.setdefault(key, {})
+            for name in measures:
+                target[name] = target.get(name, 0) + (row[name] or 0)
+
+    money = DecimalField(max_digits=14, decimal_places=2)
+    claims = (
+        Claim.objects.annotate(day=TruncDate('created_at'))
+        .values('day', 'policy__coverage__name', 'policy__vehicle__category__name')
+        .annotate(
+            claims_count=Count('id'),
+            claims_pending=Count('id', filter=Q(approval_status='pending')),
+            claims_approved=Count('id', filter=Q(approval_status='approve')),
+            claims_rejected=Count('id', filter=Q(approval_status='reject')),
+            claims_estimated_amount=Coalesce(Sum('estimated_amount'), Value(0), output_field=money),
+            claims_approved_amount=Coalesce(
+                Sum('approved_amount', filter=Q(approval_status='approve')), Value(0), output_field=money
+            ),
+        )
+        .order_by()
+    )
+    merge(claims, 'day', 'policy__coverage__name', 'policy__vehicle__category__name',
+          ('claims_count', 'claims_pending', 'claims_approved', 'claims_rejected',
+           'claims_estimated_amount', 'claims_approved_amount'))
+
+    policies = (
+        InsurancePolicy.objects.annotate(day=TruncDate('created_at'))
+        .values('day', 'coverage__name', 'vehicle__category__name')
+        .annotate(policies_count=Count('id'), revenue=Coalesce(Sum('premium_amount'), Value(0), output_field=money))
+        .order_by()
+    )
+    merge(policies, 'day', 'coverage__name', 'vehicle__category__name', ('policies_count', 'revenue'))
+
+    customers = (
+        Customer.objects.annotate(day=TruncDate('date_registered'))
+        .values('day')
+        .annotate(customers_count=Count('id'))
+        .order_by()
+    )
+    for row in customers:
+        target = facts.setdefault((row['day'], '', ''), {})
+        target['customers_count'] = target.get('customers_count', 0) + row['customers_count']
+
+    rows = [
+        DailyRollup(date=date, coverage=coverage, vehicle_category=category, **measures)
+        for (date, coverage, category), measures in facts.items()
+    ]
+    with transaction.atomic():
+        DailyRollup.objects.all().delete()
+        DailyRollup.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def totals(**filters):
+    """Sum every measure over the rollup rows matching ``filters``."""
+    money = DecimalField(max_digits=14, decimal_places=2)
+    aggregates = {
+        name: Coalesce(Sum(name), Value(0), output_field=money if name in _MONEY else IntegerField())
+        for name in MEASURES
+    }
+    return DailyRollup.objects.filter(**filters).aggregate(**aggregates)
+
+
+def yearly(start_year, end_year):
+    """Measures summed per calendar year, ``{year: {measure: value}}``."""
+    rows = (
+        DailyRollup.objects.filter(date__year__gte=start_year, date__year__lte=end_year)
+        .annotate(year=ExtractYear('date'))
+        .values('year')
+        .annotate(**{name: Sum(name) for name in MEASURES})
+        .order_by('year')
+    )
+    return {row.pop('year'): row for row in rows}
+
+
+def monthly(year):
+    """Measures summed per month of ``year``, ``{month: {measure: value}}``."""
+    rows = (
+        DailyRollup.objects.filter(date__year=year)
+        .annotate(month=ExtractMonth('date'))
+        .values('month')
+        .annotate(**{name: Sum(name) for name in MEASURES})
+        .order_by('month')
+    )
+    return {row.pop('month'): row for row in rows}
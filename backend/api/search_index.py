@@ -0,0 +1,201 @@
+"""Full-text search index for customers and vehicles.
+
+On SQLite the index is a pair of FTS5 tables (created by migration 0011) whose
+rowids are the Customer/Vehicle primary keys. Rows are kept in sync by the
+model signals in ``signals.py`` inside the writing transaction, and
+``manage.py rebuild_search_index`` repopulates them after bulk loads. Queries
+match every term as a prefix and are ranked with bm25, so lookups stay on the
+index instead of scanning with leading-wildcard LIKE.
+
+The index only matches the start of each token, so a plate suffix ("123" in
+"ABC123") or a fragment inside an email finds nothing: a miss is an empty
+result, never a table scan. Callers that need substring matches opt in with
+``?substring=1`` (``substring_requested``), which runs the original
+``icontains`` filters when the index has no match. Other database backends
+(or ``SEARCH_INDEX_BACKEND = 'orm'``) always use those filters.
+"""
+import re
+
+from django.conf import settings
+from django.db import connections, router
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+
+from .models import Customer, Vehicle
+
+
+CUSTOMER_TABLE = 'api_search_customer'
+VEHICLE_TABLE = 'api_search_vehicle'
+
+# bm25 column weights, in table column order.
+_TABLES = {
+    'customer': {
+        'model': Customer,
+        'table': CUSTOMER_TABLE,
+        'weights': (10.0, 6.0, 3.0, 6.0, 3.0, 1.0),
+    },
+    'vehicle': {
+        'model': Vehicle,
+        'table': VEHICLE_TABLE,
+        'weights': (10.0, 10.0, 2.0, 2.0),
+    },
+}
+
+CUSTOMER_COLUMNS = ('name', 'customer_id', 'email', 'national_id', 'phone', 'town')
+VEHICLE_COLUMNS = ('vehicle_number', 'plate', 'make', 'model')
+
+REBUILD_SQL = {
+    'customer': (
+        f"INSERT INTO {CUSTOMER_TABLE} (rowid, {', '.join(CUSTOMER_COLUMNS)}) "
+        "SELECT c.id, TRIM(COALESCE(u.first_name, '') || ' ' || COALESCE(u.last_name, '')), c.customer_id, "
+        "COALESCE(u.email, ''), COALESCE(u.national_id, ''), COALESCE(u.phone_number, ''), COALESCE(c.town, '') "
+        "FROM api_customer c JOIN api_user u ON u.id = c.user_id"
+    ),
+    'vehicle': (
+        f"INSERT INTO {VEHICLE_TABLE} (rowid, {', '.join(VEHICLE_COLUMNS)}) "
+        "SELECT v.id, v.vehicle_number, UPPER(REPLACE(REPLACE(v.vehicle_number, ' ', ''), '-', '')), v.make, v.model "
+        "FROM api_vehicle v"
+    ),
+}
+
+# Query parameter opting in to icontains lookups when the index has no match.
+SUBSTRING_PARAM = 'substring'
+
+_TERM = re.compile(r'\w+', re.UNICODE)
+_ready = set()
+
+
+def compact_plate(plate):
+    """Plate without spaces or hyphens, upper-cased ('abc-1234' -> 'ABC1234')."""
+    return (plate or '').replace(' ', '').replace('-', '').upper()
+
+
+def substring_requested(request):
+    return str(request.GET.get(SUBSTRING_PARAM) or '').lower() in ['1', 'true', 'yes']
+
+
+def _connection(model):
+    return connections[router.db_for_read(model)]
+
+
+def enabled(kind='customer'):
+    """True when the FTS5 index can serve ``kind`` queries on its database."""
+    if getattr(settings, 'SEARCH_INDEX_BACKEND', 'fts5') != 'fts5':
+        return False
+    connection = _connection(_TABLES[kind]['model'])
+    if connection.vendor != 'sqlite':
+        return False
+    if connection.alias not in _ready:
+        with connection.cursor() as cursor:
+            tables = set(connection.introspection.table_names(cursor))
+        if not {CUSTOMER_TABLE, VEHICLE_TABLE} <= tables:
+            return False
+        _ready.add(connection.alias)
+    return True
+
+
+def match_expression(query):
+    """FTS5 MATCH string requiring every word of ``query`` as a prefix, or '' if it has none."""
+    return ' AND '.join(f'"{term}"*' for term in _TERM.findall(query or ''))
+
+
+def search(kind, query, limit=10):
+    """Primary keys of the best ``limit`` matches, best first.
+
+    None when the index is unavailable, meaning the caller should use
+    ``icontains`` lookups instead.
+    """
+    if not enabled(kind):
+        return None
+    expression = match_expression(query)
+    if not expression:
+        return []
+    spec = _TABLES[kind]
+    weights = ', '.join(str(weight) for weight in spec['weights'])
+    with _connection(spec['model']).cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {spec['table']} WHERE {spec['table']} MATCH %s "
+            f"ORDER BY bm25({spec['table']}, {weights}) LIMIT %s",
+            [expression, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def in_rank_order(queryset, pks):
+    """Evaluate ``queryset`` (already filtered to ``pks``) ordered like ``pks``."""
+    objects = {obj.pk: obj for obj in queryset}
+    return [objects[pk] for pk in pks if pk in objects]
+
+
+def filter_queryset(kind, queryset, query):
+    """Restrict ``queryset`` to index matches for ``query`` (the index must be enabled)."""
+    expression = match_expression(query)
+    if not expression:
+        return queryset.none()
+    table = _TABLES[kind]['table']
+    return queryset.filter(pk__in=RawSQL(f"SELECT rowid FROM {table} WHERE {table} MATCH %s", [expression]))
+
+
+def _write(kind, pk, values):
+    spec = _TABLES[kind]
+    columns = CUSTOMER_COLUMNS if kind == 'customer' else VEHICLE_COLUMNS
+    with connections[router.db_for_write(spec['model'])].cursor() as cursor:
+        cursor.execute(f"DELETE FROM {spec['table']} WHERE rowid = %s", [pk])
+        if values is not None:
+            cursor.execute(
+                f"INSERT INTO {spec['table']} (rowid, {', '.join(columns)}) VALUES (%s, {', '.join(['%s'] * len(columns))})",
+                [pk, *values],
+            )
+
+
+def index_customer(customer):
+    if not enabled('customer'):
+        return
+    user = customer.user
+    _write('customer', customer.pk, [
+        user.get_full_name(), customer.customer_id, user.email or '', user.national_id or '',
+        user.phone_number or '', customer.town or '',
+    ])
+
+
+def index_vehicle(vehicle):
+    if not enabled('vehicle'):
+        return
+    _write('vehicle', vehicle.pk, [vehicle.vehicle_number, compact_plate(vehicle.vehicle_number), vehicle.make, vehicle.model])
+
+
+def remove(kind, pk):
+    if enabled(kind):
+        _write(kind, pk, None)
+
+
+def rebuild():
+    """Repopulate both tables from the source rows; returns {kind: row count}."""
+    counts = {}
+    for kind, spec in _TABLES.items():
+        if not enabled(kind):
+            continue
+        with connections[router.db_for_write(spec['model'])].cursor() as cursor:
+            cursor.execute(f"DELETE FROM {spec['table']}")
+            cursor.execute(REBUILD_SQL[kind])
+            cursor.execute(f"INSERT INTO {spec['table']}({spec['table']}) VALUES ('optimize')")
+            cursor.execute(f"SELECT COUNT(*) FROM {spec['table']}")
+            counts[kind] = cursor.fetchone()[0]
+    return counts
+
+
+class IndexedSearchFilter(filters.SearchFilter):
+    """``?search=`` backed by the search index; views set ``search_index_kind = 'customer' | 'vehicle'``.
+
+    Uses SearchFilter's ``search_fields`` lookups when the index is
+    unavailable, and adds them to the index matches with ``?substring=1``.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms or not enabled(view.search_index_kind):
+            return super().filter_queryset(request, queryset, view)
+        indexed = filter_queryset(view.search_index_kind, queryset, ' '.join(terms))
+        if substring_requested(request):
+            return indexed | super().filter_queryset(request, queryset, view)
+        return indexed
@@ -16,7 +16,9 @@ from .models import (
     Payment,
     Notification,
     Quotation,
+    ExportJob,
 )
+from .projection import SparseFieldsetMixin
 
 
 User = get_user_model()
@@ -90,7 +92,7 @@ class RegisterSerializer(serializers.Serializer):
         return user
 
 
-class CustomerSerializer(serializers.ModelSerializer):
+class CustomerSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     user = serializers.PrimaryKeyRelatedField(queryset=User.objects.all())
 
     class Meta:
@@ -109,7 +111,7 @@ class VehicleCategorySerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at']
 
 
-class VehicleSerializer(serializers.ModelSerializer):
+class VehicleSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     customer = serializers.PrimaryKeyRelatedField(read_only=True)
     category = serializers.PrimaryKeyRelatedField(queryset=VehicleCategory.objects.all())
 
@@ -130,7 +132,7 @@ class InsuranceCoverageSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'display_name', 'description', 'features', 'max_coverage_amount', 'is_active']
 
 
-class InsurancePolicySerializer(serializers.ModelSerializer):
+class InsurancePolicySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     customer = serializers.PrimaryKeyRelatedField(read_only=True)
     vehicle = serializers.PrimaryKeyRelatedField(queryset=Vehicle.objects.all())
     coverage = serializers.PrimaryKeyRelatedField(queryset=InsuranceCoverage.objects.all())
@@ -185,7 +187,7 @@ class InsurancePolicySerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
-class ClaimSerializer(serializers.ModelSerializer):
+class ClaimSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     policy = serializers.PrimaryKeyRelatedField(queryset=InsurancePolicy.objects.all())
     processed_by = serializers.PrimaryKeyRelatedField(read_only=True, allow_null=True, required=False)
     customer = serializers.SerializerMethodField(read_only=True)
@@ -200,6 +202,10 @@ class ClaimSerializer(serializers.ModelSerializer):
             'customer', 'vehicle_number'
         ]
         read_only_fields = ['claim_id', 'claim_date', 'created_at', 'updated_at', 'customer', 'vehicle_number', 'processed_by']
+        field_sources = {
+            'customer': ('policy__customer',),
+            'vehicle_number': ('policy__vehicle__vehicle_number',),
+        }
 
     def get_customer(self, obj):
         return obj.policy.customer_id if obj.policy_id else None
@@ -213,7 +219,7 @@ class ClaimSerializer(serializers.ModelSerializer):
         return None
 
 
-class QuotationSerializer(serializers.ModelSerializer):
+class QuotationSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     policy = serializers.PrimaryKeyRelatedField(queryset=InsurancePolicy.objects.all())
     created_by = serializers.PrimaryKeyRelatedField(read_only=True)
     decided_by = serializers.PrimaryKeyRelatedField(read_only=True)
@@ -275,7 +281,7 @@ class DashboardStatsSerializer(serializers.ModelSerializer):
         read_only_fields = ['updated_at']
 
 
-class PaymentSerializer(serializers.ModelSerializer):
+class PaymentSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     policy = serializers.PrimaryKeyRelatedField(queryset=InsurancePolicy.objects.all())
     customer = serializers.SerializerMethodField(read_only=True)
 
@@ -286,6 +292,7 @@ class PaymentSerializer(serializers.ModelSerializer):
             'transaction_reference', 'payment_date', 'due_date', 'customer'
         ]
         read_only_fields = ['payment_id', 'payment_date', 'customer']
+        field_sources = {'customer': ('policy__customer',)}
 
     def get_customer(self, obj):
         return obj.policy.customer_id if obj.policy_id else None
@@ -299,12 +306,47 @@ class QuoteResponseSerializer(serializers.Serializer):
     notes = serializers.CharField(required=False, allow_blank=True)
 
 
-class NotificationSerializer(serializers.ModelSerializer):
+class NotificationSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     recipient = serializers.PrimaryKeyRelatedField(read_only=True)
+    is_read = serializers.SerializerMethodField()
 
     class Meta:
         model = Notification
         fields = [
-            'id', 'recipient', 'title', 'message', 'type', 'payload', 'is_read', 'created_at'
+            'id', 'recipient', 'topic', 'title', 'message', 'type', 'payload', 'is_read', 'created_at'
         ]
-        read_only_fields = ['recipient', 'created_at']
\ No newline at end of file
+        read_only_fields = ['recipient', 'topic', 'created_at']
+        field_sources = {'is_read': ('is_read',)}
+
+    def get_is_read(self, obj):
+        # Topic notifications carry the reader's own state, annotated by notifications.inbox().
+        return getattr(obj, 'read_state', obj.is_read)
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    requested_by = serializers.PrimaryKeyRelatedField(read_only=True)
+    columns = serializers.ListField(child=serializers.CharField(), required=False)
+
+    class Meta:
+        model = ExportJob
+        fields = [
+            'id', 'job_id', 'export', 'columns', 'params', 'format', 'status', 'requested_by',
+            'file_size', 'row_count', 'duration_ms', 'peak_memory_kb', 'error',
+            'created_at', 'started_at', 'finished_at',
+        ]
+        read_only_fields = [
+            'job_id', 'params', 'status', 'requested_by', 'file_size', 'row_count', 'duration_ms',
+            'peak_memory_kb', 'error', 'created_at', 'started_at', 'finished_at',
+        ]
+
+    def validate(self, attrs):
+        from .exports import EXPORTS, FORMATS
+        spec = EXPORTS.get(attrs.get('export'))
+        if spec is None:
+            raise serializers.ValidationError({'export': f"export must be one of {sorted(EXPORTS)}"})
+        if attrs.get('format', 'xlsx') not in FORMATS:
+            raise serializers.ValidationError({'format': f"format must be one of {', '.join(FORMATS)}"})
+        try:
+            spec.select(attrs.get('columns') or [])
+        except ValueError as exc:
+            raise serializers.ValidationError({'columns': str(exc)})
+        return attrs
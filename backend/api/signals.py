@@ -0,0 +1,185 @@
+"""Model signal handlers wired up in ApiConfig.ready()."""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+
+from . import analytics, authentication, events, notifications, plates, rollups, search_index
+from .models import Claim, Customer, InsurancePolicy, Notification, NotificationCursor, User, Vehicle
+
+
+ROLLUP_SOURCES = (Claim, InsurancePolicy, Customer)
+
+
+def _rollup_pre_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    instance._rollup_before = rollups.contribution(sender, instance.pk) if instance.pk else None
+
+
+def _rollup_post_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    before = getattr(instance, '_rollup_before', None)
+    instance._rollup_before = None
+    rollups.replace(before, rollups.contribution(sender, instance.pk))
+
+
+def _rollup_pre_delete(sender, instance, **kwargs):
+    # Related rows (policy, vehicle, coverage) still exist at this point.
+    instance._rollup_before = rollups.contribution(sender, instance.pk)
+
+
+def _rollup_post_delete(sender, instance, **kwargs):
+    before = getattr(instance, '_rollup_before', None)
+    instance._rollup_before = None
+    rollups.replace(before, None)
+
+
+for _model in ROLLUP_SOURCES:
+    pre_save.connect(_rollup_pre_save, sender=_model, dispatch_uid=f'rollup_pre_save_{_model.__name__}')
+    post_save.connect(_rollup_post_save, sender=_model, dispatch_uid=f'rollup_post_save_{_model.__name__}')
+    pre_delete.connect(_rollup_pre_delete, sender=_model, dispatch_uid=f'rollup_pre_delete_{_model.__name__}')
+    post_delete.connect(_rollup_post_delete, sender=_model, dispatch_uid=f'rollup_post_delete_{_model.__name__}')
+
+
+def _dimensions_pre_save(sender, instance, raw=False, **kwargs):
+    instance._rollup_dependents = None
+    if not raw and instance.pk and rollups.dimensions_changed(instance):
+        instance._rollup_dependents = rollups.dependent_contributions(sender, instance.pk)
+
+
+def _dimensions_post_save(sender, instance, raw=False, **kwargs):
+    before = getattr(instance, '_rollup_dependents', None)
+    instance._rollup_dependents = None
+    if before is None:
+        return
+    rollups.move(before, rollups.dependent_contributions(sender, instance.pk))
+    transaction.on_commit(analytics.invalidate_staff_dashboard)
+
+
+for _model in rollups.DIMENSIONS:
+    pre_save.connect(_dimensions_pre_save, sender=_model, dispatch_uid=f'rollup_dimensions_pre_save_{_model.__name__}')
+    post_save.connect(_dimensions_post_save, sender=_model, dispatch_uid=f'rollup_dimensions_post_save_{_model.__name__}')
+
+
+def _invalidate_dashboard(sender, **kwargs):
+    # Invalidate after commit so a concurrent reader cannot re-cache pre-commit figures.
+    transaction.on_commit(analytics.invalidate_staff_dashboard)
+
+
+for _model in ROLLUP_SOURCES:
+    post_save.connect(_invalidate_dashboard, sender=_model, dispatch_uid=f'dashboard_post_save_{_model.__name__}')
+    post_delete.connect(_invalidate_dashboard, sender=_model, dispatch_uid=f'dashboard_post_delete_{_model.__name__}')
+
+
+def _index_customer(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search_index.index_customer(instance)
+
+
+_INDEXED_USER_FIELDS = {'first_name', 'last_name', 'email', 'national_id', 'phone_number'}
+
+
+def _index_user(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Name, email, national ID and phone live on the user row.
+    if raw or (update_fields and not _INDEXED_USER_FIELDS & set(update_fields)):
+        return
+    customer = Customer.objects.filter(user=instance).first()
+    if customer is not None:
+        search_index.index_customer(customer)
+
+
+def _index_vehicle(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search_index.index_vehicle(instance)
+
+
+def _unindex(kind):
+    def handler(sender, instance, **kwargs):
+        search_index.remove(kind, instance.pk)
+    return handler
+
+
+post_save.connect(_index_customer, sender=Customer, dispatch_uid='search_index_customer')
+post_save.connect(_index_user, sender=User, dispatch_uid='search_index_user')
+post_save.connect(_index_vehicle, sender=Vehicle, dispatch_uid='search_index_vehicle')
+post_delete.connect(_unindex('customer'), sender=Customer, dispatch_uid='search_unindex_customer', weak=False)
+post_delete.connect(_unindex('vehicle'), sender=Vehicle, dispatch_uid='search_unindex_vehicle', weak=False)
+
+
+def _plate_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        # After commit, so a rolled-back plate change never reaches the in-memory index.
+        transaction.on_commit(lambda: plates.index.update(instance.pk, instance.vehicle_number))
+
+
+def _plate_deleted(sender, instance, **kwargs):
+    vehicle_id = instance.pk
+    transaction.on_commit(lambda: plates.index.remove(vehicle_id))
+
+
+post_save.connect(_plate_saved, sender=Vehicle, dispatch_uid='plate_index_save')
+post_delete.connect(_plate_deleted, sender=Vehicle, dispatch_uid='plate_index_delete')
+
+
+def _forget_principal(sender, instance, **kwargs):
+    user_id = instance.pk if sender is User else instance.user_id
+    # After commit: evicting earlier would let a concurrent request re-cache the old row for a full TTL.
+    transaction.on_commit(lambda: authentication.cache.forget(user_id))
+
+
+for _model in (User, Customer):
+    post_save.connect(_forget_principal, sender=_model, dispatch_uid=f'principal_post_save_{_model.__name__}')
+    post_delete.connect(_forget_principal, sender=_model, dispatch_uid=f'principal_post_delete_{_model.__name__}')
+
+
+def _forget_role_members(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not {'user_type', 'is_active'} & set(update_fields):
+        return
+    notifications.forget_members()
+    # A new role brings other topics into the inbox; recount unread on next read.
+    NotificationCursor.objects.filter(user_id=instance.pk).update(unread=None)
+
+
+post_save.connect(_forget_role_members, sender=User, dispatch_uid='notification_roles_save')
+post_delete.connect(_forget_role_members, sender=User, dispatch_uid='notification_roles_delete')
+
+
+def _publish_notification(sender, instance, created=False, raw=False, **kwargs):
+    if not raw and created:
+        events.publish_notification(instance)
+
+
+post_save.connect(_publish_notification, sender=Notification, dispatch_uid='events_notification')
+
+
+# Status transitions pushed to the owning customer and to staff.
+STATUS_EVENTS = {
+    Claim: ('claim_status', 'policy__customer__user', lambda claim: {
+        'id': claim.pk, 'claim_id': claim.claim_id, 'status': claim.status,
+        'approval_status': claim.approval_status, 'policy_id': claim.policy_id,
+    }),
+    InsurancePolicy: ('policy_status', 'customer__user', lambda policy: {
+        'id': policy.pk, 'policy_number': policy.policy_number, 'status': policy.status,
+    }),
+}
+
+
+def _remember_status(sender, instance, **kwargs):
+    instance._loaded_status = instance.__dict__.get('status')
+
+
+def _publish_status(sender, instance, created=False, raw=False, **kwargs):
+    if raw or (not created and instance.status == getattr(instance, '_loaded_status', None)):
+        return
+    instance._loaded_status = instance.status
+    kind, owner, describe = STATUS_EVENTS[sender]
+    data = describe(instance)
+    owner_id = sender.objects.filter(pk=instance.pk).values_list(owner, flat=True).first()
+    if owner_id:
+        events.publish(events.user_channel(owner_id), kind, data)
+    events.publish(events.topic_channel('staff'), kind, data)
+
+
+for _model in STATUS_EVENTS:
+    post_init.connect(_remember_status, sender=_model, dispatch_uid=f'events_status_init_{_model.__name__}')
+    post_save.connect(_publish_status, sender=_model, dispatch_uid=f'events_status_save_{_model.__name__}')
@@ -1,3 +1,916 @@
-from django.test import TestCase
+import datetime
+import json
+import os
+import random
+import tempfile
+import zipfile
+from io import BytesIO
+from unittest import mock
+from decimal import ROUND_HALF_UP, Decimal
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import analytics, authentication, documents, events, export_jobs, exports, notifications, plates, quoting, rating, rollups
+from .models import (
+    Claim, Customer, DailyRollup, InsuranceCoverage, InsurancePolicy, Notification, NotificationEvent, Payment, Quotation,
+    User,
+    Vehicle, VehicleCategory, owned_by,
+)
+
+
+class Fixtures:
+    """Small factories for the customer -> vehicle -> policy -> claim chain."""
+
+    _seq = 0
+
+    @classmethod
+    def _next(cls):
+        cls._seq += 1
+        return cls._seq
+
+    def make_user(self, user_type='customer', **fields):
+        n = self._next()
+        return User.objects.create_user(
+            username=f'user{n}', password='pw', user_type=user_type, national_id=f'ID{n}', **fields,
+        )
+
+    def make_customer(self, user=None):
+        user = user or self.make_user()
+        return Customer.objects.create(user=user, address_no='1', street='Main', town='Harare')
+
+    def make_category(self, name='light_motor'):
+        return VehicleCategory.objects.get_or_create(name=name, defaults={'description': name})[0]
+
+    def make_coverage(self, name='comprehensive'):
+        return InsuranceCoverage.objects.get_or_create(name=name, defaults={'description': name})[0]
+
+    def make_vehicle(self, customer, category=None, **fields):
+        n = self._next()
+        values = {
+            'vehicle_number': f'ABC{n:03d}', 'make': 'Toyota', 'model': 'Corolla', 'year': 2020,
+            'engine_number': f'ENG{n}', 'chassis_number': f'CH{n}', 'market_value': Decimal('10000.00'),
+        }
+        values.update(fields)
+        return Vehicle.objects.create(customer=customer, category=category or self.make_category(), **values)
+
+    def make_policy(self, vehicle, coverage=None, **fields):
+        values = {
+            'premium_amount': Decimal('500.00'), 'coverage_amount': Decimal('10000.00'),
+            'start_date': datetime.date(2026, 1, 1), 'end_date': datetime.date(2026, 12, 31),
+        }
+        values.update(fields)
+        return InsurancePolicy.objects.create(
+            customer=vehicle.customer, vehicle=vehicle, coverage=coverage or self.make_coverage(), **values,
+        )
+
+    def make_claim(self, policy, **fields):
+        values = {'incident_date': datetime.date(2026, 2, 1), 'description': 'Dent', 'estimated_amount': Decimal('200.00')}
+        values.update(fields)
+        return Claim.objects.create(policy=policy, **values)
+
+
+class DailyRollupTests(Fixtures, TestCase):
+    def rollup_rows(self):
+        return {
+            (row.coverage, row.vehicle_category): (row.policies_count, row.claims_count)
+            for row in DailyRollup.objects.all()
+            if row.policies_count or row.claims_count
+        }
+
+    def setUp(self):
+        vehicle = self.make_vehicle(self.make_customer())
+        self.policy = self.make_policy(vehicle)
+        self.make_claim(self.policy)
+        self.make_claim(self.policy)
+
+    def test_incremental_matches_rebuild(self):
+        incremental = self.rollup_rows()
+        rollups.rebuild()
+        self.assertEqual(incremental, self.rollup_rows())
+        self.assertEqual(incremental, {('comprehensive', 'light_motor'): (1, 2)})
+
+    def test_policy_coverage_change_moves_claims(self):
+        self.policy.coverage = self.make_coverage('third_party')
+        self.policy.save()
+        self.assertEqual(self.rollup_rows(), {('third_party', 'light_motor'): (1, 2)})
+
+    def test_vehicle_category_change_moves_policies_and_claims(self):
+        vehicle = self.policy.vehicle
+        vehicle.category = self.make_category('minibuses')
+        vehicle.save()
+        self.assertEqual(self.rollup_rows(), {('comprehensive', 'minibuses'): (1, 2)})
+        rollups.rebuild()
+        self.assertEqual(self.rollup_rows(), {('comprehensive', 'minibuses'): (1, 2)})
+
+
+class AnalyticsTests(Fixtures, TestCase):
+    def setUp(self):
+        self.customer = self.make_customer()
+        for month in (2, 2, 5):
+            policy = self.make_policy(self.make_vehicle(self.customer))
+            claim = self.make_claim(policy)
+            created = timezone.make_aware(datetime.datetime(2025, month, 10))
+            InsurancePolicy.objects.filter(pk=policy.pk).update(created_at=created)
+            Claim.objects.filter(pk=claim.pk).update(created_at=created)
+        # Another customer's rows stay out of the scoped series.
+        self.make_claim(self.make_policy(self.make_vehicle(self.make_customer())))
+
+    def test_customer_series_uses_two_grouped_queries(self):
+        with self.assertNumQueries(2):
+            series = analytics.monthly_series(2025, customer=self.customer)
+        by_month = {entry['month']: (entry['claims'], entry['policies'], entry['revenue']) for entry in series}
+        self.assertEqual(len(series), 12)
+        self.assertEqual(by_month[2], (2, 2, 1000.0))
+        self.assertEqual(by_month[5], (1, 1, 500.0))
+        self.assertEqual(by_month[3], (0, 0, 0.0))
+
+    def test_staff_series_reads_rollups_in_one_query(self):
+        today = timezone.now()
+        with self.assertNumQueries(1):
+            series = analytics.monthly_series(today.year)
+        self.assertEqual(series[today.month - 1]['policies'], 4)
+        self.assertEqual(series[today.month - 1]['claims'], 4)
+
+    def test_category_distribution_is_one_query(self):
+        self.make_category('minibuses')
+        with self.assertNumQueries(1):
+            distribution = analytics.category_distribution(customer=self.customer)
+        self.assertEqual({row['category']: row['count'] for row in distribution}, {'Light Motor Vehicles': 3, 'Minibuses': 0})
+
+
+@override_settings(DASHBOARD_CACHE_ALLOW_LOCMEM=True)
+class DashboardCacheTests(Fixtures, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.vehicle = self.make_vehicle(self.make_customer())
+
+    def test_write_invalidates_cached_summary(self):
+        self.assertEqual(analytics.cached_staff_dashboard_summary()['total_customers'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.make_customer()
+        self.assertEqual(analytics.cached_staff_dashboard_summary()['total_customers'], 2)
+
+    def test_contended_miss_does_not_serve_previous_generation(self):
+        analytics.cached_staff_dashboard_summary()
+        analytics.invalidate_staff_dashboard()
+        self.make_customer()
+        # Another worker holds the recompute lock for the new generation.
+        generation = cache.get('dashboard:staff:generation')
+        today = analytics.timezone.now().date().isoformat()
+        cache.add(f'dashboard:staff:{generation}:{today}:lock', 1)
+        with override_settings(DASHBOARD_CACHE_LOCK_TIMEOUT=0):
+            self.assertEqual(analytics.cached_staff_dashboard_summary()['total_customers'], 2)
+
+    @override_settings(DASHBOARD_CACHE_LOCK_TIMEOUT=30)
+    def test_contended_miss_waits_only_briefly(self):
+        generation = analytics._dashboard_generation()
+        today = analytics.timezone.now().date().isoformat()
+        cache.add(f'dashboard:staff:{generation}:{today}:lock', 1)
+        started = analytics.time.monotonic()
+        with mock.patch.object(analytics, 'DASHBOARD_LOCK_WAIT_SECONDS', 0.2):
+            self.assertEqual(analytics.cached_staff_dashboard_summary()['total_customers'], 1)
+        self.assertLess(analytics.time.monotonic() - started, 5)
+
+    def test_evicted_generation_does_not_revive_old_entries(self):
+        cache.set('dashboard:staff:generation', 1, timeout=None)
+        self.assertEqual(analytics.cached_staff_dashboard_summary()['total_customers'], 1)
+        # The counter is evicted, then a write invalidates.
+        cache.delete('dashboard:staff:generation')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.make_customer()
+        self.assertGreater(cache.get('dashboard:staff:generation'), 1)
+        self.assertEqual(analytics.cached_staff_dashboard_summary()['total_customers'], 2)
+
+    @override_settings(DASHBOARD_CACHE_ALLOW_LOCMEM=False)
+    def test_process_local_cache_is_not_used(self):
+        analytics._warned_local_cache = False
+        with self.assertLogs('api.analytics', 'WARNING'):
+            self.assertEqual(analytics.cached_staff_dashboard_summary()['total_customers'], 1)
+        Customer.objects.bulk_create([Customer(user=self.make_user(), customer_id='CUSTBULK', address_no='1')])
+        self.assertEqual(analytics.cached_staff_dashboard_summary()['total_customers'], 2)
+
+
+class DashboardReportExportTests(Fixtures, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.make_user('manager'))
+        self.make_customer()
+
+    def test_csv(self):
+        response = self.client.get('/api/export/dashboard/', {'format': 'csv'})
+        self.assertEqual(response.status_code, 200)
+        body = b''.join(response.streaming_content).decode()
+        self.assertIn('total_customers,1', body.splitlines())
+
+    def test_unknown_format(self):
+        self.assertEqual(self.client.get('/api/export/dashboard/', {'format': 'pdf'}).status_code, 404)
+
+
+class BulkAutoQuoteTests(Fixtures, TestCase):
+    def setUp(self):
+        self.underwriter = self.make_user('underwriter')
+        customer = self.make_customer()
+        self.policies = [self.make_policy(self.make_vehicle(customer)) for _ in range(3)]
+
+    def test_second_run_skips_quoted_policies(self):
+        first = quoting.bulk_auto_quote(InsurancePolicy.objects.all(), self.underwriter)
+        self.assertEqual((first['matched'], first['quoted'], first['skipped']), (3, 3, 0))
+        second = quoting.bulk_auto_quote(InsurancePolicy.objects.all(), self.underwriter)
+        self.assertEqual((second['matched'], second['quoted'], second['skipped']), (3, 0, 3))
+        self.assertEqual(Quotation.objects.count(), 3)
+        self.assertEqual(Notification.objects.filter(type='quotation').count(), 3)
+
+    def test_boolean_ids_are_rejected(self):
+        client = APIClient()
+        client.force_authenticate(self.underwriter)
+        for ids in ([True], [self.policies[0].pk, False]):
+            response = client.post('/api/policies/bulk_auto_quote/', {'ids': ids}, format='json')
+            self.assertEqual(response.status_code, 400)
+        self.assertFalse(Quotation.objects.exists())
+
+    def test_locked_recheck_skips_policies_quoted_since_read(self):
+        rows = list(InsurancePolicy.objects.order_by('pk').values(*quoting._FIELDS))
+        premiums = quoting.rating.rate(
+            [row['vehicle__market_value'] for row in rows],
+            [row['coverage__name'] for row in rows],
+            [row['vehicle__category__name'] for row in rows],
+        )
+        quotes = [premiums.quote(index) for index in range(len(rows))]
+        Quotation.objects.create(policy=self.policies[0], premium_amount=1, coverage_amount=1)
+        self.assertEqual(quoting._write_chunk(rows, quotes, self.underwriter), 2)
+
+
+def decimal_quote(market_value, base_rate, stamp_duty_rate, motor_levy_rate):
+    """The per-policy Decimal formula the rating engine replaced."""
+    cent = Decimal('0.01')
+    base = (market_value * base_rate).quantize(cent, rounding=ROUND_HALF_UP)
+    stamp = (base * stamp_duty_rate).quantize(cent, rounding=ROUND_HALF_UP)
+    levy = (base * motor_levy_rate).quantize(cent, rounding=ROUND_HALF_UP)
+    annual = (base + stamp + levy).quantize(cent, rounding=ROUND_HALF_UP)
+    return annual, (annual / Decimal('3')).quantize(cent, rounding=ROUND_HALF_UP)
+
+
+class LegacyQuoteEndpointTests(Fixtures, TestCase):
+    """auto_quote and export_quote price with table 2025.1, including its category loadings.
+
+    Before 2025.1 both endpoints ignored the category: USD 10,000 comprehensive
+    cover was 643.50 a year for every vehicle. Light motor vehicles keep that
+    figure; loaded categories are deliberately dearer.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.make_user('underwriter'))
+        customer = self.make_customer()
+        self.light = self.make_policy(self.make_vehicle(customer, self.make_category('light_motor')))
+        self.heavy = self.make_policy(self.make_vehicle(customer, self.make_category('heavy_vehicles')))
+
+    def preview(self, policy):
+        response = self.client.post(f'/api/policies/{policy.pk}/auto_quote/', {'preview': True}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.data['annual_premium'], response.data['termly_premium']
+
+    def exported_annual_premium(self, policy):
+        from openpyxl import load_workbook
+
+        response = self.client.get(f'/api/policies/{policy.pk}/export_quote/', {'format': 'xlsx'})
+        self.assertEqual(response.status_code, 200)
+        sheet = load_workbook(BytesIO(b''.join(response.streaming_content))).active
+        return next(row[1] for row in sheet.iter_rows(values_only=True) if row and row[0] == 'TOTAL Annual Premium')
+
+    def test_auto_quote(self):
+        self.assertEqual(self.preview(self.light), ('643.50', '214.50'))
+        # 10,000 x 6% x 1.6 = 960.00 base, + 48.00 stamp duty + 21.60 levy.
+        self.assertEqual(self.preview(self.heavy), ('1029.60', '343.20'))
+
+    @override_settings(DOCUMENT_CACHE_ROOT=tempfile.mkdtemp())
+    def test_export_quote(self):
+        self.assertEqual(self.exported_annual_premium(self.light), 643.5)
+        self.assertEqual(self.exported_annual_premium(self.heavy), 1029.6)
+
+
+class RatingTests(TestCase):
+    def assert_parity(self, table_rates, loadings, premiums, values, coverages, categories):
+        for index, (value, coverage, category) in enumerate(zip(values, coverages, categories)):
+            rates = table_rates[coverage]
+            expected = decimal_quote(
+                value, rates['base_rate'] * loadings.get(category, Decimal('1.0')),
+                rates['stamp_duty_rate'], rates['motor_levy_rate'],
+            )
+            quote = premiums.quote(index)
+            self.assertEqual((quote['annual_premium'], quote['termly_premium']), expected, (value, coverage, category))
+
+    def test_vectorized_matches_decimal_formula(self):
+        rng = random.Random(8)
+        table = rating.rate_table()
+        values = [Decimal(rng.randrange(0, 20_000_000)) / 100 for _ in range(2000)]
+        coverages = [rng.choice(table.coverages) for _ in values]
+        categories = [rng.choice([*table.categories, None, 'unknown']) for _ in values]
+        premiums = rating.rate(values, coverages, categories)
+        self.assert_parity(table.rates, table.loadings, premiums, values, coverages, categories)
+
+    def test_candidate_table_accepts_json_numbers(self):
+        table = rating.candidate_table({'coverages': {'comprehensive': {'motor_levy_rate': 0.025}}})
+        self.assertEqual(table.rates['comprehensive']['motor_levy_rate'], Decimal('0.025'))
+        value = Decimal('12345.67')
+        coverage = table.coverage_index['comprehensive']
+        components = rating.price(table, rating.to_cents([value]), [coverage], [table.default_category])
+        annual_cents = sum(int(component[0]) for component in components)
+        expected = decimal_quote(value, Decimal('0.06'), Decimal('0.05'), Decimal('0.025'))[0]
+        self.assertEqual(Decimal(annual_cents) / 100, expected)
+
+    def test_candidate_table_rejects_negative_rates(self):
+        with self.assertRaises(ValueError):
+            rating.candidate_table({'category_loadings': {'buses': -1}})
+
+
+class SimulationTests(Fixtures, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.make_user('manager'))
+        customer = self.make_customer()
+        for coverage in ('comprehensive', 'comprehensive', 'third_party'):
+            self.make_policy(self.make_vehicle(customer), self.make_coverage(coverage), status='active')
+        # Pending policies are not part of the active book.
+        self.make_policy(self.make_vehicle(customer), status='pending')
+
+    def simulate(self, scenario):
+        response = self.client.post('/api/rating/simulate/', {'scenarios': [scenario]}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_totals_by_coverage(self):
+        result = self.simulate({'name': 'levy', 'overrides': {'coverages': {'comprehensive': {'motor_levy_rate': '0.03'}}}})
+        self.assertEqual(result['policies'], 3)
+        scenario = result['scenarios'][0]
+        # 643.50 per comprehensive and 319.50 per third-party policy; the levy rises 4.50 on each 600.00 base.
+        self.assertEqual(scenario['totals']['current_annual_premium'], '1606.50')
+        self.assertEqual(scenario['totals']['candidate_annual_premium'], '1615.50')
+        self.assertEqual(scenario['components'], {'base_premium': '0.00', 'stamp_duty': '0.00', 'motor_levy': '9.00'})
+        by_coverage = {row['coverage']: (row['policies'], row['current_annual_premium'], row['delta']) for row in scenario['by_coverage']}
+        self.assertEqual(by_coverage, {'comprehensive': (2, '1287.00', '9.00'), 'third_party': (1, '319.50', '0.00')})
+
+    def test_unknown_version(self):
+        response = self.client.post('/api/rating/simulate/', {'scenarios': [{'version': '1999.1'}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class DocumentCacheTests(TestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.enterContext(override_settings(DOCUMENT_CACHE_ROOT=root.name))
+        self.enterContext(mock.patch.object(documents, 'MAX_BYTES', 10_000))
+        self.enterContext(mock.patch.object(documents, '_size', documents._SizeEstimate()))
+        self.root = root.name
+
+    def test_scans_only_when_the_estimate_crosses_the_budget(self):
+        with mock.patch.object(documents, 'evict', wraps=documents.evict) as evict:
+            for n in range(500):
+                documents.store(f'key{n}', 'pdf', b'x' * 50)
+        # One initial scan, then about one per tenth of the budget written (not one per document).
+        self.assertLess(evict.call_count, 30)
+        total = sum(entry.stat().st_size for entry in os.scandir(self.root))
+        self.assertLessEqual(total, 10_000 + 1_000)
+        self.assertTrue(os.path.exists(os.path.join(self.root, 'key499.pdf')))
+
+
+class QuotePackTests(Fixtures, TestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.enterContext(override_settings(
+            EXPORT_ROOT=os.path.join(root.name, 'exports'),
+            DOCUMENT_CACHE_ROOT=os.path.join(root.name, 'documents'),
+            DOCUMENT_RENDER_WORKERS=0,
+        ))
+        self.client = APIClient()
+        self.client.force_authenticate(self.make_user('underwriter'))
+        customer = self.make_customer()
+        self.policies = [self.make_policy(self.make_vehicle(customer)) for _ in range(3)]
+
+    def test_pack_is_built_by_the_export_worker_with_error_entries(self):
+        failing = self.policies[1].policy_number
+        render_pdf = documents.RENDERERS['pdf']
+
+        def render(context):
+            if context['policy_number'] == failing:
+                raise RuntimeError('boom')
+            return render_pdf(context)
+
+        response = self.client.post(
+            '/api/policies/quote_pack/', {'ids': [p.pk for p in self.policies] + [999999], 'format': 'pdf'}, format='json',
+        )
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['missing'], 1)
+
+        with mock.patch.dict(documents.RENDERERS, {'pdf': render}), self.assertLogs('api.document_packs', 'ERROR'):
+            job = export_jobs.run(export_jobs.claim_next())
+        self.assertEqual((job.status, job.row_count), ('completed', 2))
+        with zipfile.ZipFile(job.file_path) as archive:
+            names = sorted(archive.namelist())
+            error = archive.read(f'quotation_{failing}.pdf.error.txt').decode()
+        self.assertEqual(len(names), 3)
+        self.assertIn('boom', error)
+
+        download = self.client.get(f'/api/export-jobs/{job.pk}/download/')
+        self.assertEqual(download['Content-Type'], 'application/zip')
+        download.close()
+
+
+@override_settings(EXPORT_ROOT=tempfile.mkdtemp())
+class ExportEndpointTests(Fixtures, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.make_user('manager'))
+        policy = self.make_policy(self.make_vehicle(self.make_customer()))
+        self.claims = [self.make_claim(policy) for _ in range(3)]
+
+    def test_xlsx_streams_every_row(self):
+        from openpyxl import load_workbook
+
+        response = self.client.get('/api/export/claims/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        rows = list(load_workbook(BytesIO(b''.join(response.streaming_content))).active.iter_rows(values_only=True))
+        self.assertEqual(list(rows[0]), [column.header for column in exports.EXPORTS['claims'].columns])
+        self.assertEqual(sorted(row[0] for row in rows[1:]), sorted(claim.claim_id for claim in self.claims))
+
+    def test_selected_columns(self):
+        response = self.client.get('/api/export/claims/', {'format': 'csv', 'columns': 'claim_id,status'})
+        self.assertEqual(response.status_code, 200)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'Claim ID,Status')
+        self.assertEqual(len(lines), 4)
+
+    def test_unknown_column(self):
+        response = self.client.get('/api/export/claims/', {'format': 'csv', 'columns': 'claim_id,colour'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ExportSpecTests(Fixtures, TestCase):
+    def setUp(self):
+        processor = self.make_user('underwriter', first_name='Ann', last_name='Moyo')
+        for _ in range(5):
+            policy = self.make_policy(self.make_vehicle(self.make_customer()))
+            self.make_claim(policy, processed_by=processor)
+
+    def rows(self, name):
+        spec = exports.EXPORTS[name]
+        columns = spec.select()
+        with self.assertNumQueries(1):
+            return list(spec.rows(columns))
+
+    def test_related_columns_load_in_one_query(self):
+        policies = self.rows('policies')
+        self.assertEqual(len(policies), 5)
+        self.assertEqual(policies[0][3], 'Toyota Corolla')
+        claims = self.rows('claims')
+        self.assertEqual(len(claims), 5)
+        self.assertEqual({row[12] for row in claims}, {'Ann Moyo'})
+
+    def test_unknown_column(self):
+        with self.assertRaises(ValueError):
+            exports.EXPORTS['claims'].select(['claim_id', 'colour'])
+
+
+class SparseFieldsetTests(Fixtures, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.make_user('manager'))
+        self.vehicle = self.make_vehicle(self.make_customer())
+        self.make_claim(self.make_policy(self.vehicle))
+
+    def test_fields_limit_keys_and_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/claims/', {'fields': 'claim_id,vehicle_number'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data['results'][0]), {'claim_id', 'vehicle_number'})
+        self.assertEqual(response.data['results'][0]['vehicle_number'], self.vehicle.vehicle_number)
+        self.assertFalse(any('"description"' in query['sql'] for query in queries.captured_queries))
+
+    def test_exclude(self):
+        response = self.client.get('/api/claims/', {'exclude': 'description,customer'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('description', response.data['results'][0])
+        self.assertIn('claim_id', response.data['results'][0])
+
+    def test_unknown_field(self):
+        response = self.client.get('/api/claims/', {'fields': 'claim_id,colour'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('colour', str(response.data['fields']))
+
+
+class RelationPlannerTests(Fixtures, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.make_user('manager'))
+
+    def list_queries(self, url, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url, params).status_code, 200)
+        return len(queries)
+
+    def add_claims(self, count):
+        for _ in range(count):
+            self.make_claim(self.make_policy(self.make_vehicle(self.make_customer())))
+
+    def test_claim_list_query_count_is_constant(self):
+        self.add_claims(2)
+        few = self.list_queries('/api/claims/')
+        projected = self.list_queries('/api/claims/', {'fields': 'claim_id,customer,vehicle_number'})
+        self.add_claims(5)
+        self.assertEqual(self.list_queries('/api/claims/'), few)
+        self.assertEqual(self.list_queries('/api/claims/', {'fields': 'claim_id,customer,vehicle_number'}), projected)
+
+    def test_policy_list_query_count_is_constant(self):
+        self.add_claims(2)
+        few = self.list_queries('/api/policies/')
+        self.add_claims(5)
+        self.assertEqual(self.list_queries('/api/policies/'), few)
+
+
+@override_settings(EXPORT_ROOT=tempfile.mkdtemp())
+class ExportJobTests(Fixtures, TestCase):
+    def setUp(self):
+        self.make_policy(self.make_vehicle(self.make_customer()))
+        self.client = APIClient()
+
+    def test_customers_cannot_queue_book_exports(self):
+        self.client.force_authenticate(self.make_user())
+        response = self.client.post('/api/export-jobs/', {'export': 'policies', 'format': 'csv'}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_peak_memory_is_recorded_without_tracing(self):
+        self.client.force_authenticate(self.make_user('underwriter'))
+        response = self.client.post('/api/export-jobs/', {'export': 'policies', 'format': 'csv'}, format='json')
+        self.assertEqual(response.status_code, 202)
+        job = export_jobs.run(export_jobs.claim_next())
+        self.assertEqual((job.status, job.row_count), ('completed', 1))
+        self.assertGreater(job.peak_memory_kb, 0)
+
+
+class SearchIndexTests(Fixtures, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.make_user('underwriter'))
+        customer = self.make_customer(self.make_user(first_name='Tendai', email='tendai.moyo@example.com'))
+        self.vehicle = self.make_vehicle(customer, vehicle_number='ABC123')
+
+    def results(self, path, **params):
+        return [row['id'] for row in self.client.get(path, params).data['results']]
+
+    def test_prefix_match_uses_the_index(self):
+        self.assertEqual(self.results('/api/search/vehicles/', q='ABC'), [self.vehicle.pk])
+
+    def test_miss_is_empty_unless_substring_requested(self):
+        self.assertEqual(self.results('/api/search/vehicles/', q='123'), [])
+        self.assertEqual(self.client.get('/api/customers/', {'search': 'ndai'}).data['count'], 0)
+        self.assertEqual(self.results('/api/search/vehicles/', q='123', substring=1), [self.vehicle.pk])
+        self.assertEqual(len(self.results('/api/search/customers/', q='moyo@example', substring=1)), 1)
+        self.assertEqual(self.client.get('/api/customers/', {'search': 'ndai', 'substring': 1}).data['count'], 1)
+
+    def test_filter_skips_the_existence_check(self):
+        with self.assertNumQueries(2):
+            # The page's count and rows; no separate existence check.
+            self.client.get('/api/vehicles/', {'search': 'ABC'})
+
+
+class OmniboxTests(Fixtures, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.make_user('underwriter'))
+        user = self.make_user(first_name='Rudo', last_name='Chikore')
+        user.national_id = '63-123456A78'
+        user.save()
+        self.customer = self.make_customer(user)
+        self.vehicle = self.make_vehicle(self.customer, vehicle_number='ABC1234')
+        self.policy = self.make_policy(self.vehicle)
+
+    def search(self, q, client=None):
+        response = (client or self.client).get('/api/search/', {'q': q})
+        self.assertEqual(response.status_code, 200)
+        return response.data['kind'], [(group['type'], [row['id'] for row in group['results']]) for group in response.data['groups']]
+
+    def test_policy_number(self):
+        self.assertEqual(self.search(self.policy.policy_number.lower()), ('id', [('policy', [self.policy.pk])]))
+        self.assertEqual(self.search(self.policy.policy_number[:6]), ('id', [('policy', [self.policy.pk])]))
+
+    def test_national_id(self):
+        self.assertEqual(
+            self.search('63123456A78'), ('national_id', [('customer', [self.customer.pk]), ('policy', [self.policy.pk])]),
+        )
+
+    def test_plate_and_name_are_text(self):
+        self.assertEqual(self.search('ABC1234'), ('text', [('vehicle', [self.vehicle.pk])]))
+        self.assertEqual(self.search('Rudo'), ('text', [('customer', [self.customer.pk])]))
+
+    def test_customers_only_find_their_own_records(self):
+        client = APIClient()
+        client.force_authenticate(self.make_customer().user)
+        self.assertEqual(self.search(self.policy.policy_number, client), ('id', []))
+        self.assertEqual(self.search('ABC1234', client), ('text', []))
+
+
+class PlateIndexTests(Fixtures, TestCase):
+    def setUp(self):
+        self.vehicle = self.make_vehicle(self.make_customer(), vehicle_number='ABC-1234')
+        self.index = plates.PlateIndex()
+        self.index.rebuild()
+
+    def test_nearest_folds_confusable_characters(self):
+        self.assertEqual(self.index.nearest('a8c 1z34'), [(self.vehicle.pk, 0)])
+        self.assertEqual(self.index.nearest('ABC1235'), [(self.vehicle.pk, 1)])
+
+    def test_writes_during_a_rebuild_survive_the_swap(self):
+        # A rebuild is running: its snapshot predates this write.
+        self.index._pending = []
+        self.index.update(999999, 'XYZ 999')
+        self.index.remove(self.vehicle.pk)
+        self.index.rebuild()
+        self.assertEqual(self.index.nearest('XYZ999'), [(999999, 0)])
+        self.assertEqual(self.index.nearest('ABC1234'), [])
+
+    def test_failed_build_falls_back_to_the_database_and_retries(self):
+        index = plates.PlateIndex()
+        with mock.patch.object(plates.Vehicle.objects, 'values_list', side_effect=RuntimeError('table is locked')), \
+                self.assertLogs('api.plates', 'ERROR'):
+            index._start_rebuild().join()
+        self.assertIsNone(index._tree)
+        with mock.patch.object(index, '_start_rebuild') as retry:
+            self.assertEqual(index.nearest('a8c-1z34'), [(self.vehicle.pk, 0)])
+        retry.assert_called_once()
+
+    def test_vehicle_saved_through_the_api_is_found_by_a_confusable_plate(self):
+        customer_user = self.make_user()
+        self.make_customer(customer_user)
+        client = APIClient()
+        client.force_authenticate(customer_user)
+        with mock.patch.object(plates, 'index', self.index), self.captureOnCommitCallbacks(execute=True):
+            response = client.post('/api/vehicles/', {
+                'vehicle_number': 'AEZ 5081', 'category': self.make_category().pk, 'make': 'Mazda', 'model': 'Demio',
+                'year': 2018, 'engine_number': 'E-API', 'chassis_number': 'C-API', 'market_value': '8000.00',
+            }, format='json')
+            self.assertEqual(response.status_code, 201)
+        client.force_authenticate(self.make_user('underwriter'))
+        with mock.patch.object(plates, 'index', self.index):
+            results = client.get('/api/search/vehicles/', {'q': 'aez-s08i', 'fuzzy': 1}).data['results']
+        self.assertEqual([(row['id'], row['match_distance']) for row in results], [(response.data['id'], 0)])
+
+
+class PrincipalCacheTests(Fixtures, TestCase):
+    def test_eviction_waits_for_commit(self):
+        user = self.make_user()
+        authentication.cache.put(user.pk, user)
+        with self.captureOnCommitCallbacks(execute=True):
+            user.is_active = False
+            user.save()
+            # Until commit other requests still read the old row, so the entry must stay.
+            self.assertIsNotNone(authentication.cache.get(user.pk))
+        self.assertIsNone(authentication.cache.get(user.pk))
+
+
+class NotificationRetryTests(TestCase):
+    def test_failed_delivery_is_requeued_with_backoff(self):
+        event = NotificationEvent.objects.create(role='staff', title='Claim filed')
+        with mock.patch.object(notifications.Notification.objects, 'create', side_effect=RuntimeError('db down')):
+            notifications.deliver(notifications.claim_next())
+        event.refresh_from_db()
+        self.assertEqual((event.status, event.attempts), ('queued', 1))
+        # Not due yet.
+        self.assertIsNone(notifications.claim_next())
+
+        event.not_before = None
+        event.save()
+        notifications.deliver(notifications.claim_next())
+        event.refresh_from_db()
+        self.assertEqual(event.status, 'delivered')
+        self.assertTrue(Notification.objects.filter(topic='staff', title='Claim filed').exists())
+
+    def test_gives_up_after_max_attempts(self):
+        event = NotificationEvent.objects.create(role='staff', title='Claim filed', attempts=notifications.MAX_ATTEMPTS - 1)
+        with mock.patch.object(notifications.Notification.objects, 'create', side_effect=RuntimeError('db down')):
+            notifications.deliver(notifications.claim_next())
+        event.refresh_from_db()
+        self.assertEqual(event.status, 'failed')
+
+
+class NotificationInboxTests(Fixtures, TestCase):
+    def setUp(self):
+        self.underwriters = [self.make_user('underwriter') for _ in range(2)]
+        self.customer_user = self.make_user()
+        with self.captureOnCommitCallbacks(execute=True):
+            notifications.broadcast('staff', 'Claim filed')
+        Notification.objects.create(recipient=self.underwriters[0], title='Welcome')
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def inbox(self, user):
+        response = self.client_for(user).get('/api/notifications/')
+        self.assertEqual(response.status_code, 200)
+        return {row['title']: row['is_read'] for row in response.data['results']}
+
+    def test_role_broadcast_is_stored_once_and_read_per_user(self):
+        topic = Notification.objects.get(topic='staff')
+        self.assertEqual(Notification.objects.filter(title='Claim filed').count(), 1)
+        self.assertEqual(self.inbox(self.underwriters[0]), {'Claim filed': False, 'Welcome': False})
+        self.assertEqual(self.client_for(self.underwriters[1]).post(f'/api/notifications/{topic.pk}/read/').status_code, 200)
+        self.assertEqual(self.inbox(self.underwriters[1]), {'Claim filed': True})
+        self.assertEqual(self.inbox(self.underwriters[0]), {'Claim filed': False, 'Welcome': False})
+
+    def test_mark_all_read(self):
+        client = self.client_for(self.underwriters[0])
+        self.assertEqual(client.get('/api/notifications/unread_count/').data['count'], 2)
+        self.assertEqual(client.post('/api/notifications/mark_all_read/').data, {'marked': 2, 'count': 0})
+        self.assertEqual(self.inbox(self.underwriters[0]), {'Claim filed': True, 'Welcome': True})
+        self.assertEqual(self.inbox(self.underwriters[1]), {'Claim filed': False})
+
+    def test_topics_are_limited_to_members_who_joined_before(self):
+        late = self.make_user('manager', date_joined=timezone.now() + datetime.timedelta(seconds=1))
+        self.assertEqual(self.inbox(late), {})
+        self.assertEqual(self.inbox(self.customer_user), {})
+
+
+class UnreadCounterTests(Fixtures, TestCase):
+    """The stored counter must always equal a fresh recount."""
+
+    def setUp(self):
+        self.customer_user = self.make_user()
+        self.underwriter = self.make_user('underwriter')
+        self.make_policy(self.make_vehicle(self.make_customer(self.customer_user)))
+        # Compute the counters so later writes must keep them up to date.
+        for user in (self.customer_user, self.underwriter):
+            self.assertEqual(notifications.unread_count(user), 0)
+
+    def assert_consistent(self, user, expected):
+        self.assertEqual(notifications.unread_count(user), expected)
+        cursor = notifications.NotificationCursor.objects.get(user=user)
+        self.assertEqual(notifications._count_unread(user, cursor), expected)
+
+    def test_direct_bulk_and_topic_inserts_and_reads(self):
+        direct = Notification.objects.create(recipient=self.customer_user, title='Welcome')
+        quoting.bulk_auto_quote(InsurancePolicy.objects.all(), self.underwriter)
+        notifications.create_direct([Notification(recipient=self.customer_user, title=f'Note {n}') for n in range(2)])
+        self.assert_consistent(self.customer_user, 4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            notifications.broadcast('staff', 'Claim filed')
+        self.assert_consistent(self.underwriter, 1)
+
+        self.assertEqual(notifications.mark_read(self.customer_user, [direct.pk]), 1)
+        self.assertEqual(notifications.mark_read(self.customer_user, [direct.pk]), 0)
+        self.assert_consistent(self.customer_user, 3)
+        self.assertEqual(notifications.mark_all_read(self.customer_user), 3)
+        self.assert_consistent(self.customer_user, 0)
+        self.assertEqual(notifications.mark_all_read(self.underwriter), 1)
+        self.assert_consistent(self.underwriter, 0)
+
+    def test_read_flag_edited_outside_mark_read_is_recounted(self):
+        notification = Notification.objects.create(recipient=self.customer_user, title='Welcome')
+        notification.is_read = True
+        notification.save()
+        self.assert_consistent(self.customer_user, 0)
+
+
+class LiveEventTests(Fixtures, TestCase):
+    def test_bulk_inserted_notifications_are_published(self):
+        user = self.make_user()
+        with mock.patch.object(events, 'publish') as publish, self.captureOnCommitCallbacks(execute=True):
+            notifications.create_direct([Notification(recipient=user, title=f'Note {n}') for n in range(2)])
+        self.assertEqual([call.args[:2] for call in publish.call_args_list], [(events.user_channel(user.pk), 'notification')] * 2)
+
+    def test_stream_is_off_unless_enabled(self):
+        client = APIClient()
+        client.force_authenticate(self.make_user())
+        self.assertEqual(client.post('/api/events/ticket/').status_code, 404)
+        self.assertEqual(client.get('/api/events/').status_code, 404)
+
+    def test_stream_tickets_are_single_use(self):
+        user = self.make_user()
+        client = APIClient()
+        client.force_authenticate(user)
+        with mock.patch.object(events, 'STREAM_ENABLED', True):
+            ticket = client.post('/api/events/ticket/').data['ticket']
+        self.assertEqual(events.redeem_ticket(ticket), user.pk)
+        self.assertIsNone(events.redeem_ticket(ticket))
+        self.assertIsNone(events.redeem_ticket('forged'))
+
+    def test_notification_worker_requires_a_shared_broker(self):
+        with mock.patch.object(events, 'BROKER_URL', ''), self.assertRaises(ImproperlyConfigured):
+            call_command('run_notification_worker', once=True)
+
+
+class PrincipalScopingTests(Fixtures, TestCase):
+    def setUp(self):
+        self.owner = self.make_user()
+        self.other = self.make_user()
+        self.claim = self.make_claim(self.make_policy(self.make_vehicle(self.make_customer(self.owner))))
+        self.other_claim = self.make_claim(self.make_policy(self.make_vehicle(self.make_customer(self.other))))
+
+    def test_for_principal(self):
+        self.assertEqual(list(Claim.objects.for_principal(self.owner)), [self.claim])
+        self.assertEqual(Claim.objects.for_principal(self.make_user('underwriter')).count(), 2)
+        self.assertEqual(Claim.objects.for_principal(None).count(), 0)
+
+    def test_owned_by(self):
+        claim = Claim.objects.for_principal(self.owner).get()
+        with self.assertNumQueries(0):
+            self.assertTrue(owned_by(claim, self.owner))
+            self.assertFalse(owned_by(claim, self.other))
+            self.assertFalse(owned_by(claim, None))
+        self.assertTrue(owned_by(self.owner.customer_profile, self.owner))
+
+    def test_api_hides_other_customers_rows(self):
+        client = APIClient()
+        client.force_authenticate(self.owner)
+        self.assertEqual([row['id'] for row in client.get('/api/claims/').data['results']], [self.claim.pk])
+        self.assertEqual(client.get(f'/api/claims/{self.other_claim.pk}/').status_code, 404)
+
+
+class KeysetPagingTests(Fixtures, TestCase):
+    def setUp(self):
+        policy = self.make_policy(self.make_vehicle(self.make_customer()))
+        self.claims = [self.make_claim(policy) for _ in range(7)]
+        # Ties on the ordering field must be broken by id.
+        Claim.objects.filter(pk__in=[claim.pk for claim in self.claims[2:5]]).update(
+            created_at=self.claims[2].created_at,
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.make_user('underwriter'))
+
+    def walk(self, url):
+        ids, pages = [], []
+        while url:
+            body = self.client.get(url).data
+            pages.append(body)
+            ids += [row['id'] for row in body['results']]
+            if len(pages) == 1:
+                # Rows added after the walk starts sort ahead of it and must not shift later pages.
+                self.make_claim(self.claims[0].policy)
+            url = body['next']
+        return ids, pages
+
+    def test_pages_neither_skip_nor_repeat_rows(self):
+        ids, pages = self.walk('/api/claims/?cursor=&page_size=2')
+        expected = list(
+            Claim.objects.filter(pk__in=[claim.pk for claim in self.claims])
+            .order_by('-created_at', '-pk').values_list('pk', flat=True)
+        )
+        self.assertEqual(ids, expected)
+        self.assertEqual(len(pages), 4)
+        previous = self.client.get(pages[2]['previous']).data
+        self.assertEqual(previous['results'], pages[1]['results'])
+
+    def test_requested_ordering_is_honoured_or_rejected(self):
+        Claim.objects.filter(pk=self.claims[3].pk).update(estimated_amount=Decimal('999.00'))
+        body = self.client.get('/api/claims/', {'cursor': '', 'ordering': '-estimated_amount'}).data
+        self.assertEqual(body['results'][0]['id'], self.claims[3].pk)
+        for ordering in ('approved_amount', '-approved_amount'):
+            response = self.client.get('/api/claims/', {'cursor': '', 'ordering': ordering})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('ordering', response.data)
+        # Without ?cursor page-number pagination keeps accepting it.
+        self.assertEqual(self.client.get('/api/claims/', {'ordering': 'approved_amount'}).status_code, 200)
+
+
+class DashboardListPagingTests(Fixtures, TestCase):
+    def setUp(self):
+        policy = self.make_policy(self.make_vehicle(self.make_customer()))
+        self.payments = [
+            Payment.objects.create(payment_id=f'PAY{n:08d}', policy=policy, amount=Decimal('10.00'), payment_method='cash')
+            for n in range(5)
+        ]
+        self.claims = [self.make_claim(policy) for _ in range(5)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.make_user('manager'))
+
+    def body(self, url, params=None):
+        response = self.client.get(url, params)
+        return json.loads(b''.join(response.streaming_content))
+
+    def walk(self, url, key):
+        ids, params = [], {'page_size': 2}
+        while True:
+            body = self.body(url, params)
+            ids += [row['id'] for row in body[key]]
+            if not body['next_cursor']:
+                return ids
+            params = {'page_size': 2, 'cursor': body['next_cursor']}
+
+    def test_unpaged_requests_keep_every_row(self):
+        self.assertEqual(len(self.body('/api/payments/')), 5)
+        self.assertEqual(len(self.body('/api/claims/data/')['claims']), 5)
+
+    def test_pages_follow_next_cursor_in_the_body(self):
+        self.assertEqual(self.walk('/api/payments/', 'results'), [payment.pk for payment in reversed(self.payments)])
+        self.assertEqual(self.walk('/api/claims/data/', 'claims'), [claim.pk for claim in reversed(self.claims)])
@@ -19,14 +19,19 @@ from .views import (
     DashboardStatsViewSet,
     NotificationViewSet,
     QuotationViewSet,
+    ExportJobViewSet,
     # Profile views
     UserProfileView,
     CustomerProfileView,
     # API views only (no HTML templates)
+    event_stream,
+    event_ticket,
+    omnibox_search,
     search_customers,
     search_vehicles,
     analytics_overview,
     generate_quote,
+    simulate_rates,
     generate_report,
     export_policies_excel,
     export_payments_excel,
@@ -66,6 +71,7 @@ router.register(r'claim-documents', ClaimDocumentViewSet, basename='claim-docume
 router.register(r'dashboard-stats', DashboardStatsViewSet, basename='dashboard-stats')
 router.register(r'notifications', NotificationViewSet, basename='notification')
 router.register(r'quotations', QuotationViewSet, basename='quotation')
+router.register(r'export-jobs', ExportJobViewSet, basename='export-job')
 
 urlpatterns = [
     # Auth (JWT)
@@ -82,13 +88,19 @@ urlpatterns = [
     path('api/health/', health_check, name='health_check'),
     path('api/user-permissions/', user_permissions, name='user_permissions'),
 
+    # Live updates (server-sent events; serve Core.asgi under an ASGI server)
+    path('api/events/', event_stream, name='event_stream'),
+    path('api/events/ticket/', event_ticket, name='event_ticket'),
+
     # Search
+    path('api/search/', omnibox_search, name='omnibox_search'),
     path('api/search/customers/', search_customers, name='search_customers'),
     path('api/search/vehicles/', search_vehicles, name='search_vehicles'),
 
     # Analytics and reports
     path('api/analytics/overview/', analytics_overview, name='analytics_overview'),
     path('api/generate-quote/', generate_quote, name='generate_quote'),
+    path('api/rating/simulate/', simulate_rates, name='simulate_rates'),
     path('api/generate-report/', generate_report, name='generate_report'),
     
     # Excel Export endpoints
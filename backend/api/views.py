@@ -1,32 +1,35 @@
 # views.py - Updated with proper template integration
-from rest_framework import generics, status, viewsets, filters, permissions
-from rest_framework.decorators import api_view, permission_classes, action
+from rest_framework import generics, mixins, status, viewsets, filters, permissions
+from rest_framework.decorators import api_view, permission_classes, renderer_classes, action
 from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.settings import api_settings
 from django_filters.rest_framework import DjangoFilterBackend
 from django.contrib.auth import login, authenticate, logout
-from django.db.models import Count, Sum, Avg, Q
+from django.db.models import Sum, Q
 from django.utils import timezone
 from datetime import datetime, timedelta
 from decimal import Decimal
 import json
 from django.contrib import messages
 from django.conf import settings
-from django.utils.http import url_has_allowed_host_and_scheme
+from django.utils.http import parse_etags, url_has_allowed_host_and_scheme
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.utils.decorators import method_decorator
 from django.views.generic import TemplateView
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
-from django.http import HttpResponse
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
 import stripe
 from datetime import timedelta
 from django.conf import settings
 from django.http import JsonResponse
 from django.http import HttpResponse
 from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from asgiref.sync import sync_to_async
 from django.db import transaction
 from drf_spectacular.utils import extend_schema, inline_serializer, extend_schema_view
 from rest_framework import serializers as rf_serializers
@@ -34,7 +37,7 @@ from rest_framework import serializers as rf_serializers
 from .models import (
     User, Customer, Vehicle, VehicleCategory, InsuranceCoverage,
     InsurancePolicy, Claim, ClaimDocument, ClaimApproval, ContactInquiry,
-    DashboardStats, Payment, Notification, Quotation, TwoFactorCode
+    DashboardStats, Payment, Notification, Quotation, TwoFactorCode, ExportJob
 )
 from .serializers import (
     UserSerializer,
@@ -46,8 +49,14 @@ from .serializers import (
     NotificationSerializer,
     QuotationSerializer,
     ClaimDocumentSerializer,
+    ExportJobSerializer,
 )
 from .utils import send_otp
+from .authentication import CachedJWTAuthentication
+from .projection import RelationPlannerMixin, SparseFieldsetViewMixin
+from .pagination import KeysetPagination, keyset_values, page_size_for, paging_requested, stream_json
+from rest_framework.utils.urls import replace_query_param
+from . import analytics, document_packs, documents, events, export_jobs, exports, notifications, omnibox, plates, quoting, rating, rollups, search_index, simulation
 from .permissions import IsOwnerOrReadOnly, IsStaffOrReadOnly, CustomerDataAccessPermission, IsCustomerOwnerOnly, CanProcessClaims, CanApproveClaims, IsManager, IsUnderwriter
 from django.contrib.auth import get_user_model
 from django.contrib.auth.tokens import PasswordResetTokenGenerator
@@ -99,24 +108,17 @@ class DashboardOverviewView(generics.GenericAPIView):
             })
     
     def get_staff_dashboard(self):
-        # Chart data for the dashboard
+        # Chart data for the dashboard, read from the daily rollup table
         current_year = timezone.now().year
-        chart_data = []
-        
-        for year in range(current_year - 4, current_year + 1):
-            year_data = DashboardStats.objects.filter(year=year).first()
-            if year_data:
-                chart_data.append({
-                    'year': year,
-                    'value': year_data.claims_count,
-                    'label': str(year)
-                })
-            else:
-                chart_data.append({
-                    'year': year,
-                    'value': 0,
-                    'label': str(year)
-                })
+        yearly = rollups.yearly(current_year - 4, current_year)
+        chart_data = [
+            {
+                'year': year,
+                'value': (yearly.get(year) or {}).get('claims_count') or 0,
+                'label': str(year)
+            }
+            for year in range(current_year - 4, current_year + 1)
+        ]
         
         # Recent claims for approval
         recent_claims = Claim.objects.filter(
@@ -143,29 +145,25 @@ class DashboardOverviewView(generics.GenericAPIView):
 
 # Customer Views
 @extend_schema_view(list=extend_schema(tags=['customers']), retrieve=extend_schema(tags=['customers']), create=extend_schema(tags=['customers']), update=extend_schema(tags=['customers']), partial_update=extend_schema(tags=['customers']), destroy=extend_schema(tags=['customers']))
-class CustomerViewSet(viewsets.ModelViewSet):
+class CustomerViewSet(SparseFieldsetViewMixin, RelationPlannerMixin, viewsets.ModelViewSet):
     queryset = Customer.objects.all()
     serializer_class = CustomerSerializer
     permission_classes = [IsAuthenticated, CustomerDataAccessPermission]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    filter_backends = [DjangoFilterBackend, search_index.IndexedSearchFilter]
     search_fields = ['user__first_name', 'user__last_name', 'customer_id', 'user__email']
+    search_index_kind = 'customer'
     filterset_fields = ['town', 'date_registered']
     
     def get_queryset(self):
-        user = self.request.user
-        if user.user_type == 'customer':
-            try:
-                return Customer.objects.filter(id=user.customer_profile.id)
-            except AttributeError:
-                return Customer.objects.none()
-        return super().get_queryset()
+        return super().get_queryset().for_principal(self.request.user)
 
-class CustomerListView(generics.ListAPIView):
+class CustomerListView(RelationPlannerMixin, generics.ListAPIView):
     queryset = Customer.objects.all()
     serializer_class = CustomerSerializer
     permission_classes = [IsAuthenticated]
-    filter_backends = [filters.SearchFilter, DjangoFilterBackend]
+    filter_backends = [search_index.IndexedSearchFilter, DjangoFilterBackend]
     search_fields = ['user__first_name', 'user__last_name', 'customer_id']
+    search_index_kind = 'customer'
 
 # Vehicle Views
 @extend_schema_view(list=extend_schema(tags=['vehicle-categories']), retrieve=extend_schema(tags=['vehicle-categories']))
@@ -175,7 +173,7 @@ class VehicleCategoryViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [AllowAny]
 
 @extend_schema_view(list=extend_schema(tags=['vehicles']), retrieve=extend_schema(tags=['vehicles']), create=extend_schema(tags=['vehicles']), update=extend_schema(tags=['vehicles']), partial_update=extend_schema(tags=['vehicles']), destroy=extend_schema(tags=['vehicles']))
-class VehicleViewSet(viewsets.ModelViewSet):
+class VehicleViewSet(SparseFieldsetViewMixin, RelationPlannerMixin, viewsets.ModelViewSet):
     queryset = Vehicle.objects.all()
     serializer_class = VehicleSerializer
     permission_classes = [IsAuthenticated, CustomerDataAccessPermission]
@@ -183,13 +181,7 @@ class VehicleViewSet(viewsets.ModelViewSet):
     filterset_fields = ['category', 'customer']
 
     def get_queryset(self):
-        user = self.request.user
-        if user.user_type == 'customer':
-            try:
-                return Vehicle.objects.filter(customer=user.customer_profile)
-            except Exception:
-                return Vehicle.objects.none()
-        return super().get_queryset()
+        return super().get_queryset().for_principal(self.request.user)
 
     def perform_create(self, serializer):
         user = self.request.user
@@ -223,21 +215,16 @@ class InsuranceCoverageViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [AllowAny]
 
 @extend_schema_view(list=extend_schema(tags=['policies']), retrieve=extend_schema(tags=['policies']), create=extend_schema(tags=['policies']), update=extend_schema(tags=['policies']), partial_update=extend_schema(tags=['policies']), destroy=extend_schema(tags=['policies']))
-class InsurancePolicyViewSet(viewsets.ModelViewSet):
+class InsurancePolicyViewSet(SparseFieldsetViewMixin, RelationPlannerMixin, viewsets.ModelViewSet):
     queryset = InsurancePolicy.objects.all()
     serializer_class = InsurancePolicySerializer
+    pagination_class = KeysetPagination
     permission_classes = [IsAuthenticated, CustomerDataAccessPermission]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['status', 'customer', 'coverage']
 
     def get_queryset(self):
-        user = self.request.user
-        if user.user_type == 'customer':
-            try:
-                return InsurancePolicy.objects.filter(customer=user.customer_profile)
-            except:
-                return InsurancePolicy.objects.none()
-        return super().get_queryset()
+        return super().get_queryset().for_principal(self.request.user)
 
     def perform_create(self, serializer):
         user = self.request.user
@@ -255,18 +242,13 @@ class InsurancePolicyViewSet(viewsets.ModelViewSet):
             policy = serializer.save()
 
         # Notify all underwriters of new application
-        underwriters = User.objects.filter(user_type='underwriter')
-        notifs = [
-            Notification(
-                recipient=u,
-                title='New policy application',
-                message=f'Policy application {policy.policy_number} pending review.',
-                type='status_update',
-                payload={'policy_id': policy.id, 'policy_number': policy.policy_number, 'status': policy.status}
-            ) for u in underwriters
-        ]
-        if notifs:
-            Notification.objects.bulk_create(notifs)
+        notifications.broadcast(
+            'underwriters',
+            title='New policy application',
+            message=f'Policy application {policy.policy_number} pending review.',
+            type='status_update',
+            payload={'policy_id': policy.id, 'policy_number': policy.policy_number, 'status': policy.status}
+        )
 
     def perform_update(self, serializer):
         user = self.request.user
@@ -347,8 +329,9 @@ class InsurancePolicyViewSet(viewsets.ModelViewSet):
         Compute a subscription (quotation) from policy data using underwriting guideline
         and generate/send a quotation to the customer.
 
-        Guideline (example for comprehensive):
-        - Base premium: rate% of vehicle market value (default 6%)
+        Rates come from the active table in ``rating.RATE_TABLES``
+        (comprehensive example):
+        - Base premium: 6% of vehicle market value x vehicle category loading
         - Stamp duty: 5% of base
         - Motor levy: 2.25% of base
         - Annual premium = base + stamp + levy
@@ -368,40 +351,26 @@ class InsurancePolicyViewSet(viewsets.ModelViewSet):
         if not policy_vehicle or not policy_coverage:
             return Response({'error': 'Policy must have vehicle and coverage set.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        from decimal import Decimal, ROUND_HALF_UP
-        market_value = policy_vehicle.market_value or Decimal('0')
-        coverage_type = policy_coverage.name  # 'comprehensive' | 'third_party'
-
-        # Default guideline rates (can be moved to settings)
-        BASE_RATE = Decimal('0.06') if coverage_type == 'comprehensive' else Decimal('0.03')
-        STAMP_DUTY_RATE = Decimal('0.05')
-        MOTOR_LEVY_RATE = Decimal('0.0225') if coverage_type == 'comprehensive' else Decimal('0.015')
-
-        base = (market_value * BASE_RATE).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-        stamp = (base * STAMP_DUTY_RATE).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-        levy = (base * MOTOR_LEVY_RATE).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-        annual_premium = (base + stamp + levy).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-        # Optional informational: termly = annual/3
-        termly_premium = (annual_premium / Decimal('3')).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        q = rating.quote(policy_vehicle.market_value, policy_coverage.name, policy_vehicle.category.name)
+        market_value = q['market_value']
+        annual_premium = q['annual_premium']
+        termly_premium = q['termly_premium']
 
         # If preview mode, DO NOT persist or notify
         preview = str(request.query_params.get('preview') or request.data.get('preview') or '').lower() in ['1', 'true', 'yes']
         if preview:
-            default_terms = (
-                'This quotation is based on underwriting guideline rates. Cover is activated upon payment. '
-                f'Base: {BASE_RATE*100}% of sum insured; Stamp duty: {STAMP_DUTY_RATE*100}%; Motor levy: {MOTOR_LEVY_RATE*100}%. '
-                f'Annual premium: USD {annual_premium}; Termly premium: USD {termly_premium}.'
-            )
             return Response({
                 'preview': True,
                 'annual_premium': str(annual_premium),
                 'termly_premium': str(termly_premium),
                 'coverage_amount': str(market_value),
                 'currency': 'USD',
-                'terms': default_terms,
-                'base_rate': str(BASE_RATE),
-                'stamp_duty_rate': str(STAMP_DUTY_RATE),
-                'motor_levy_rate': str(MOTOR_LEVY_RATE),
+                'terms': quoting.quote_terms(q),
+                'base_rate': str(q['base_rate']),
+                'category_loading': str(q['category_loading']),
+                'stamp_duty_rate': str(q['stamp_duty_rate']),
+                'motor_levy_rate': str(q['motor_levy_rate']),
+                'rate_version': q['version'],
             })
 
         # Persist premium/coverage on policy for visibility
@@ -410,17 +379,9 @@ class InsurancePolicyViewSet(viewsets.ModelViewSet):
         policy.save(update_fields=['premium_amount', 'coverage_amount'])
 
         # Create quotation record
-        default_terms = (
-            'This quotation is based on underwriting guideline rates. Cover is activated upon payment. '
-            f'Base: {BASE_RATE*100}% of sum insured; Stamp duty: {STAMP_DUTY_RATE*100}%; Motor levy: {MOTOR_LEVY_RATE*100}%. '
-            f'Annual premium: USD {annual_premium}; Termly premium: USD {termly_premium}.'
-        )
-        bank_details = {
-            'bank': 'CBZ',
-            'account_number': '020224850175100',
-            'branch': 'Chivhu',
-        }
-        payment_url = f"/payments/checkout?policy={policy.id}"
+        default_terms = quoting.quote_terms(q)
+        bank_details = quoting.BANK_DETAILS
+        payment_url = quoting.payment_url(policy.id)
 
         quote = Quotation.objects.create(
             policy=policy,
@@ -461,6 +422,63 @@ class InsurancePolicyViewSet(viewsets.ModelViewSet):
             'quote_id': quote.quote_id,
         })
 
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
+    def bulk_auto_quote(self, request):
+        """
+        Auto-quote many pending policies in one call.
+
+        Selects pending policies by ``ids`` (body) or by the list filters
+        (``?status=&customer=&coverage=``), rates them in one vectorized pass
+        and bulk-creates their quotations and customer notifications.
+        Policies that already have an open quotation are counted as skipped.
+        ``preview=true`` returns the summary without writing anything.
+        """
+        if request.user.user_type not in ['underwriter', 'manager']:
+            return Response({'error': 'Only underwriters or managers can auto-quote policies.'}, status=status.HTTP_403_FORBIDDEN)
+        queryset = self.filter_queryset(self.get_queryset())
+        ids = request.data.get('ids')
+        if ids is not None:
+            if not isinstance(ids, list) or not all(type(i) is int for i in ids):
+                return Response({'error': 'ids must be a list of policy ids'}, status=status.HTTP_400_BAD_REQUEST)
+            queryset = queryset.filter(pk__in=ids)
+        preview = str(request.query_params.get('preview') or request.data.get('preview') or '').lower() in ['1', 'true', 'yes']
+        summary = quoting.bulk_auto_quote(queryset, request.user, preview=preview)
+        if ids is not None:
+            summary['not_pending'] = len(set(ids)) - summary['matched']
+        return Response(summary)
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
+    def quote_pack(self, request):
+        """
+        Queue a ZIP of the quotation documents of many policies.
+
+        Body: ``{"ids": [...], "format": "pdf" | "xlsx"}``. The pack is built
+        by the export worker as an export job: poll ``/api/export-jobs/<id>/``
+        and fetch its ``download`` action once it is completed. Documents that
+        fail to render appear in the archive as ``.error.txt`` entries.
+        """
+        ids = request.data.get('ids')
+        if not isinstance(ids, list) or not ids or not all(type(i) is int for i in ids):
+            return Response({'error': 'ids must be a non-empty list of policy ids'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > document_packs.MAX_POLICIES:
+            return Response({'error': f'At most {document_packs.MAX_POLICIES} policies per pack'}, status=status.HTTP_400_BAD_REQUEST)
+        fmt = str(request.data.get('format') or 'pdf').lower()
+        if fmt not in documents.RENDERERS:
+            return Response({'error': 'Unsupported format. Use pdf or xlsx.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            documents.check_renderer(fmt)
+        except documents.RendererMissing as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_501_NOT_IMPLEMENTED)
+
+        # Scope the ids to what this user may see now; the worker renders exactly these.
+        policy_ids = list(self.get_queryset().filter(pk__in=ids).order_by('pk').values_list('pk', flat=True))
+        if not policy_ids:
+            return Response({'error': 'No matching policies found.'}, status=status.HTTP_404_NOT_FOUND)
+        job = document_packs.create_job(request.user, policy_ids, fmt)
+        data = ExportJobSerializer(job, context={'request': request}).data
+        data['missing'] = len(set(ids)) - len(policy_ids)
+        return Response(data, status=status.HTTP_202_ACCEPTED)
+
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def message(self, request, pk=None):
         """Allow an underwriter/manager to manually send a message to the policy owner."""
@@ -480,153 +498,45 @@ class InsurancePolicyViewSet(viewsets.ModelViewSet):
         )
         return Response({'message': 'Message sent to customer.'})
 
-    @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated])
+    @action(
+        detail=True, methods=['get'], permission_classes=[IsAuthenticated],
+        renderer_classes=list(api_settings.DEFAULT_RENDERER_CLASSES) + exports.DOCUMENT_RENDERERS,
+    )
     def export_quote(self, request, pk=None):
         """
-        Export a quotation as PDF or Excel. Works for preview or persisted quotes.
+        Export a quotation as PDF or Excel, rated at the current guideline rates.
         Query params:
           - format: 'pdf' | 'xlsx'
-          - preview: true|false (if true, compute current preview without persisting)
         """
         policy = self.get_object()
         fmt = (request.query_params.get('format') or 'pdf').lower()
-        preview = str(request.query_params.get('preview') or 'false').lower() in ['1', 'true', 'yes']
 
-        # Compute values
-        from decimal import Decimal, ROUND_HALF_UP
-        policy_vehicle = getattr(policy, 'vehicle', None)
-        policy_coverage = getattr(policy, 'coverage', None)
-        if not policy_vehicle or not policy_coverage:
+        if fmt == 'xls':
+            fmt = 'xlsx'
+        if fmt not in documents.RENDERERS:
+            return Response({'error': 'Unsupported format. Use pdf or xlsx.'}, status=status.HTTP_400_BAD_REQUEST)
+        if not getattr(policy, 'vehicle', None) or not getattr(policy, 'coverage', None):
             return Response({'error': 'Policy must have vehicle and coverage set.'}, status=status.HTTP_400_BAD_REQUEST)
-        market_value = policy_vehicle.market_value or Decimal('0')
-        coverage_type = policy_coverage.name
-        BASE_RATE = Decimal('0.06') if coverage_type == 'comprehensive' else Decimal('0.03')
-        STAMP_DUTY_RATE = Decimal('0.05')
-        MOTOR_LEVY_RATE = Decimal('0.0225') if coverage_type == 'comprehensive' else Decimal('0.015')
-        base = (market_value * BASE_RATE).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-        stamp = (base * STAMP_DUTY_RATE).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-        levy = (base * MOTOR_LEVY_RATE).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-        annual_premium = (base + stamp + levy).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-        termly_premium = (annual_premium / Decimal('3')).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-
-        title = 'Motor Comprehensive I-USD Quotation' if coverage_type == 'comprehensive' else 'Third Party Quotation'
-        insured_name = policy.customer.user.get_full_name() or policy.customer.user.username
-        vehicle_label = f"{policy_vehicle.make} {policy_vehicle.model}"
-        reg_no = getattr(policy_vehicle, 'registration_number', '') or getattr(policy_vehicle, 'reg_no', '') or ''
-        year = getattr(policy_vehicle, 'year', '') or ''
-
-        if fmt == 'pdf':
-            try:
-                from reportlab.lib.pagesizes import A4
-                from reportlab.pdfgen import canvas
-                from reportlab.lib.units import mm
-                from reportlab.lib import colors
-            except Exception:
-                return Response({'error': "PDF export requires 'reportlab'"}, status=status.HTTP_501_NOT_IMPLEMENTED)
-            buffer = BytesIO()
-            c = canvas.Canvas(buffer, pagesize=A4)
-            width, height = A4
-            y = height - 30*mm
-            # Header
-            c.setFont('Helvetica-Bold', 16)
-            c.drawString(20*mm, y, 'QUOTATION')
-            y -= 8*mm
-            c.setFont('Helvetica', 10)
-            c.drawString(20*mm, y, f"Name of Insured: {insured_name or 'TBA'}")
-            y -= 6*mm
-            c.drawString(20*mm, y, f"Business Description: {title}")
-            y -= 10*mm
-            # Vehicle table (simple)
-            c.setFont('Helvetica-Bold', 11)
-            c.drawString(20*mm, y, 'Motor Vehicles')
-            y -= 6*mm
-            c.setFont('Helvetica', 10)
-            c.drawString(22*mm, y, f"Make and model: {vehicle_label}   Year: {year}   Reg No: {reg_no}   Value: USD {market_value}")
-            y -= 10*mm
-            # Premium breakdown
-            c.setFont('Helvetica-Bold', 11)
-            c.drawString(20*mm, y, 'Premium Breakdown')
-            y -= 6*mm
-            c.setFont('Helvetica', 10)
-            c.drawString(22*mm, y, f"Base Premium ({(BASE_RATE*100)}%): USD {base}")
-            y -= 5*mm
-            c.drawString(22*mm, y, f"Stamp Duty (5% of base): USD {stamp}")
-            y -= 5*mm
-            c.drawString(22*mm, y, f"Motor Levy ({(MOTOR_LEVY_RATE*100)}% of base): USD {levy}")
-            y -= 6*mm
-            c.setFont('Helvetica-Bold', 11)
-            c.drawString(22*mm, y, f"TOTAL Annual Premium: USD {annual_premium}")
-            y -= 5*mm
-            c.setFont('Helvetica', 10)
-            c.drawString(22*mm, y, f"Termly Premium (1/3): USD {termly_premium}")
-            y -= 12*mm
-            # Limits and excesses (static text per template)
-            c.setFont('Helvetica-Bold', 11)
-            c.drawString(20*mm, y, 'Own Damage Limits (summary)')
-            y -= 6*mm
-            c.setFont('Helvetica', 9)
-            c.drawString(22*mm, y, 'Medical Expenses: USD 500.00   Towing: Reasonable to nearest garage   Emergency: USD 200.00')
-            y -= 12*mm
-            c.setFont('Helvetica', 8)
-            c.setFillColor(colors.grey)
-            c.drawString(20*mm, y, 'This document is a system-generated quotation preview. Cover is activated upon payment.')
-            c.setFillColor(colors.black)
-            c.showPage()
-            c.save()
-            buffer.seek(0)
-            resp = HttpResponse(buffer.read(), content_type='application/pdf')
-            filename = f"quotation_{policy.policy_number or policy.id}.pdf"
-            resp['Content-Disposition'] = f"attachment; filename=\"{filename}\""
-            return resp
-        elif fmt in ['xlsx', 'xls']:
-            try:
-                from openpyxl import Workbook
-                from openpyxl.utils import get_column_letter
-            except Exception:
-                return Response({'error': "Excel export requires 'openpyxl'"}, status=status.HTTP_501_NOT_IMPLEMENTED)
-            wb = Workbook()
-            ws = wb.active
-            ws.title = 'Quotation'
-            rows = [
-                ['QUOTATION'],
-                ['Name of Insured', insured_name or 'TBA'],
-                ['Business Description', title],
-                [],
-                ['Motor Vehicles'],
-                ['Make and model', vehicle_label, 'Year', year, 'Reg No', reg_no, 'Value (USD)', float(market_value)],
-                [],
-                ['Premium Breakdown'],
-                ['Base Premium', float(base)],
-                ['Stamp Duty', float(stamp)],
-                ['Motor Levy', float(levy)],
-                ['TOTAL Annual Premium', float(annual_premium)],
-                ['Termly Premium', float(termly_premium)],
-            ]
-            for r in rows:
-                ws.append(r)
-            # Autosize
-            for col in ws.columns:
-                max_length = 12
-                col_letter = get_column_letter(col[0].column)
-                for cell in col:
-                    try:
-                        max_length = max(max_length, len(str(cell.value)))
-                    except Exception:
-                        pass
-                ws.column_dimensions[col_letter].width = max_length + 2
-            stream = BytesIO()
-            wb.save(stream)
-            stream.seek(0)
-            resp = HttpResponse(stream.read(), content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-            filename = f"quotation_{policy.policy_number or policy.id}.xlsx"
-            resp['Content-Disposition'] = f"attachment; filename=\"{filename}\""
-            return resp
+
+        # Rendered documents are cached by a hash of everything they show.
+        context = documents.quote_context(policy)
+        etag = f'"{documents.cache_key(context, fmt)}"'
+        if_none_match = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+        if etag in if_none_match or '*' in if_none_match:
+            resp = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
         else:
-            return Response({'error': 'Unsupported format. Use pdf or xlsx.'}, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                _, fileobj = documents.open_document(context, fmt)
+            except documents.RendererMissing as exc:
+                return Response({'error': str(exc)}, status=status.HTTP_501_NOT_IMPLEMENTED)
+            resp = FileResponse(fileobj, content_type=documents.CONTENT_TYPES[fmt], as_attachment=True, filename=documents.filename(context, fmt))
+        resp['ETag'] = etag
+        resp['Cache-Control'] = 'private, no-cache'
+        return resp
 
 
 @extend_schema_view(list=extend_schema(tags=['quotations']), retrieve=extend_schema(tags=['quotations']), create=extend_schema(tags=['quotations']))
-class QuotationViewSet(viewsets.ModelViewSet):
+class QuotationViewSet(SparseFieldsetViewMixin, RelationPlannerMixin, viewsets.ModelViewSet):
     queryset = Quotation.objects.all()
     serializer_class = QuotationSerializer
     permission_classes = [IsAuthenticated, CustomerDataAccessPermission]
@@ -635,13 +545,7 @@ class QuotationViewSet(viewsets.ModelViewSet):
     ordering = ['-created_at']
 
     def get_queryset(self):
-        user = self.request.user
-        if user.user_type == 'customer':
-            try:
-                return Quotation.objects.filter(policy__customer=user.customer_profile)
-            except Exception:
-                return Quotation.objects.none()
-        return super().get_queryset()
+        return super().get_queryset().for_principal(self.request.user)
 
     def perform_create(self, serializer):
         user = self.request.user
@@ -685,14 +589,13 @@ class QuotationViewSet(viewsets.ModelViewSet):
         quote.decided_by = user
         quote.save(update_fields=['status', 'customer_decision_at', 'decided_by'])
         # Notify underwriters
-        for uw in User.objects.filter(user_type='underwriter'):
-            Notification.objects.create(
-                recipient=uw,
-                title='Quotation accepted',
-                message=f'{user.get_full_name() or user.username} accepted quote {quote.quote_id} for {quote.policy.policy_number}',
-                type='status_update',
-                payload={'quote_id': quote.quote_id, 'policy_id': quote.policy_id, 'status': 'accepted'}
-            )
+        notifications.broadcast(
+            'underwriters',
+            title='Quotation accepted',
+            message=f'{user.get_full_name() or user.username} accepted quote {quote.quote_id} for {quote.policy.policy_number}',
+            type='status_update',
+            payload={'quote_id': quote.quote_id, 'policy_id': quote.policy_id, 'status': 'accepted'}
+        )
         return Response({'message': 'Quotation accepted. Proceed to payment.', 'payment_url': quote.payment_url})
 
     @action(detail=True, methods=['post'])
@@ -708,14 +611,13 @@ class QuotationViewSet(viewsets.ModelViewSet):
         quote.decided_by = user
         quote.save(update_fields=['status', 'customer_decision_at', 'decided_by'])
         # Notify underwriters
-        for uw in User.objects.filter(user_type='underwriter'):
-            Notification.objects.create(
-                recipient=uw,
-                title='Quotation declined',
-                message=f'{user.get_full_name() or user.username} declined quote {quote.quote_id} for {quote.policy.policy_number}',
-                type='status_update',
-                payload={'quote_id': quote.quote_id, 'policy_id': quote.policy_id, 'status': 'declined'}
-            )
+        notifications.broadcast(
+            'underwriters',
+            title='Quotation declined',
+            message=f'{user.get_full_name() or user.username} declined quote {quote.quote_id} for {quote.policy.policy_number}',
+            type='status_update',
+            payload={'quote_id': quote.quote_id, 'policy_id': quote.policy_id, 'status': 'declined'}
+        )
         return Response({'message': 'Quotation declined.'})
 
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
@@ -758,21 +660,17 @@ class QuotationViewSet(viewsets.ModelViewSet):
 
 # Payment Views
 @extend_schema_view(list=extend_schema(tags=['payments']), retrieve=extend_schema(tags=['payments']), create=extend_schema(tags=['payments']), update=extend_schema(tags=['payments']), partial_update=extend_schema(tags=['payments']), destroy=extend_schema(tags=['payments']))
-class PaymentViewSet(viewsets.ModelViewSet):
+class PaymentViewSet(SparseFieldsetViewMixin, RelationPlannerMixin, viewsets.ModelViewSet):
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
+    pagination_class = KeysetPagination
+    cursor_field = 'payment_date'
     permission_classes = [IsAuthenticated, CustomerDataAccessPermission]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['status', 'payment_method', 'policy__customer']
 
     def get_queryset(self):
-        user = self.request.user
-        if user.user_type == 'customer':
-            try:
-                return Payment.objects.filter(policy__customer=user.customer_profile)
-            except:
-                return Payment.objects.none()
-        return super().get_queryset()
+        return super().get_queryset().for_principal(self.request.user)
 
 # Stripe Payment Views
 @api_view(['POST'])
@@ -884,6 +782,14 @@ def confirm_payment(request):
     except Exception as e:
         return Response({'error': 'An unexpected error occurred'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+_PAYMENT_LIST_FIELDS = (
+    'id', 'payment_id', 'policy_id', 'policy__policy_number', 'amount', 'payment_method', 'status',
+    'transaction_reference', 'payment_proof', 'payment_date', 'verified_at', 'verified_by_id',
+    'policy__customer__user__first_name', 'policy__customer__user__last_name',
+    'policy__customer__user__username', 'policy__customer__user__email',
+    'verified_by__first_name', 'verified_by__last_name',
+)
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_payments(request):
@@ -893,38 +799,55 @@ def get_payments(request):
         if request.user.user_type not in ['underwriter', 'manager']:
             return Response({'error': 'Access denied'}, status=status.HTTP_403_FORBIDDEN)
         
-        payments = Payment.objects.select_related('policy__customer__user', 'verified_by').all()
-        
+        payments = Payment.objects.all()
+
         # Apply filters
         status_filter = request.GET.get('status')
         if status_filter:
             payments = payments.filter(status=status_filter)
-        
+
         payment_method_filter = request.GET.get('payment_method')
         if payment_method_filter:
             payments = payments.filter(payment_method=payment_method_filter)
-        
-        # Serialize payments
-        payments_data = []
-        for payment in payments:
-            payments_data.append({
-                'id': payment.id,
-                'payment_id': payment.payment_id,
-                'policy_id': payment.policy.id,
-                'policy_number': payment.policy.policy_number,
-                'customer_name': payment.policy.customer.user.get_full_name() or payment.policy.customer.user.username,
-                'customer_email': payment.policy.customer.user.email,
-                'amount': str(payment.amount),
-                'payment_method': payment.payment_method,
-                'status': payment.status,
-                'transaction_reference': payment.transaction_reference,
-                'payment_proof': payment.payment_proof.url if payment.payment_proof else None,
-                'payment_date': payment.payment_date.isoformat(),
-                'verified_by': payment.verified_by.get_full_name() if payment.verified_by else None,
-                'verified_at': payment.verified_at.isoformat() if payment.verified_at else None,
-            })
-        
-        return Response(payments_data)
+
+        # Newest first. With ?cursor/?page_size one bounded page; otherwise every row, streamed.
+        paged = paging_requested(request)
+        rows, next_cursor = keyset_values(
+            payments, _PAYMENT_LIST_FIELDS, 'payment_date', request.GET.get('cursor'),
+            page_size_for(request, default=100, maximum=500) if paged else None,
+        )
+        proof_storage = Payment._meta.get_field('payment_proof').storage
+        payments_data = (
+            {
+                'id': row['id'],
+                'payment_id': row['payment_id'],
+                'policy_id': row['policy_id'],
+                'policy_number': row['policy__policy_number'],
+                'customer_name': f"{row['policy__customer__user__first_name']} {row['policy__customer__user__last_name']}".strip() or row['policy__customer__user__username'],
+                'customer_email': row['policy__customer__user__email'],
+                'amount': str(row['amount']),
+                'payment_method': row['payment_method'],
+                'status': row['status'],
+                'transaction_reference': row['transaction_reference'],
+                'payment_proof': proof_storage.url(row['payment_proof']) if row['payment_proof'] else None,
+                'payment_date': row['payment_date'].isoformat(),
+                'verified_by': f"{row['verified_by__first_name']} {row['verified_by__last_name']}".strip() if row['verified_by_id'] else None,
+                'verified_at': row['verified_at'].isoformat() if row['verified_at'] else None,
+            }
+            for row in rows
+        )
+
+        if not paged:
+            # The original bare array of every payment.
+            return StreamingHttpResponse(stream_json(payments_data), content_type='application/json')
+        next_url = replace_query_param(request.build_absolute_uri(), 'cursor', next_cursor) if next_cursor else None
+        response = StreamingHttpResponse(
+            stream_json(payments_data, key='results', extra={'next_cursor': next_cursor, 'next': next_url}),
+            content_type='application/json',
+        )
+        if next_url:
+            response['Link'] = f'<{next_url}>; rel="next"'
+        return response
         
     except Exception as e:
         return Response({'error': 'An unexpected error occurred'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -1060,9 +983,10 @@ class ContactInquiryViewSet(viewsets.ModelViewSet):
 
 # Claims Views
 @extend_schema_view(list=extend_schema(tags=['claims']), retrieve=extend_schema(tags=['claims']), create=extend_schema(tags=['claims']), update=extend_schema(tags=['claims']), partial_update=extend_schema(tags=['claims']), destroy=extend_schema(tags=['claims']))
-class ClaimViewSet(viewsets.ModelViewSet):
+class ClaimViewSet(SparseFieldsetViewMixin, RelationPlannerMixin, viewsets.ModelViewSet):
     queryset = Claim.objects.all()
     serializer_class = ClaimSerializer
+    pagination_class = KeysetPagination
     permission_classes = [IsAuthenticated, CustomerDataAccessPermission]
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['status', 'approval_status', 'policy__customer']
@@ -1070,13 +994,7 @@ class ClaimViewSet(viewsets.ModelViewSet):
     ordering = ['-created_at']
 
     def get_queryset(self):
-        user = self.request.user
-        if user.user_type == 'customer':
-            try:
-                return Claim.objects.filter(policy__customer=user.customer_profile).select_related('policy__vehicle', 'policy__customer')
-            except:
-                return Claim.objects.none()
-        return super().get_queryset().select_related('policy__vehicle', 'policy__customer')
+        return super().get_queryset().for_principal(self.request.user)
 
     def perform_create(self, serializer):
         user = self.request.user
@@ -1093,18 +1011,13 @@ class ClaimViewSet(viewsets.ModelViewSet):
         claim = serializer.save(status='submitted', approval_status='pending')
 
         # Notify all underwriters of new claim submission
-        underwriters = User.objects.filter(user_type='underwriter')
-        notifs = [
-            Notification(
-                recipient=u,
-                title='New claim submitted',
-                message=f'Claim {claim.claim_id} requires review.',
-                type='status_update',
-                payload={'claim_id': claim.id, 'claim_ref': claim.claim_id, 'policy_number': claim.policy.policy_number}
-            ) for u in underwriters
-        ]
-        if notifs:
-            Notification.objects.bulk_create(notifs)
+        notifications.broadcast(
+            'underwriters',
+            title='New claim submitted',
+            message=f'Claim {claim.claim_id} requires review.',
+            type='status_update',
+            payload={'claim_id': claim.id, 'claim_ref': claim.claim_id, 'policy_number': claim.policy.policy_number}
+        )
 
     @action(detail=True, methods=['post'])
     def process_claim(self, request, pk=None):
@@ -1266,14 +1179,7 @@ class ClaimDocumentViewSet(viewsets.ModelViewSet):
     http_method_names = ['get', 'post', 'delete']
 
     def get_queryset(self):
-        user = self.request.user
-        if user.user_type == 'customer':
-            try:
-                customer = user.customer_profile
-            except Exception:
-                return ClaimDocument.objects.none()
-            return ClaimDocument.objects.filter(claim__policy__customer=customer)
-        return super().get_queryset()
+        return super().get_queryset().for_principal(self.request.user)
 
     def perform_create(self, serializer):
         claim = serializer.validated_data.get('claim')
@@ -1294,7 +1200,6 @@ class ClaimDocumentViewSet(viewsets.ModelViewSet):
                 ClaimDocument.objects.filter(claim=claim).values_list('document_type', flat=True)
             )
             if required_types.issubset(existing_types):
-                underwriters = User.objects.filter(user_type='underwriter')
                 # Build absolute URLs for documents
                 docs = []
                 for d in ClaimDocument.objects.filter(claim=claim).order_by('uploaded_at'):
@@ -1308,67 +1213,117 @@ class ClaimDocumentViewSet(viewsets.ModelViewSet):
                         'url': url,
                         'uploaded_at': d.uploaded_at.isoformat() if hasattr(d.uploaded_at, 'isoformat') else str(d.uploaded_at),
                     })
-                notifs = [
-                    Notification(
-                        recipient=u,
-                        title='Claim documents submitted',
-                        message=f'Claim {claim.claim_id} has all required documents attached and is ready for review.',
-                        type='message',
-                        payload={
-                            'claim_id': claim.id,
-                            'claim_ref': claim.claim_id,
-                            'policy_number': claim.policy.policy_number,
-                            'documents': docs,
-                        }
-                    ) for u in underwriters
-                ]
-                if notifs:
-                    Notification.objects.bulk_create(notifs)
+                notifications.broadcast(
+                    'underwriters',
+                    title='Claim documents submitted',
+                    message=f'Claim {claim.claim_id} has all required documents attached and is ready for review.',
+                    type='message',
+                    payload={
+                        'claim_id': claim.id,
+                        'claim_ref': claim.claim_id,
+                        'policy_number': claim.policy.policy_number,
+                        'documents': docs,
+                    }
+                )
         except Exception:
             # Avoid failing the upload if notification assembly fails
             pass
 
 # Notifications
 @extend_schema_view(list=extend_schema(tags=['notifications']), retrieve=extend_schema(tags=['notifications']), partial_update=extend_schema(tags=['notifications']))
-class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
+class NotificationViewSet(SparseFieldsetViewMixin, RelationPlannerMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = NotificationSerializer
+    pagination_class = KeysetPagination
     permission_classes = [IsAuthenticated]
     filter_backends = [filters.OrderingFilter]
     ordering = ['-created_at']
 
     def get_queryset(self):
-        return Notification.objects.filter(recipient=self.request.user).order_by('-created_at')
+        # Direct notifications plus the user's role topics; only those are reachable via get_object().
+        return notifications.inbox(self.request.user).order_by('-created_at')
 
     @action(detail=True, methods=['post'])
     def read(self, request, pk=None):
         notif = self.get_object()
-        if notif.recipient_id != request.user.id:
-            raise permissions.PermissionDenied('Not your notification.')
-        notif.is_read = True
-        notif.save(update_fields=['is_read'])
+        notifications.mark_read(request.user, [notif.pk])
         return Response({'message': 'Notification marked as read.'})
 
+    @action(detail=False, methods=['post'])
+    def mark_read(self, request):
+        """Mark the notifications listed in ``ids`` as read."""
+        ids = request.data.get('ids')
+        if not isinstance(ids, list) or not ids:
+            return Response({'error': 'ids must be a non-empty list.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            ids = [int(pk) for pk in ids]
+        except (TypeError, ValueError):
+            return Response({'error': 'ids must be notification ids.'}, status=status.HTTP_400_BAD_REQUEST)
+        marked = notifications.mark_read(request.user, ids)
+        return Response({'marked': marked, 'count': notifications.unread_count(request.user)})
+
+    @action(detail=False, methods=['post'])
+    def mark_all_read(self, request):
+        """Mark every notification in the inbox as read."""
+        marked = notifications.mark_all_read(request.user)
+        return Response({'marked': marked, 'count': 0})
+
     @action(detail=False, methods=['get'])
     def unread_count(self, request):
         """Return count of unread notifications for the authenticated user."""
-        count = Notification.objects.filter(recipient=request.user, is_read=False).count()
-        return Response({'count': count})
+        return Response({'count': notifications.unread_count(request.user)})
+
+def _stream_user(request):
+    """The user for an event stream: ``?ticket=`` (EventSource cannot send headers), a Bearer header or the session."""
+    ticket = request.GET.get('ticket')
+    if ticket:
+        user_id = events.redeem_ticket(ticket)
+        return User.objects.filter(pk=user_id, is_active=True).first() if user_id else None
+    jwt_auth = CachedJWTAuthentication()
+    header = jwt_auth.get_header(request)
+    if header is not None:
+        try:
+            return jwt_auth.get_user(jwt_auth.get_validated_token(jwt_auth.get_raw_token(header)))
+        except (InvalidToken, AuthenticationFailed):
+            return None
+    user = request.user
+    return user if user.is_authenticated else None
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def event_ticket(request):
+    """Issue a single-use ticket for opening ``/api/events/?ticket=...``."""
+    if not events.STREAM_ENABLED:
+        return Response({'error': 'Live updates are not enabled; poll instead.'}, status=status.HTTP_404_NOT_FOUND)
+    return Response({'ticket': events.issue_ticket(request.user), 'expires_in': events.TICKET_SECONDS})
+
+
+async def event_stream(request):
+    """Server-sent events: the caller's notifications plus claim/policy status changes (see ``events``)."""
+    if not events.STREAM_ENABLED:
+        return JsonResponse({'error': 'Live updates are not enabled; poll instead.'}, status=404)
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Method not allowed.'}, status=405)
+    user = await sync_to_async(_stream_user)(request)
+    if user is None:
+        return JsonResponse({'error': 'Authentication credentials were not provided.'}, status=401)
+    # Staff roles subscribe to their notification topics, which include 'staff' status changes.
+    channels = [events.user_channel(user.pk)] + [events.topic_channel(topic) for topic in notifications.topics_for(user)]
+    response = StreamingHttpResponse(events.stream(channels), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Keep reverse proxies from buffering the stream.
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 # Simple claims list for dashboards using the main serializer
-class ClaimListView(generics.ListAPIView):
+class ClaimListView(RelationPlannerMixin, generics.ListAPIView):
     serializer_class = ClaimSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['approval_status', 'status', 'policy__customer']
 
     def get_queryset(self):
-        user = self.request.user
-        if user.user_type == 'customer':
-            try:
-                return Claim.objects.filter(policy__customer=user.customer_profile)
-            except:
-                return Claim.objects.none()
-        return Claim.objects.all()
+        return Claim.objects.for_principal(self.request.user)
 
 # Dashboard Stats Management
 @extend_schema_view(list=extend_schema(tags=['dashboard-stats']), retrieve=extend_schema(tags=['dashboard-stats']), create=extend_schema(tags=['dashboard-stats']), update=extend_schema(tags=['dashboard-stats']), partial_update=extend_schema(tags=['dashboard-stats']), destroy=extend_schema(tags=['dashboard-stats']))
@@ -1379,38 +1334,19 @@ class DashboardStatsViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['post'])
     def update_stats(self, request):
-        """Update dashboard statistics for all years"""
+        """Refresh the yearly DashboardStats rows from the daily rollup table"""
         current_year = timezone.now().year
+        yearly = rollups.yearly(current_year - 4, current_year)
         
         for year in range(current_year - 4, current_year + 1):
-            year_start = datetime(year, 1, 1)
-            year_end = datetime(year, 12, 31, 23, 59, 59)
-            
-            # Calculate statistics for the year
-            claims_count = Claim.objects.filter(
-                created_at__range=[year_start, year_end]
-            ).count()
-            
-            policies_count = InsurancePolicy.objects.filter(
-                created_at__range=[year_start, year_end]
-            ).count()
-            
-            customers_count = Customer.objects.filter(
-                date_registered__range=[year_start, year_end]
-            ).count()
-            
-            revenue = InsurancePolicy.objects.filter(
-                created_at__range=[year_start, year_end]
-            ).aggregate(Sum('premium_amount'))['premium_amount__sum'] or 0
-            
-            # Update or create stats
-            stats, created = DashboardStats.objects.update_or_create(
+            year_data = yearly.get(year) or {}
+            DashboardStats.objects.update_or_create(
                 year=year,
                 defaults={
-                    'claims_count': claims_count,
-                    'policies_count': policies_count,
-                    'customers_count': customers_count,
-                    'revenue': revenue,
+                    'claims_count': year_data.get('claims_count') or 0,
+                    'policies_count': year_data.get('policies_count') or 0,
+                    'customers_count': year_data.get('customers_count') or 0,
+                    'revenue': year_data.get('revenue') or 0,
                 }
             )
         
@@ -1435,6 +1371,20 @@ class CustomerProfileView(generics.RetrieveUpdateAPIView):
             return None
 
 # Search Views
+@extend_schema(tags=['search'], summary='Search every record type from one box')
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def omnibox_search(request):
+    """
+    Look up policies, claims, payments, quotations, customers and vehicles by
+    whatever the caller has: a generated ID (or its prefix), a national ID, a
+    plate or a name. Results are ranked and grouped by type; customers only
+    see their own records.
+    """
+    return Response(omnibox.search(
+        request.GET.get('q', ''), request.user, substring=search_index.substring_requested(request),
+    ))
+
 @extend_schema(tags=['search'], summary='Search customers')
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -1443,12 +1393,19 @@ def search_customers(request):
     if len(query) < 2:
         return Response({'results': []})
     
-    customers = Customer.objects.filter(
-        Q(user__first_name__icontains=query) |
-        Q(user__last_name__icontains=query) |
-        Q(customer_id__icontains=query) |
-        Q(user__email__icontains=query)
-    )[:10]
+    ids = search_index.search('customer', query, limit=10)
+    if ids == [] and search_index.substring_requested(request):
+        # Opted in: no prefix match, so try substring lookups.
+        ids = None
+    if ids is not None:
+        customers = search_index.in_rank_order(Customer.objects.filter(pk__in=ids), ids)
+    else:
+        customers = Customer.objects.filter(
+            Q(user__first_name__icontains=query) |
+            Q(user__last_name__icontains=query) |
+            Q(customer_id__icontains=query) |
+            Q(user__email__icontains=query)
+        )[:10]
     
     serializer = CustomerSerializer(customers, many=True)
     return Response({'results': serializer.data})
@@ -1460,12 +1417,29 @@ def search_vehicles(request):
     query = request.GET.get('q', '')
     if len(query) < 2:
         return Response({'results': []})
-    
-    vehicles = Vehicle.objects.filter(
-        Q(vehicle_number__icontains=query) |
-        Q(make__icontains=query) |
-        Q(model__icontains=query)
-    )[:10]
+
+    if str(request.GET.get('fuzzy') or '').lower() in ['1', 'true', 'yes']:
+        # Nearest plates by edit distance, tolerant of O/0, I/1 and spacing errors.
+        matches = plates.index.nearest(query, limit=10)
+        vehicles = {vehicle.pk: vehicle for vehicle in Vehicle.objects.filter(pk__in=[pk for pk, _ in matches])}
+        results = []
+        for pk, distance in matches:
+            if pk in vehicles:
+                results.append({**VehicleSerializer(vehicles[pk]).data, 'match_distance': distance})
+        return Response({'results': results})
+    
+    ids = search_index.search('vehicle', query, limit=10)
+    if ids == [] and search_index.substring_requested(request):
+        # Opted in: no prefix match, so try substring lookups.
+        ids = None
+    if ids is not None:
+        vehicles = search_index.in_rank_order(Vehicle.objects.filter(pk__in=ids), ids)
+    else:
+        vehicles = Vehicle.objects.filter(
+            Q(vehicle_number__icontains=query) |
+            Q(make__icontains=query) |
+            Q(model__icontains=query)
+        )[:10]
     
     serializer = VehicleSerializer(vehicles, many=True)
     return Response({'results': serializer.data})
@@ -1479,72 +1453,17 @@ def analytics_overview(request):
     If the user is a customer, scope metrics to their own policies and claims only.
     """
     user = request.user
-    # Monthly data for current year
     current_year = timezone.now().year
-    monthly_data = []
-
-    # Determine scoping filters
-    customer_filter = {}
-    policy_customer_filter = {}
-    if getattr(user, 'user_type', None) == 'customer':
-        try:
-            customer = user.customer_profile
-            customer_filter = { 'policy__customer': customer }
-            policy_customer_filter = { 'customer': customer }
-        except Exception:
-            # No customer profile; keep filters empty which will yield 0s with explicit guards
-            customer_filter = { 'policy__customer': None }
-            policy_customer_filter = { 'customer': None }
-
-    for month in range(1, 13):
-        month_start = datetime(current_year, month, 1)
-        if month == 12:
-            month_end = datetime(current_year + 1, 1, 1) - timedelta(days=1)
-        else:
-            month_end = datetime(current_year, month + 1, 1) - timedelta(days=1)
-
-        claims_qs = Claim.objects.filter(created_at__range=[month_start, month_end])
-        policies_qs = InsurancePolicy.objects.filter(created_at__range=[month_start, month_end])
-
-        if customer_filter:
-            claims_qs = claims_qs.filter(**customer_filter)
-        if policy_customer_filter:
-            policies_qs = policies_qs.filter(**policy_customer_filter)
-
-        # Calculate revenue for the month
-        monthly_revenue = policies_qs.aggregate(Sum('premium_amount'))['premium_amount__sum'] or 0
-        
-        monthly_data.append({
-            'month': month,
-            'month_name': month_start.strftime('%B'),
-            'claims': claims_qs.count(),
-            'policies': policies_qs.count(),
-            'revenue': float(monthly_revenue),
-        })
+    customer = analytics.customer_scope_for(user)
 
-    # Category distribution (non-sensitive; for customers we can scope to their vehicles)
-    category_data = []
-    categories = VehicleCategory.objects.all()
-    for category in categories:
-        vehicle_qs = Vehicle.objects.filter(category=category)
-        if policy_customer_filter:
-            vehicle_qs = vehicle_qs.filter(customer=policy_customer_filter.get('customer'))
-        count = vehicle_qs.count()
-        category_data.append({
-            'category': category.get_name_display(),
-            'count': count
-        })
+    monthly_data = analytics.monthly_series(current_year, customer=customer)
+    # Category distribution (non-sensitive; for customers we scope to their vehicles)
+    category_data = analytics.category_distribution(customer=customer)
 
     # Claims by status (for underwriters only)
     claims_by_status = []
     if user.user_type in ['underwriter', 'manager']:
-        from django.db.models import Count
-        claims_status_data = Claim.objects.values('approval_status').annotate(count=Count('id'))
-        for item in claims_status_data:
-            claims_by_status.append({
-                'status': item['approval_status'].title(),
-                'count': item['count']
-            })
+        claims_by_status = analytics.claims_by_status()
 
     return Response({
         'monthly_data': monthly_data,
@@ -1568,17 +1487,10 @@ def generate_quote(request):
     if coverage_type not in ['third_party', 'comprehensive']:
         return Response({'error': 'coverage_type must be third_party or comprehensive'}, status=status.HTTP_400_BAD_REQUEST)
 
-    base_rate = Decimal('0.05') if coverage_type == 'third_party' else Decimal('0.08')
-    category_multipliers = {
-        'motorcycles': Decimal('1.2'),
-        'light_motor': Decimal('1.0'),
-        'minibuses': Decimal('1.3'),
-        'buses': Decimal('1.4'),
-        'heavy_vehicles': Decimal('1.6'),
-        'haulage_trucks': Decimal('1.8'),
-    }
-    multiplier = category_multipliers.get(vehicle_category, Decimal('1.0'))
-    estimated_premium = market_value * base_rate * multiplier
+    if not market_value.is_finite() or market_value < 0:
+        return Response({'error': 'market_value must be a non-negative amount'}, status=status.HTTP_400_BAD_REQUEST)
+    q = rating.quote(market_value, coverage_type, vehicle_category)
+    estimated_premium = q['annual_premium']
 
     if coverage_type == 'third_party':
         coverage_amount = min(market_value, Decimal('1000000'))
@@ -1599,12 +1511,36 @@ def generate_quote(request):
 
     data = {
         'estimated_premium': estimated_premium,
+        'base_premium': q['base_premium'],
+        'stamp_duty': q['stamp_duty'],
+        'motor_levy': q['motor_levy'],
+        'termly_premium': q['termly_premium'],
+        'rate_version': q['version'],
         'coverage_amount': coverage_amount,
         'coverage_details': coverage_details,
         'validity_period': 30,
     }
     return Response(data)
 
+@extend_schema(tags=['quotes'], summary='Simulate the revenue impact of candidate rate tables on the active book')
+@api_view(['POST'])
+@permission_classes([IsManager])
+def simulate_rates(request):
+    """
+    Re-rate every active policy under one or more candidate rate tables.
+
+    Body: ``{"scenarios": [{"name": ..., "version": ...} | {"name": ..., "overrides": {...}, "base_version": ...}]}``
+    (a single scenario object is also accepted). Returns premium deltas against
+    the active table, in total and by coverage, vehicle category and town.
+    """
+    scenarios = request.data.get('scenarios')
+    if scenarios is None:
+        scenarios = [request.data]
+    try:
+        return Response(simulation.simulate(scenarios))
+    except ValueError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
 # Report Generation Views
 @extend_schema(tags=['reports'], summary='Generate summary reports')
 @api_view(['POST'])
@@ -1614,20 +1550,20 @@ def generate_report(request):
     start_date = request.data.get('start_date')
     end_date = request.data.get('end_date')
 
-    queryset = Claim.objects.all()
+    filters = {}
     if start_date:
-        queryset = queryset.filter(created_at__date__gte=start_date)
+        filters['date__gte'] = start_date
     if end_date:
-        queryset = queryset.filter(created_at__date__lte=end_date)
+        filters['date__lte'] = end_date
+    totals = rollups.totals(**filters)
 
     data = {
-        'total_claims': queryset.count(),
-        'approved_claims': queryset.filter(approval_status='approve').count(),
-        'rejected_claims': queryset.filter(approval_status='reject').count(),
-        'pending_claims': queryset.filter(approval_status='pending').count(),
-        'total_amount': queryset.aggregate(Sum('estimated_amount'))['estimated_amount__sum'] or 0,
-        'approved_amount': queryset.filter(approval_status='approve').aggregate(
-            Sum('approved_amount'))['approved_amount__sum'] or 0,
+        'total_claims': totals['claims_count'],
+        'approved_claims': totals['claims_approved'],
+        'rejected_claims': totals['claims_rejected'],
+        'pending_claims': totals['claims_pending'],
+        'total_amount': totals['claims_estimated_amount'],
+        'approved_amount': totals['claims_approved_amount'],
     }
 
     return Response({
@@ -1641,357 +1577,79 @@ def generate_report(request):
     })
 
 # Excel Export Views
-@extend_schema(tags=['exports'], summary='Export policies to Excel')
-@api_view(['GET'])
-@permission_classes([IsAuthenticated])
-def export_policies_excel(request):
-    """Export all policies to Excel format"""
+def _openpyxl_missing():
     try:
-        from openpyxl import Workbook
-        from openpyxl.styles import Font, PatternFill, Alignment
-        from openpyxl.utils import get_column_letter
+        import openpyxl  # noqa: F401
     except ImportError:
         return Response({'error': "Excel export requires 'openpyxl'"}, status=status.HTTP_501_NOT_IMPLEMENTED)
-    
-    policies = InsurancePolicy.objects.select_related('customer', 'vehicle', 'coverage').all()
-    
-    wb = Workbook()
-    ws = wb.active
-    ws.title = 'Policies'
-    
-    # Header row
-    headers = ['Policy Number', 'Customer', 'Vehicle Number', 'Make/Model', 'Year', 
-               'Coverage Type', 'Premium Amount', 'Coverage Amount', 'Start Date', 
-               'End Date', 'Status', 'Created At']
-    ws.append(headers)
-    
-    # Style header row
-    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-    header_font = Font(bold=True, color="FFFFFF")
-    for cell in ws[1]:
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal="center", vertical="center")
-    
-    # Data rows
-    for policy in policies:
-        customer_name = f"{policy.customer.user.first_name} {policy.customer.user.last_name}".strip() or policy.customer.user.username
-        vehicle_info = f"{policy.vehicle.make} {policy.vehicle.model}"
-        ws.append([
-            policy.policy_number,
-            customer_name,
-            policy.vehicle.vehicle_number,
-            vehicle_info,
-            policy.vehicle.year,
-            policy.coverage.get_name_display(),
-            float(policy.premium_amount),
-            float(policy.coverage_amount),
-            policy.start_date.strftime('%Y-%m-%d'),
-            policy.end_date.strftime('%Y-%m-%d'),
-            policy.get_status_display(),
-            policy.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-        ])
-    
-    # Auto-size columns
-    for col in ws.columns:
-        max_length = 0
-        col_letter = get_column_letter(col[0].column)
-        for cell in col:
-            try:
-                max_length = max(max_length, len(str(cell.value or '')))
-            except:
-                pass
-        ws.column_dimensions[col_letter].width = min(max_length + 2, 50)
-    
-    stream = BytesIO()
-    wb.save(stream)
-    stream.seek(0)
-    resp = HttpResponse(stream.read(), content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    resp['Content-Disposition'] = 'attachment; filename="policies_export.xlsx"'
-    return resp
+    return None
+
+EXPORT_RENDERERS = list(api_settings.DEFAULT_RENDERER_CLASSES) + exports.RENDERERS
 
-@extend_schema(tags=['exports'], summary='Export payments to Excel')
+def _export_response(request, name):
+    """Stream the registered export ``name``, honouring ``?columns=key1,key2`` and ``?format=xlsx|csv|ndjson``."""
+    fmt = request.query_params.get('format') or 'xlsx'
+    if fmt == 'xlsx':
+        missing = _openpyxl_missing()
+        if missing:
+            return missing
+    try:
+        return exports.EXPORTS[name].response(
+            exports.parse_columns(request.query_params.get('columns')),
+            fmt=fmt,
+            gzip_encode=exports.accepts_gzip(request),
+        )
+    except ValueError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+@extend_schema(tags=['exports'], summary='Export policies to Excel, CSV or NDJSON')
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@renderer_classes(EXPORT_RENDERERS)
+def export_policies_excel(request):
+    """Export all policies as Excel (default), CSV or NDJSON"""
+    return _export_response(request, 'policies')
+
+@extend_schema(tags=['exports'], summary='Export payments to Excel, CSV or NDJSON')
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@renderer_classes(EXPORT_RENDERERS)
 def export_payments_excel(request):
-    """Export all payments to Excel format"""
-    try:
-        from openpyxl import Workbook
-        from openpyxl.styles import Font, PatternFill, Alignment
-        from openpyxl.utils import get_column_letter
-    except ImportError:
-        return Response({'error': "Excel export requires 'openpyxl'"}, status=status.HTTP_501_NOT_IMPLEMENTED)
-    
-    payments = Payment.objects.select_related('policy__customer', 'policy__vehicle', 'verified_by').all()
-    
-    wb = Workbook()
-    ws = wb.active
-    ws.title = 'Payments'
-    
-    headers = ['Payment ID', 'Policy Number', 'Customer', 'Vehicle Number', 
-               'Amount', 'Payment Method', 'Status', 'Transaction Reference', 
-               'Payment Date', 'Due Date', 'Verified By', 'Verified At']
-    ws.append(headers)
-    
-    # Style header
-    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-    header_font = Font(bold=True, color="FFFFFF")
-    for cell in ws[1]:
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal="center", vertical="center")
-    
-    for payment in payments:
-        customer_name = f"{payment.policy.customer.user.first_name} {payment.policy.customer.user.last_name}".strip() or payment.policy.customer.user.username
-        verified_by = f"{payment.verified_by.first_name} {payment.verified_by.last_name}".strip() if payment.verified_by else ''
-        ws.append([
-            payment.payment_id,
-            payment.policy.policy_number,
-            customer_name,
-            payment.policy.vehicle.vehicle_number,
-            float(payment.amount),
-            payment.get_payment_method_display(),
-            payment.get_status_display(),
-            payment.transaction_reference or '',
-            payment.payment_date.strftime('%Y-%m-%d %H:%M:%S'),
-            payment.due_date.strftime('%Y-%m-%d') if payment.due_date else '',
-            verified_by,
-            payment.verified_at.strftime('%Y-%m-%d %H:%M:%S') if payment.verified_at else '',
-        ])
-    
-    # Auto-size columns
-    for col in ws.columns:
-        max_length = 0
-        col_letter = get_column_letter(col[0].column)
-        for cell in col:
-            try:
-                max_length = max(max_length, len(str(cell.value or '')))
-            except:
-                pass
-        ws.column_dimensions[col_letter].width = min(max_length + 2, 50)
-    
-    stream = BytesIO()
-    wb.save(stream)
-    stream.seek(0)
-    resp = HttpResponse(stream.read(), content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    resp['Content-Disposition'] = 'attachment; filename="payments_export.xlsx"'
-    return resp
+    """Export all payments as Excel (default), CSV or NDJSON"""
+    return _export_response(request, 'payments')
 
-@extend_schema(tags=['exports'], summary='Export quotations to Excel')
+@extend_schema(tags=['exports'], summary='Export quotations to Excel, CSV or NDJSON')
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@renderer_classes(EXPORT_RENDERERS)
 def export_quotations_excel(request):
-    """Export all quotations to Excel format"""
-    try:
-        from openpyxl import Workbook
-        from openpyxl.styles import Font, PatternFill, Alignment
-        from openpyxl.utils import get_column_letter
-    except ImportError:
-        return Response({'error': "Excel export requires 'openpyxl'"}, status=status.HTTP_501_NOT_IMPLEMENTED)
-    
-    quotations = Quotation.objects.select_related('policy__customer', 'policy__vehicle', 'created_by', 'decided_by').all()
-    
-    wb = Workbook()
-    ws = wb.active
-    ws.title = 'Quotations'
-    
-    headers = ['Quote ID', 'Policy Number', 'Customer', 'Vehicle Number', 
-               'Premium Amount', 'Coverage Amount', 'Currency', 'Status', 
-               'Created By', 'Created At', 'Decided By', 'Customer Decision At']
-    ws.append(headers)
-    
-    # Style header
-    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-    header_font = Font(bold=True, color="FFFFFF")
-    for cell in ws[1]:
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal="center", vertical="center")
-    
-    for quote in quotations:
-        customer_name = f"{quote.policy.customer.user.first_name} {quote.policy.customer.user.last_name}".strip() or quote.policy.customer.user.username
-        created_by = f"{quote.created_by.first_name} {quote.created_by.last_name}".strip() if quote.created_by else ''
-        decided_by = f"{quote.decided_by.first_name} {quote.decided_by.last_name}".strip() if quote.decided_by else ''
-        ws.append([
-            quote.quote_id,
-            quote.policy.policy_number,
-            customer_name,
-            quote.policy.vehicle.vehicle_number,
-            float(quote.premium_amount),
-            float(quote.coverage_amount),
-            quote.currency,
-            quote.get_status_display(),
-            created_by,
-            quote.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-            decided_by,
-            quote.customer_decision_at.strftime('%Y-%m-%d %H:%M:%S') if quote.customer_decision_at else '',
-        ])
-    
-    # Auto-size columns
-    for col in ws.columns:
-        max_length = 0
-        col_letter = get_column_letter(col[0].column)
-        for cell in col:
-            try:
-                max_length = max(max_length, len(str(cell.value or '')))
-            except:
-                pass
-        ws.column_dimensions[col_letter].width = min(max_length + 2, 50)
-    
-    stream = BytesIO()
-    wb.save(stream)
-    stream.seek(0)
-    resp = HttpResponse(stream.read(), content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    resp['Content-Disposition'] = 'attachment; filename="quotations_export.xlsx"'
-    return resp
+    """Export all quotations as Excel (default), CSV or NDJSON"""
+    return _export_response(request, 'quotations')
 
-@extend_schema(tags=['exports'], summary='Export claims to Excel')
+@extend_schema(tags=['exports'], summary='Export claims to Excel, CSV or NDJSON')
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@renderer_classes(EXPORT_RENDERERS)
 def export_claims_excel(request):
-    """Export all claims to Excel format"""
-    try:
-        from openpyxl import Workbook
-        from openpyxl.styles import Font, PatternFill, Alignment
-        from openpyxl.utils import get_column_letter
-    except ImportError:
-        return Response({'error': "Excel export requires 'openpyxl'"}, status=status.HTTP_501_NOT_IMPLEMENTED)
-    
-    claims = Claim.objects.select_related('policy__customer', 'policy__vehicle', 'processed_by').all()
-    
-    wb = Workbook()
-    ws = wb.active
-    ws.title = 'Claims'
-    
-    headers = ['Claim ID', 'Policy Number', 'Customer', 'Vehicle Number', 
-               'Incident Date', 'Claim Date', 'Description', 'Estimated Amount', 
-               'Approved Amount', 'Status', 'Approval Status', 'Priority', 
-               'Processed By', 'Processed At', 'Requires Investigation']
-    ws.append(headers)
-    
-    # Style header
-    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-    header_font = Font(bold=True, color="FFFFFF")
-    for cell in ws[1]:
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal="center", vertical="center")
-    
-    for claim in claims:
-        customer_name = f"{claim.policy.customer.user.first_name} {claim.policy.customer.user.last_name}".strip() or claim.policy.customer.user.username
-        processed_by = f"{claim.processed_by.first_name} {claim.processed_by.last_name}".strip() if claim.processed_by else ''
-        ws.append([
-            claim.claim_id,
-            claim.policy.policy_number,
-            customer_name,
-            claim.policy.vehicle.vehicle_number,
-            claim.incident_date.strftime('%Y-%m-%d'),
-            claim.claim_date.strftime('%Y-%m-%d %H:%M:%S'),
-            claim.description[:100] + '...' if len(claim.description) > 100 else claim.description,
-            float(claim.estimated_amount),
-            float(claim.approved_amount) if claim.approved_amount else '',
-            claim.get_status_display(),
-            claim.get_approval_status_display(),
-            claim.get_priority_display(),
-            processed_by,
-            claim.processed_at.strftime('%Y-%m-%d %H:%M:%S') if claim.processed_at else '',
-            'Yes' if claim.requires_investigation else 'No',
-        ])
-    
-    # Auto-size columns
-    for col in ws.columns:
-        max_length = 0
-        col_letter = get_column_letter(col[0].column)
-        for cell in col:
-            try:
-                max_length = max(max_length, len(str(cell.value or '')))
-            except:
-                pass
-        ws.column_dimensions[col_letter].width = min(max_length + 2, 50)
-    
-    stream = BytesIO()
-    wb.save(stream)
-    stream.seek(0)
-    resp = HttpResponse(stream.read(), content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    resp['Content-Disposition'] = 'attachment; filename="claims_export.xlsx"'
-    return resp
+    """Export all claims as Excel (default), CSV or NDJSON"""
+    return _export_response(request, 'claims')
 
-@extend_schema(tags=['exports'], summary='Export vehicles to Excel')
+@extend_schema(tags=['exports'], summary='Export vehicles to Excel, CSV or NDJSON')
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@renderer_classes(EXPORT_RENDERERS)
 def export_vehicles_excel(request):
-    """Export all vehicles to Excel format"""
-    try:
-        from openpyxl import Workbook
-        from openpyxl.styles import Font, PatternFill, Alignment
-        from openpyxl.utils import get_column_letter
-    except ImportError:
-        return Response({'error': "Excel export requires 'openpyxl'"}, status=status.HTTP_501_NOT_IMPLEMENTED)
-    
-    vehicles = Vehicle.objects.select_related('customer', 'category').all()
-    
-    wb = Workbook()
-    ws = wb.active
-    ws.title = 'Vehicles'
-    
-    headers = ['Vehicle Number', 'Customer', 'Category', 'Make', 'Model', 
-               'Year', 'Engine Number', 'Chassis Number', 'Market Value', 
-               'Date Registered']
-    ws.append(headers)
-    
-    # Style header
-    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-    header_font = Font(bold=True, color="FFFFFF")
-    for cell in ws[1]:
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal="center", vertical="center")
-    
-    for vehicle in vehicles:
-        customer_name = f"{vehicle.customer.user.first_name} {vehicle.customer.user.last_name}".strip() or vehicle.customer.user.username
-        ws.append([
-            vehicle.vehicle_number,
-            customer_name,
-            vehicle.category.get_name_display(),
-            vehicle.make,
-            vehicle.model,
-            vehicle.year,
-            vehicle.engine_number,
-            vehicle.chassis_number,
-            float(vehicle.market_value),
-            vehicle.date_registered.strftime('%Y-%m-%d %H:%M:%S'),
-        ])
-    
-    # Auto-size columns
-    for col in ws.columns:
-        max_length = 0
-        col_letter = get_column_letter(col[0].column)
-        for cell in col:
-            try:
-                max_length = max(max_length, len(str(cell.value or '')))
-            except:
-                pass
-        ws.column_dimensions[col_letter].width = min(max_length + 2, 50)
-    
-    stream = BytesIO()
-    wb.save(stream)
-    stream.seek(0)
-    resp = HttpResponse(stream.read(), content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    resp['Content-Disposition'] = 'attachment; filename="vehicles_export.xlsx"'
-    return resp
+    """Export all vehicles as Excel (default), CSV or NDJSON"""
+    return _export_response(request, 'vehicles')
 
-@extend_schema(tags=['exports'], summary='Export dashboard report to Excel')
+@extend_schema(tags=['exports'], summary='Export dashboard report to Excel, CSV or NDJSON')
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@renderer_classes(EXPORT_RENDERERS)
 def export_dashboard_report_excel(request):
-    """Export dashboard summary report to Excel format"""
-    try:
-        from openpyxl import Workbook
-        from openpyxl.styles import Font, PatternFill, Alignment
-        from openpyxl.utils import get_column_letter
-    except ImportError:
-        return Response({'error': "Excel export requires 'openpyxl'"}, status=status.HTTP_501_NOT_IMPLEMENTED)
-    
+    """Export dashboard summary report as Excel (default), CSV or NDJSON"""
+    fmt = request.query_params.get('format') or 'xlsx'
+
     # Get summary data
     total_policies = InsurancePolicy.objects.count()
     active_policies = InsurancePolicy.objects.filter(status='active').count()
@@ -2002,7 +1660,35 @@ def export_dashboard_report_excel(request):
     completed_payments = Payment.objects.filter(status='completed').count()
     total_revenue = Payment.objects.filter(status='completed').aggregate(Sum('amount'))['amount__sum'] or Decimal('0')
     total_customers = Customer.objects.count()
-    
+
+    if fmt != 'xlsx':
+        # One metric per row; values stay numeric for machine consumers.
+        metrics = [
+            ('total_policies', total_policies),
+            ('active_policies', active_policies),
+            ('total_claims', total_claims),
+            ('pending_claims', pending_claims),
+            ('approved_claims', approved_claims),
+            ('total_payments', total_payments),
+            ('completed_payments', completed_payments),
+            ('total_revenue', total_revenue),
+            ('total_customers', total_customers),
+        ]
+        if fmt == 'csv':
+            blocks = exports.iter_csv(['Metric', 'Value'], metrics)
+        else:
+            blocks = exports.iter_ndjson(['metric', 'value'], metrics)
+        return exports.stream_response(
+            f'dashboard_report.{fmt}', fmt, blocks, gzip_encode=exports.accepts_gzip(request),
+        )
+
+    try:
+        from openpyxl import Workbook
+        from openpyxl.styles import Font, PatternFill, Alignment
+        from openpyxl.utils import get_column_letter
+    except ImportError:
+        return Response({'error': "Excel export requires 'openpyxl'"}, status=status.HTTP_501_NOT_IMPLEMENTED)
+
     wb = Workbook()
     ws = wb.active
     ws.title = 'Dashboard Report'
@@ -2060,6 +1746,57 @@ def export_dashboard_report_excel(request):
     resp['Content-Disposition'] = 'attachment; filename="dashboard_report.xlsx"'
     return resp
 
+# Background exports
+@extend_schema_view(list=extend_schema(tags=['exports']), retrieve=extend_schema(tags=['exports']), create=extend_schema(tags=['exports']))
+class ExportJobViewSet(mixins.CreateModelMixin, viewsets.ReadOnlyModelViewSet):
+    """Queue an export (POST), poll its status (GET) and download the artifact.
+
+    Generation happens in the ``run_export_worker`` process. An identical
+    request made while a recent artifact still exists is completed immediately
+    from that artifact. Only staff may queue exports (they cover the whole
+    book); customers can see and download their own jobs, such as quotation
+    packs.
+    """
+    serializer_class = ExportJobSerializer
+    permission_classes = [IsAuthenticated, IsStaffOrReadOnly]
+
+    def get_queryset(self):
+        qs = ExportJob.objects.select_related('requested_by')
+        user = self.request.user
+        if user.user_type in ['manager', 'underwriter'] or user.is_staff:
+            return qs
+        return qs.filter(requested_by=user)
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        columns = [column.key for column in exports.EXPORTS[data['export']].select(data.get('columns') or [])]
+        fmt = data.get('format', 'xlsx')
+        cached = export_jobs.find_reusable(data['export'], columns, fmt)
+        if cached is not None:
+            now = timezone.now()
+            job = serializer.save(
+                requested_by=request.user, columns=columns, status='completed',
+                file_path=cached.file_path, file_size=cached.file_size, row_count=cached.row_count,
+                duration_ms=0, peak_memory_kb=0, started_at=now, finished_at=now,
+            )
+            return Response(self.get_serializer(job).data, status=status.HTTP_201_CREATED)
+        job = serializer.save(requested_by=request.user, columns=columns)
+        return Response(self.get_serializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        job = self.get_object()
+        if job.status != 'completed':
+            return Response({'error': f'Export is {job.status}', 'status': job.status}, status=status.HTTP_409_CONFLICT)
+        try:
+            fileobj = open(job.file_path, 'rb')
+        except OSError:
+            return Response({'error': 'Export artifact has expired'}, status=status.HTTP_410_GONE)
+        filename, content_type = export_jobs.download_name(job)
+        return FileResponse(fileobj, as_attachment=True, filename=filename, content_type=content_type)
+
 # Utility Views
 @extend_schema(tags=['utility'], summary='Health check')
 @api_view(['GET'])
@@ -2367,39 +2104,8 @@ def dashboard_data(request):
         except:
             data = {'active_policies': 0, 'total_claims': 0, 'pending_claims': 0, 'vehicles': 0}
     else:
-        # Enhanced data for underwriters/managers
-        total_claims = Claim.objects.count()
-        pending_claims = Claim.objects.filter(approval_status='pending').count()
-        approved_claims = Claim.objects.filter(approval_status='approve').count()
-        
-        # Calculate total revenue from active policies
-        total_revenue = InsurancePolicy.objects.filter(status='active').aggregate(
-            Sum('premium_amount')
-        )['premium_amount__sum'] or 0
-        
-        # Calculate average claim amount
-        avg_claim_amount = Claim.objects.aggregate(
-            Avg('estimated_amount')
-        )['estimated_amount__avg'] or 0
-        
-        # Policies expiring in next 30 days
-        from datetime import timedelta
-        thirty_days_from_now = timezone.now().date() + timedelta(days=30)
-        policies_expiring_soon = InsurancePolicy.objects.filter(
-            status='active',
-            end_date__lte=thirty_days_from_now
-        ).count()
-        
-        data = {
-            'total_customers': Customer.objects.count(),
-            'active_policies': InsurancePolicy.objects.filter(status='active').count(),
-            'pending_claims': pending_claims,
-            'total_claims': total_claims,
-            'total_revenue': float(total_revenue),
-            'claims_approval_rate': (approved_claims / total_claims * 100) if total_claims > 0 else 0,
-            'average_claim_amount': float(avg_claim_amount),
-            'policies_expiring_soon': policies_expiring_soon,
-        }
+        # Enhanced data for underwriters/managers (cached, invalidated on writes)
+        data = analytics.cached_staff_dashboard_summary()
     
     return JsonResponse(data)
 
@@ -2415,11 +2121,11 @@ def claims_data(request):
     if getattr(user, 'user_type', None) == 'customer':
         try:
             customer = user.customer_profile
-            claims = Claim.objects.filter(policy__customer=customer).order_by('-created_at')
+            claims = Claim.objects.filter(policy__customer=customer)
         except Exception:
             claims = Claim.objects.none()
     else:
-        claims = Claim.objects.all().order_by('-created_at')
+        claims = Claim.objects.all()
     
     # Apply filters
     claim_id = request.GET.get('claim_id')
@@ -2433,23 +2139,32 @@ def claims_data(request):
     if status_filter:
         claims = claims.filter(approval_status=status_filter)
     
-    claims_data = []
-    for claim in claims:
-        customer = getattr(claim.policy, 'customer', None)
-        vehicle = getattr(claim.policy, 'vehicle', None)
-        customer_name = customer.user.get_full_name() if customer else 'N/A'
-        claims_data.append({
-            'id': claim.id,
-            'claim_id': claim.claim_id,
-            'vehicle_number': getattr(vehicle, 'vehicle_number', 'N/A'),
-            'estimated_amount': str(claim.estimated_amount),
-            'approval_status': claim.approval_status,
-            'status': claim.status,
-            'customer_name': customer_name or 'N/A',
-            'created_at': claim.created_at.strftime('%Y-%m-%d %H:%M'),
-        })
-    
-    return JsonResponse({'claims': claims_data})
+    # Newest first from a single joined projection: one bounded page with ?cursor/?page_size, else every row.
+    rows, next_cursor = keyset_values(
+        claims,
+        ('id', 'claim_id', 'estimated_amount', 'approval_status', 'status', 'created_at',
+         'policy__vehicle__vehicle_number', 'policy__customer__user__first_name', 'policy__customer__user__last_name'),
+        'created_at', request.GET.get('cursor'),
+        page_size_for(request, default=100, maximum=500) if paging_requested(request) else None,
+    )
+    claims_data = (
+        {
+            'id': row['id'],
+            'claim_id': row['claim_id'],
+            'vehicle_number': row['policy__vehicle__vehicle_number'] or 'N/A',
+            'estimated_amount': str(row['estimated_amount']),
+            'approval_status': row['approval_status'],
+            'status': row['status'],
+            'customer_name': f"{row['policy__customer__user__first_name'] or ''} {row['policy__customer__user__last_name'] or ''}".strip() or 'N/A',
+            'created_at': row['created_at'].strftime('%Y-%m-%d %H:%M'),
+        }
+        for row in rows
+    )
+    next_url = replace_query_param(request.build_absolute_uri(), 'cursor', next_cursor) if next_cursor else None
+    return StreamingHttpResponse(
+        stream_json(claims_data, key='claims', extra={'next_cursor': next_cursor, 'next': next_url}),
+        content_type='application/json',
+    )
 
 # Template context processor function (add to settings.py)
 def user_context(request):
@@ -2755,22 +2470,21 @@ def handle_payment_succeeded(payment_intent):
                 )
                 
                 # Send notification to underwriters
-                underwriters = User.objects.filter(user_type__in=['underwriter', 'manager'])
-                for underwriter in underwriters:
-                    Notification.objects.create(
-                        recipient=underwriter,
-                        title='Payment Received',
-                        message=f'Payment received for policy {policy.policy_number} from {policy.customer.user.get_full_name() or policy.customer.user.username}.',
-                        type='payment_success',
-                        payload={
-                            'payment_id': payment.payment_id, 
-                            'policy_id': policy.id,
-                            'policy_number': policy.policy_number,
-                            'customer_name': policy.customer.user.get_full_name() or policy.customer.user.username,
-                            'amount': str(payment.amount),
-                            'payment_method': payment.payment_method
-                        }
-                    )
+                customer_name = policy.customer.user.get_full_name() or policy.customer.user.username
+                notifications.broadcast(
+                    'staff',
+                    title='Payment Received',
+                    message=f'Payment received for policy {policy.policy_number} from {customer_name}.',
+                    type='payment_success',
+                    payload={
+                        'payment_id': payment.payment_id,
+                        'policy_id': policy.id,
+                        'policy_number': policy.policy_number,
+                        'customer_name': customer_name,
+                        'amount': str(payment.amount),
+                        'payment_method': payment.payment_method
+                    }
+                )
         except InsurancePolicy.DoesNotExist:
             pass
 
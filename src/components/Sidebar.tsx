@@ -3,6 +3,7 @@ import { ChevronRight, BarChart3, FileText, AlertTriangle, Inbox, Car } from "lu
 import React from "react";
 import { useQuery } from "@tanstack/react-query";
 import { getAuthToken } from "@/lib/api";
+import { useLiveEvents } from "@/hooks/useLiveEvents";
 
 interface SidebarProps {
   open: boolean;
@@ -25,6 +26,8 @@ const Sidebar: React.FC<SidebarProps> = ({ open }) => {
       return res.json();
     },
   });
+  // With a live stream the poll is only a fallback; otherwise poll as before.
+  const live = useLiveEvents();
   const { data: unread } = useQuery({
     queryKey: ["notifications", "unread-count"],
     queryFn: async () => {
@@ -39,7 +42,7 @@ const Sidebar: React.FC<SidebarProps> = ({ open }) => {
       return res.json();
     },
     // Poll periodically to reflect new notifications
-    refetchInterval: 15000,
+    refetchInterval: live ? 120000 : 15000,
   });
   const unreadCount = Math.max(0, Number(unread?.count || 0));
   const isUnderwriter = perms?.user?.user_type === "underwriter" || perms?.user?.user_type === "manager";
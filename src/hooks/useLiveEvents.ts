@@ -0,0 +1,109 @@
+import { useEffect, useState } from "react";
+import { QueryClient, useQueryClient } from "@tanstack/react-query";
+import { getAuthToken } from "@/lib/api";
+
+// Live updates from the backend's server-sent event stream (/api/events/).
+// The stream is only enabled on ASGI deployments (EVENTS_STREAM_ENABLED);
+// elsewhere the ticket request returns 404 and callers keep polling. Every
+// mounted consumer shares one EventSource; each event refetches the queries
+// it affects. The stream is opened with a single-use ticket rather than the
+// access token, so no JWT ends up in a URL.
+const INVALIDATES: Record<string, string[][]> = {
+  notification: [["notifications"]],
+  claim_status: [["claims"]],
+  policy_status: [["policies"]],
+};
+// Delay before reopening a dropped or refused stream with a fresh ticket.
+const RECONNECT_MS = 5000;
+
+let source: EventSource | null = null;
+let sourceToken: string | null = null;
+let reconnectTimer: ReturnType<typeof setTimeout> | undefined;
+let live = false;
+const clients = new Map<QueryClient, number>();
+const liveListeners = new Set<(value: boolean) => void>();
+
+function setLive(value: boolean) {
+  live = value;
+  liveListeners.forEach((listener) => listener(value));
+}
+
+function close() {
+  clearTimeout(reconnectTimer);
+  source?.close();
+  source = null;
+  sourceToken = null;
+  setLive(false);
+}
+
+async function requestTicket(token: string): Promise<string | null> {
+  const res = await fetch("/api/events/ticket/", {
+    method: "POST",
+    headers: { Authorization: `Bearer ${token}` },
+  });
+  if (!res.ok) return null;
+  const data = await res.json();
+  return typeof data?.ticket === "string" ? data.ticket : null;
+}
+
+async function connect() {
+  const token = getAuthToken();
+  if (!token || clients.size === 0) {
+    close();
+    return;
+  }
+  if (sourceToken === token) return;
+  close();
+  sourceToken = token;
+  let ticket: string | null = null;
+  try {
+    ticket = await requestTicket(token);
+  } catch {
+    ticket = null;
+  }
+  // Streaming disabled on this deployment, or the token changed meanwhile: keep polling.
+  if (!ticket || sourceToken !== token || clients.size === 0) return;
+  const stream = new EventSource(`/api/events/?ticket=${encodeURIComponent(ticket)}`);
+  source = stream;
+  Object.entries(INVALIDATES).forEach(([kind, queryKeys]) => {
+    stream.addEventListener(kind, () => {
+      clients.forEach((_, queryClient) => {
+        queryKeys.forEach((queryKey) => queryClient.invalidateQueries({ queryKey }));
+      });
+    });
+  });
+  stream.onopen = () => setLive(true);
+  stream.onerror = () => {
+    // A ticket is single-use, so the browser's own retry would be refused; reconnect with a new one.
+    if (source !== stream) return;
+    close();
+    reconnectTimer = setTimeout(connect, RECONNECT_MS);
+  };
+}
+
+/** Subscribe to live updates; returns whether the stream is connected (poll normally when it is not). */
+export function useLiveEvents() {
+  const queryClient = useQueryClient();
+  const [connected, setConnected] = useState(live);
+
+  useEffect(() => {
+    liveListeners.add(setConnected);
+    clients.set(queryClient, (clients.get(queryClient) || 0) + 1);
+    connect();
+    // Tokens change on login, logout and refresh (see setAuthTokens).
+    window.addEventListener("storage", connect);
+    return () => {
+      window.removeEventListener("storage", connect);
+      liveListeners.delete(setConnected);
+      const count = (clients.get(queryClient) || 1) - 1;
+      if (count > 0) {
+        clients.set(queryClient, count);
+      } else {
+        clients.delete(queryClient);
+      }
+      if (clients.size === 0) close();
+    };
+  }, [queryClient]);
+
+  return connected;
+}
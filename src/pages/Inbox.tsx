@@ -22,6 +22,7 @@ import {
 import { ScrollArea } from "@/components/ui/scroll-area";
 import { Separator } from "@/components/ui/separator";
 import { getAuthToken } from "@/lib/api";
+import { useLiveEvents } from "@/hooks/useLiveEvents";
 import { Link } from "react-router-dom";
 import {
   Bell,
@@ -80,10 +81,12 @@ export default function Inbox() {
   const [filterStatus, setFilterStatus] = useState<string>("all");
   const [sortBy, setSortBy] = useState<string>("newest");
 
+  // With a live stream the polls are only a fallback; otherwise poll as before.
+  const live = useLiveEvents();
   const { data, isLoading, error } = useQuery<Notification[]>({
     queryKey: ["notifications"],
     queryFn: () => api("/api/notifications/"),
-    refetchInterval: 30000,
+    refetchInterval: live ? 120000 : 30000,
     staleTime: 10000,
   });
 
@@ -98,7 +101,7 @@ export default function Inbox() {
   const { data: unreadCount } = useQuery({
     queryKey: ["notifications", "unread-count"],
     queryFn: () => api("/api/notifications/unread_count/"),
-    refetchInterval: 30000,
+    refetchInterval: live ? 120000 : 30000,
   });
 
   const notificationsList = useMemo<Notification[]>(() => {